@@ -0,0 +1,86 @@
+"""Measures `Task.objects.select_for_process` latency while the number of
+finished tasks in the table grows.
+
+Runs against a throwaway test database created from `test_partisan` settings:
+
+    $ python benchmarks/fetch_latency.py --sizes 0 10000 100000 1000000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'test_partisan')]
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'test_partisan.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_databases, teardown_databases  # noqa: E402
+
+from django_partisan.models import Task  # noqa: E402
+
+PENDING_TASKS = 1000
+BATCH_SIZE = 10000
+
+
+def fill_finished(count: int) -> None:
+    while count > 0:
+        batch = min(count, BATCH_SIZE)
+        Task.objects.bulk_create(
+            Task(
+                processor_class='BenchmarkProcessor',
+                status=Task.STATUS_FINISHED,
+                arguments={'args': [i], 'kwargs': {}},
+            )
+            for i in range(batch)
+        )
+        count -= batch
+
+
+def measure_fetch(fetch_size: int, rounds: int) -> float:
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        tasks = Task.objects.select_for_process(fetch_size)
+        timings.append(time.perf_counter() - started)
+        Task.objects.filter(pk__in=[task.pk for task in tasks]).update(
+            status=Task.STATUS_NEW
+        )
+    return statistics.median(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[0, 10000, 100000, 1000000]
+    )
+    parser.add_argument('--fetch_size', type=int, default=10)
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        Task.objects.bulk_create(
+            Task(processor_class='BenchmarkProcessor', arguments={'args': [i]})
+            for i in range(PENDING_TASKS)
+        )
+        finished = 0
+        print(f'{"finished rows":>15} {"median fetch, ms":>18}')
+        for size in sorted(args.sizes):
+            fill_finished(size - finished)
+            finished = size
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE django_partisan_task')
+            latency = measure_fetch(args.fetch_size, args.rounds)
+            print(f'{size:>15} {latency * 1000:>18.3f}')
+    finally:
+        teardown_databases(old_config, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+"""Measures throughput and latency of the full pipeline: tasks are enqueued
+with `delay()` at steady rate, while `WorkersManager` with real worker processes
+processes them, so latency shows time tasks wait in queue, not their position
+in backlog.
+
+Sweeps workers count, local queue size and number of finished tasks in the
+table. Runs against a throwaway test database created from `test_partisan`
+settings:
+
+    $ python benchmarks/pipeline.py --tasks 2000 --rate 500 --workers 1 4 --queue_sizes 10 50
+"""
+import argparse
+import itertools
+import math
+import multiprocessing as mp
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, NamedTuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'test_partisan')]
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'test_partisan.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django import db  # noqa: E402
+from django.db.backends.signals import connection_created  # noqa: E402
+from django.test.utils import setup_databases, teardown_databases  # noqa: E402
+
+from django_partisan.models import Task  # noqa: E402
+from django_partisan.processor import BaseTaskProcessor  # noqa: E402
+from django_partisan.settings import get_queue_settings  # noqa: E402
+from django_partisan.workers_manager import WorkersManager  # noqa: E402
+from fetch_latency import fill_finished  # noqa: E402
+
+
+class NoopProcessor(BaseTaskProcessor):
+    def run(self) -> None:
+        pass
+
+
+class SleepProcessor(BaseTaskProcessor):
+    def run(self) -> None:
+        time.sleep(self.args[0])
+
+
+class CpuProcessor(BaseTaskProcessor):
+    def run(self) -> None:
+        sum(i * i for i in range(self.args[0]))
+
+
+PROCESSORS = {
+    'noop': lambda args: NoopProcessor(),
+    'sleep': lambda args: SleepProcessor(args.sleep_ms / 1000),
+    'cpu': lambda args: CpuProcessor(args.cpu_loops),
+}
+
+
+class QueriesCounter:
+    """Counts queries of all connections in all processes. Installed as
+    execute wrapper of every connection, forked workers inherit it.
+    Pause is per thread, so queries of enqueuing thread are not counted
+    """
+
+    def __init__(self) -> None:
+        self.value = mp.Value('l', 0)
+        self.local = threading.local()
+
+    def __call__(
+        self,
+        execute: Callable[..., Any],
+        sql: str,
+        params: Any,
+        many: bool,
+        context: Any,
+    ) -> Any:
+        if not getattr(self.local, 'is_paused', False):
+            with self.value.get_lock():
+                self.value.value += 1
+        return execute(sql, params, many, context)
+
+    def install(self, connection: Any, **kwargs: Any) -> None:
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def reset(self) -> None:
+        self.value.value = 0
+
+    @contextmanager
+    def paused(self) -> Iterator[None]:
+        self.local.is_paused = True
+        try:
+            yield
+        finally:
+            self.local.is_paused = False
+
+
+class RunResult(NamedTuple):
+    enqueue_rate: float
+    throughput: float
+    p50_latency: float
+    p99_latency: float
+    queries_per_task: float
+
+
+def get_percentile(sorted_values: List[float], percent: int) -> float:
+    """Nearest-rank percentile of sorted values"""
+    rank = math.ceil(len(sorted_values) * percent / 100)
+    return sorted_values[max(rank, 1) - 1]
+
+
+def enqueue_steadily(
+    processor_factory: Callable[[], BaseTaskProcessor],
+    tasks_count: int,
+    rate: float,
+    counter: QueriesCounter,
+) -> float:
+    """Enqueues tasks with given rate per second and returns achieved rate"""
+    started = time.perf_counter()
+    with counter.paused():
+        for num in range(tasks_count):
+            pause = started + num / rate - time.perf_counter()
+            if pause > 0:
+                time.sleep(pause)
+            processor_factory().delay()
+        db.connection.close()
+    return tasks_count / (time.perf_counter() - started)
+
+
+def run_pipeline(
+    processor_factory: Callable[[], BaseTaskProcessor],
+    tasks_count: int,
+    rate: float,
+    workers_count: int,
+    max_queue_size: int,
+    sleep_delay_seconds: float,
+    counter: QueriesCounter,
+) -> RunResult:
+    manager = WorkersManager(
+        workers_count=workers_count,
+        max_queue_size=max_queue_size,
+        min_queue_size=min(max_queue_size // 2, get_queue_settings().MIN_QUEUE_SIZE),
+        sleep_delay_seconds=sleep_delay_seconds,
+    )
+    db.connections.close_all()
+    counter.reset()
+    manager.create_workers()
+    # Enqueuing thread is started after workers are forked
+    executor = ThreadPoolExecutor(max_workers=1)
+    enqueuing = executor.submit(
+        enqueue_steadily, processor_factory, tasks_count, rate, counter
+    )
+    try:
+        while True:
+            manager.manage_queue()
+            manager.manage_workers()
+            with counter.paused():
+                if (
+                    enqueuing.done()
+                    and not Task.objects.filter(
+                        status__in=(Task.STATUS_NEW, Task.STATUS_IN_PROCESS)
+                    ).exists()
+                ):
+                    break
+    finally:
+        executor.shutdown()
+        manager.flush_queue()
+        manager.stop_workers()
+    enqueue_rate = enqueuing.result()
+    queries_count = counter.value.value
+
+    with counter.paused():
+        processed = Task.objects.exclude(processor_class='BenchmarkProcessor')
+        timings = list(
+            processed.values_list('created_at', 'started_at', 'run_duration_ms')
+        )
+        processed.delete()
+    latencies = sorted(
+        (started_at - created_at).total_seconds()
+        for created_at, started_at, _ in timings
+    )
+    first_start = min(started_at for _, started_at, _ in timings)
+    last_finish = max(
+        started_at.timestamp() + duration / 1000 for _, started_at, duration in timings
+    )
+    return RunResult(
+        enqueue_rate=enqueue_rate,
+        throughput=tasks_count / max(last_finish - first_start.timestamp(), 0.001),
+        p50_latency=get_percentile(latencies, 50),
+        p99_latency=get_percentile(latencies, 99),
+        queries_per_task=queries_count / tasks_count,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=1000)
+    parser.add_argument(
+        '--rate', type=float, default=200, help='tasks enqueued per second'
+    )
+    parser.add_argument('--sizes', type=int, nargs='+', default=[0, 100000])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--queue_sizes', type=int, nargs='+', default=[10, 50])
+    parser.add_argument(
+        '--processors', nargs='+', choices=list(PROCESSORS), default=list(PROCESSORS)
+    )
+    parser.add_argument('--sleep_ms', type=int, default=10)
+    parser.add_argument('--cpu_loops', type=int, default=100000)
+    parser.add_argument('--sleep_delay_seconds', type=float, default=1)
+    args = parser.parse_args()
+
+    queue_settings = get_queue_settings()
+    queue_settings.TRACK_TASK_TIMING = True
+    counter = QueriesCounter()
+    connection_created.connect(counter.install)
+    for connection in db.connections.all():
+        counter.install(connection)
+
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        finished = 0
+        print(
+            f'{"finished rows":>13} {"workers":>7} {"queue":>5} {"processor":>9} '
+            f'{"enqueue/s":>9} {"tasks/s":>8} {"p50, ms":>8} {"p99, ms":>8} '
+            f'{"queries/task":>12}'
+        )
+        for size in sorted(args.sizes):
+            with counter.paused():
+                fill_finished(size - finished)
+            finished = size
+            for workers_count, queue_size, processor in itertools.product(
+                args.workers, args.queue_sizes, args.processors
+            ):
+                result = run_pipeline(
+                    lambda: PROCESSORS[processor](args),
+                    args.tasks,
+                    args.rate,
+                    workers_count,
+                    queue_size,
+                    args.sleep_delay_seconds,
+                    counter,
+                )
+                print(
+                    f'{size:>13} {workers_count:>7} {queue_size:>5} {processor:>9} '
+                    f'{result.enqueue_rate:>9.0f} {result.throughput:>8.0f} '
+                    f'{result.p50_latency * 1000:>8.1f} '
+                    f'{result.p99_latency * 1000:>8.1f} '
+                    f'{result.queries_per_task:>12.2f}'
+                )
+    finally:
+        teardown_databases(old_config, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
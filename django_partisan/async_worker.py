@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty
+from typing import Set, Callable, Any, List
+
+from django import db
+
+from django_partisan.models import Task
+from django_partisan.worker import Worker, QueueItem
+
+logger = logging.getLogger(__name__)
+
+QUEUE_GET_TIMEOUT = 1
+
+
+class AsyncWorker(Worker):
+    """Worker, that runs up to ASYNC_TASKS_PER_WORKER tasks at once on one event loop.
+    Database queries and sync processors are run in a separate thread,
+    so the whole worker uses one database connection
+    """
+
+    def process(self) -> None:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self.queue_executor = ThreadPoolExecutor(max_workers=1)
+        self.db_executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            loop.run_until_complete(self.process_tasks_async())
+        finally:
+            self.queue_executor.shutdown()
+            self.db_executor.shutdown()
+            loop.close()
+
+    async def process_tasks_async(self) -> None:
+        semaphore = asyncio.Semaphore(self.settings.ASYNC_TASKS_PER_WORKER or 1)
+        running_tasks: Set['asyncio.Future[None]'] = set()
+        self.running_tasks_count = 0
+        while self.error is None and self.shoud_process_tasks(self.running_tasks_count):
+            await semaphore.acquire()
+            if self.error is not None:
+                break
+            try:
+                message = await self.receive_message(self.running_tasks_count > 0)
+            except Empty:
+                semaphore.release()
+                await self.run_in_db_executor(self.flush_completed_tasks)
+                if os.getppid() == 1:  # pragma: no cover
+                    break
+                continue
+            if message is None:
+                logger.info('Worker stopped')
+                self.report_stopped()
+                break
+            self.running_tasks_count += 1
+            running_task = asyncio.ensure_future(
+                self.run_batch_async(self.get_batch(message), semaphore)
+                if isinstance(message, list)
+                else self.run_task_async(self.get_task(message), semaphore)
+            )
+            running_tasks.add(running_task)
+            running_task.add_done_callback(running_tasks.discard)
+        if running_tasks:
+            await asyncio.wait(running_tasks)
+        await self.run_in_db_executor(db.connections.close_all)
+        if self.error is not None:
+            raise self.error
+        if not self.shoud_process_tasks():
+            logger.info(
+                'Processed %d of %d tasks. Exiting',
+                self.tasks_processed,
+                self.tasks_before_death,
+            )
+
+    async def receive_message(self, has_running_tasks: bool) -> QueueItem:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self.queue_executor,
+            self.queue.get,
+            True,
+            self.get_queue_timeout(has_running_tasks),
+        )
+
+    async def run_task_async(self, task: Task, semaphore: asyncio.Semaphore) -> None:
+        try:
+            await task.run_async(self.db_executor)
+        except Exception as err:
+            self.running_tasks_count -= 1
+            await self.run_in_db_executor(self.fail_task, task, err)
+            if self.error is None:
+                self.error = err
+        else:
+            self.running_tasks_count -= 1
+            self.tasks_processed += 1
+            await self.run_in_db_executor(self.complete_task, task)
+        finally:
+            semaphore.release()
+
+    async def run_batch_async(
+        self, tasks: List[Task], semaphore: asyncio.Semaphore
+    ) -> None:
+        """Runs batch processor in database thread, as sync processors"""
+        try:
+            errors = await self.run_in_db_executor(Task.run_batch, tasks)
+            error = await self.run_in_db_executor(self.finish_batch, tasks, errors)
+            if error is not None and self.error is None:
+                self.error = error
+        finally:
+            self.running_tasks_count -= 1
+            semaphore.release()
+
+    async def run_in_db_executor(self, func: Callable, *args: Any) -> Any:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.db_executor, func, *args)
+
+    def get_queue_timeout(self, has_running_tasks: bool = False) -> float:
+        if has_running_tasks:
+            return QUEUE_GET_TIMEOUT
+        return super().get_queue_timeout()
@@ -1,4 +1,13 @@
 DELAY_STRATEGY_INCREMENTAL = 'I'
 DELAY_STRATEGY_CONSTANT = 'C'
+DELAY_STRATEGY_EXPONENTIAL = 'E'
+DELAY_STRATEGY_EXPONENTIAL_JITTER = 'J'
 
-DELAY_STRATEGIES = [DELAY_STRATEGY_INCREMENTAL, DELAY_STRATEGY_CONSTANT]
+DELAY_STRATEGIES = [
+    DELAY_STRATEGY_INCREMENTAL,
+    DELAY_STRATEGY_CONSTANT,
+    DELAY_STRATEGY_EXPONENTIAL,
+    DELAY_STRATEGY_EXPONENTIAL_JITTER,
+]
+# Hard cap of any retry or postpone delay, applied even without max pause
+MAX_DELAY_SECONDS = 30 * 24 * 60 * 60
@@ -1,5 +1,6 @@
+import random
 from datetime import timedelta, datetime
-from typing import Type, Tuple
+from typing import Type, Tuple, Optional
 
 from django.utils import timezone
 from pydantic import BaseModel, validator
@@ -8,11 +9,61 @@ from django_partisan.config import const
 from django_partisan.exceptions import PostponeTask
 
 
+def _grow_delay(pause: float, base: int, attempt: int, cap: float) -> float:
+    """pause * base ** (attempt - 1), which stops growing after reaching cap,
+    so big attempt numbers don't overflow
+    """
+    delay = pause
+    while attempt > 1 and 0 < delay < cap:
+        delay *= base
+        attempt -= 1
+    return min(delay, cap)
+
+
+def get_delay_seconds(
+    strategy: str, pause: float, attempt: int, max_pause: Optional[float] = None
+) -> float:
+    """Delay before attempt with number, starting from 1, capped by max_pause
+    and by MAX_DELAY_SECONDS. Exponential jitter picks random delay between
+    pause and pause * 3 ** (attempt - 1), so redelayed tasks don't come back together
+    """
+    cap: float = const.MAX_DELAY_SECONDS
+    if max_pause is not None:
+        cap = min(max_pause, cap)
+    if strategy == const.DELAY_STRATEGY_CONSTANT:
+        delay = pause
+    elif strategy == const.DELAY_STRATEGY_INCREMENTAL:
+        delay = pause * attempt
+    elif strategy == const.DELAY_STRATEGY_EXPONENTIAL:
+        delay = _grow_delay(pause, 2, attempt, cap)
+    else:
+        upper_bound = _grow_delay(pause, 3, attempt, cap)
+        delay = random.uniform(pause, max(pause, upper_bound))
+    return min(delay, cap)
+
+
+def validate_strategy(field_name: str, v: str) -> str:
+    if v not in const.DELAY_STRATEGIES:
+        raise ValueError(
+            f'"{field_name}" should be set to DELAY_STRATEGY_INCREMENTAL, '
+            'DELAY_STRATEGY_CONSTANT, DELAY_STRATEGY_EXPONENTIAL '
+            'or DELAY_STRATEGY_EXPONENTIAL_JITTER'
+        )
+    return v
+
+
+def validate_max_pause(field_name: str, v: Optional[int]) -> Optional[int]:
+    if v is not None and v < 1:
+        raise ValueError(f'"{field_name}" should be bigger then 0')
+    return v
+
+
 class ErrorsHandleConfig(BaseModel):
     retry_on_errors: Tuple[Type[Exception], ...]
     retries_count: int
     retry_pause: int
     retry_pause_strategy: str = const.DELAY_STRATEGY_CONSTANT
+    max_retry_pause: Optional[int] = None
 
     def shoud_be_retried(self, try_num: int) -> bool:
         return try_num <= self.retries_count
@@ -20,10 +71,10 @@ class ErrorsHandleConfig(BaseModel):
     def get_new_datetime_for_retry(self, try_num: int) -> datetime:
         if not self.shoud_be_retried(try_num):
             raise RuntimeError('Task should not be delayed, tries ended')
-        now = timezone.now()
-        if self.retry_pause_strategy == const.DELAY_STRATEGY_CONSTANT:
-            return now + timedelta(seconds=self.retry_pause)
-        return now + timedelta(seconds=(self.retry_pause * try_num))
+        delay = get_delay_seconds(
+            self.retry_pause_strategy, self.retry_pause, try_num, self.max_retry_pause
+        )
+        return timezone.now() + timedelta(seconds=delay)
 
     @validator('retry_on_errors')
     def must_be_not_empty(cls, v: Tuple) -> Tuple:
@@ -33,12 +84,11 @@ class ErrorsHandleConfig(BaseModel):
 
     @validator('retry_pause_strategy')
     def strategy_must_be_one_of_defined(cls, v: str) -> str:
-        if v not in const.DELAY_STRATEGIES:
-            raise ValueError(
-                '"retry_pause_strategy" should be set to '
-                'DELAY_STRATEGY_INCREMENTAL or DELAY_STRATEGY_CONSTANT'
-            )
-        return v
+        return validate_strategy('retry_pause_strategy', v)
+
+    @validator('max_retry_pause')
+    def max_pause_should_be_bigger_than_zero(cls, v: Optional[int]) -> Optional[int]:
+        return validate_max_pause('max_retry_pause', v)
 
     @validator('retries_count')
     def value_should_be_bigger_than_zero(cls, v: int) -> int:
@@ -55,7 +105,52 @@ class ErrorsHandleConfig(BaseModel):
 
 class PostponeConfig(BaseModel):
     max_postpones: int
+    postpone_pause_strategy: str = const.DELAY_STRATEGY_CONSTANT
+    max_postpone_pause: Optional[int] = None
+
+    def get_new_datetime_for_postpone(
+        self, postpone_signal: PostponeTask, postpone_num: int = 1
+    ) -> datetime:
+        """Time to postpone task to. Delay, passed with signal,
+        is used as a base pause of strategy
+        """
+        delay = get_delay_seconds(
+            self.postpone_pause_strategy,
+            postpone_signal.postpone_for_seconds,
+            postpone_num,
+            self.max_postpone_pause,
+        )
+        return timezone.now() + timedelta(seconds=delay)
+
+    @validator('postpone_pause_strategy')
+    def strategy_must_be_one_of_defined(cls, v: str) -> str:
+        return validate_strategy('postpone_pause_strategy', v)
+
+    @validator('max_postpone_pause')
+    def max_pause_should_be_bigger_than_zero(cls, v: Optional[int]) -> Optional[int]:
+        return validate_max_pause('max_postpone_pause', v)
+
+
+class RateLimitConfig(BaseModel):
+    """Limits how many tasks of processor are claimed for processing
+    per `per_seconds` across all managers
+    """
+
+    max_tasks: int
+    per_seconds: float = 1
+
+    @validator('max_tasks')
+    def value_should_be_bigger_than_zero(cls, v: int) -> int:
+        if v < 1:
+            raise ValueError('"max_tasks" should be equal or bigger then 1')
+        return v
+
+    @validator('per_seconds')
+    def value_should_be_positive(cls, v: float) -> float:
+        if v <= 0:
+            raise ValueError('"per_seconds" should be bigger then 0')
+        return v
 
-    def get_new_datetime_for_postpone(self, postpone_signal: PostponeTask) -> datetime:
-        now = timezone.now()
-        return now + timedelta(seconds=postpone_signal.postpone_for_seconds)
+    @property
+    def tasks_per_second(self) -> float:
+        return self.max_tasks / self.per_seconds
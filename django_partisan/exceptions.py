@@ -32,6 +32,14 @@ class ProcessorClassAlreadyRegistered(ProcessorClassException):
     message = 'Processor class {} already registered'
 
 
+class UniqueTaskConflict(PartisanException):
+    def __init__(self, processor_class_name: str, attempts: int) -> None:
+        super().__init__(
+            f'Unique task of {processor_class_name} was neither created nor found '
+            f'pending in {attempts} attempts'
+        )
+
+
 class Postpone(Exception):
     """Base Exception for postponing"""
 
@@ -0,0 +1,101 @@
+import logging
+from datetime import timedelta
+from typing import Any, Optional
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from django_partisan import partitioning
+from django_partisan.settings import PARTISAN_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Maintains partitions of finished tasks: creates them for next days '
+        'and drops ones, older than retention of all queues'
+    )
+
+    def add_arguments(self, parser) -> None:  # type: ignore
+        parser.add_argument(
+            '--convert',
+            action='store_true',
+            help='Convert tasks table to partitioned one. '
+            'Table is locked while tasks are copied',
+        )
+        parser.add_argument(
+            '--revert',
+            action='store_true',
+            help='Convert partitioned tasks table back to not partitioned one',
+        )
+        parser.add_argument(
+            '--days_ahead',
+            type=int,
+            default=7,
+            help='Count of days, partitions for finished tasks are created ahead for',
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        if connection.pg_version < partitioning.MIN_PG_VERSION:
+            raise CommandError(
+                'Partitioning of tasks table needs PostgreSQL 14 or newer, '
+                'as partitions are detached concurrently'
+            )
+        if options['revert']:
+            if not partitioning.is_partitioned():
+                raise CommandError('Tasks table is not partitioned')
+            partitioning.convert_to_plain()
+            self.stdout.write('Tasks table is converted to not partitioned')
+            return
+        if options['convert']:
+            if partitioning.is_partitioned():
+                raise CommandError('Tasks table is already partitioned')
+            created_partitions = partitioning.convert_to_partitioned(
+                options['days_ahead']
+            )
+            self.stdout.write('Tasks table is converted to partitioned')
+        elif not partitioning.is_partitioned():
+            raise CommandError(
+                'Tasks table is not partitioned, run command with --convert first'
+            )
+        else:
+            created_partitions = partitioning.create_daily_partitions(
+                options['days_ahead']
+            )
+        for partition_name in created_partitions:
+            self.stdout.write(f'Created partition "{partition_name}"')
+
+        if any(settings.ARCHIVE_PRUNED_TASKS for settings in PARTISAN_CONFIG.values()):
+            self.stdout.write(
+                'Partitions are not dropped, as pruned tasks are archived '
+                'for some queues, run prune_partisan instead'
+            )
+            return
+        retention_seconds = self.get_retention_seconds()
+        if retention_seconds is None:
+            self.stdout.write(
+                'Partitions are not dropped, as retention is not set for all queues'
+            )
+            return
+        older_than = timezone.now() - timedelta(seconds=retention_seconds)
+        for partition_name in partitioning.drop_daily_partitions(older_than.date()):
+            self.stdout.write(f'Dropped partition "{partition_name}"')
+
+    @staticmethod
+    def get_retention_seconds() -> Optional[int]:
+        """Partition holds finished and failed tasks of all queues, so it can be
+        dropped only after the longest retention of them
+        """
+        retentions = [
+            retention_seconds
+            for settings in PARTISAN_CONFIG.values()
+            for retention_seconds in (
+                settings.FINISHED_TASKS_RETENTION_SECONDS,
+                settings.ERROR_TASKS_RETENTION_SECONDS,
+            )
+        ]
+        if None in retentions:
+            return None
+        return max(retentions)  # type: ignore
@@ -0,0 +1,89 @@
+import logging
+import time
+from datetime import timedelta
+from typing import Any, Optional
+
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from django_partisan.models import Task
+from django_partisan.settings import PARTISAN_CONFIG, get_queue_settings
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes or archives finished and failed tasks, older than '
+        'FINISHED_TASKS_RETENTION_SECONDS and ERROR_TASKS_RETENTION_SECONDS'
+    )
+
+    def add_arguments(self, parser) -> None:  # type: ignore
+        parser.add_argument(
+            '--queue_names',
+            type=str,
+            nargs='+',
+            help='Queues names to prune. All configured queues by default',
+        )
+        parser.add_argument(
+            '--batch_size',
+            type=int,
+            default=1000,
+            help='Count of tasks, pruned by one query',
+        )
+        parser.add_argument(
+            '--sleep_seconds',
+            type=float,
+            default=0,
+            help='Time in seconds, to sleep between batches',
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        for queue_name in options.get('queue_names') or PARTISAN_CONFIG:
+            settings = get_queue_settings(queue_name)
+            for status, retention_seconds in (
+                (Task.STATUS_FINISHED, settings.FINISHED_TASKS_RETENTION_SECONDS),
+                (Task.STATUS_ERROR, settings.ERROR_TASKS_RETENTION_SECONDS),
+            ):
+                pruned_count = self.prune(
+                    queue_name,
+                    status,
+                    retention_seconds,
+                    settings.ARCHIVE_PRUNED_TASKS,
+                    options['batch_size'],
+                    options['sleep_seconds'],
+                )
+                self.stdout.write(
+                    '{} {} "{}" tasks of "{}" queue'.format(
+                        'Archived' if settings.ARCHIVE_PRUNED_TASKS else 'Deleted',
+                        pruned_count,
+                        status,
+                        queue_name,
+                    )
+                )
+
+    @staticmethod
+    def prune(
+        queue_name: str,
+        status: str,
+        retention_seconds: Optional[int],
+        archive: bool,
+        batch_size: int,
+        sleep_seconds: float,
+    ) -> int:
+        """Prunes tasks by batches, each in its own transaction,
+        until there are no more tasks to prune
+        """
+        if retention_seconds is None:
+            return 0
+        older_than = timezone.now() - timedelta(seconds=retention_seconds)
+        pruned_count = 0
+        while True:
+            batch_count = Task.objects.prune_tasks(
+                queue_name, status, older_than, batch_size, archive=archive
+            )
+            pruned_count += batch_count
+            logger.debug('Pruned %d tasks of "%s" queue', batch_count, queue_name)
+            if batch_count < batch_size:
+                return pruned_count
+            time.sleep(sleep_seconds)
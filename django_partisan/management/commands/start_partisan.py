@@ -3,7 +3,11 @@ from typing import Any
 
 from django.core.management import BaseCommand
 
-from django_partisan.settings.const import DEFAULT_QUEUE_NAME
+from django_partisan.settings.const import (
+    DEFAULT_QUEUE_NAME,
+    FETCH_STRATEGY_WEIGHTED,
+    FETCH_STRATEGIES,
+)
 from django_partisan.workers_manager import WorkersManager
 
 logger = logging.getLogger(__name__)
@@ -32,6 +36,12 @@ class Command(BaseCommand):
             type=int,
             help='Count of workers, that should be spanwed for this instance',
         )
+        parser.add_argument(
+            '--min_workers_count',
+            type=int,
+            help='Minimal count of workers, if workers should be scaled '
+            'by count of tasks',
+        )
         parser.add_argument(
             '--sleep_delay_seconds',
             type=int,
@@ -43,14 +53,32 @@ class Command(BaseCommand):
             help='Queue name to work with',
             default=DEFAULT_QUEUE_NAME,
         )
+        parser.add_argument(
+            '--queue_names',
+            type=str,
+            nargs='+',
+            help='Queues names to work with by one workers pool. '
+            'Overrides --queue_name',
+        )
+        parser.add_argument(
+            '--fetch_strategy',
+            type=str,
+            choices=FETCH_STRATEGIES,
+            default=FETCH_STRATEGY_WEIGHTED,
+            help='How to fetch tasks from several queues: '
+            'by QUEUE_WEIGHT of queues or in order of queues',
+        )
 
     def handle(self, *args: Any, **options: Any) -> None:
         manager = WorkersManager(
             queue_name=options['queue_name'],
+            queue_names=options.get('queue_names'),
+            fetch_strategy=options['fetch_strategy'],
             min_queue_size=options.get('min_queue_size'),
             max_queue_size=options.get('max_queue_size'),
             checks_before_cleanup=options.get('checks_before_cleanup'),
             workers_count=options.get('workers_count'),
+            min_workers_count=options.get('min_workers_count'),
             sleep_delay_seconds=options.get('sleep_delay_seconds'),
         )
         manager.run_partisan()
@@ -0,0 +1,227 @@
+import logging
+import math
+import multiprocessing as mp
+import os
+import threading
+import time
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from queue import Empty
+from typing import Optional, Dict, Tuple, List, Any, Iterator
+
+logger = logging.getLogger(__name__)
+
+COUNTER = 'counter'
+HISTOGRAM = 'histogram'
+GAUGE = 'gauge'
+
+TASKS_CLAIMED = 'partisan_tasks_claimed_total'
+TASKS_COMPLETED = 'partisan_tasks_completed_total'
+TASKS_FAILED = 'partisan_tasks_failed_total'
+TASKS_RETRIED = 'partisan_tasks_retried_total'
+TASKS_POSTPONED = 'partisan_tasks_postponed_total'
+TASK_DURATION = 'partisan_task_duration_seconds'
+TASK_LAG = 'partisan_task_lag_seconds'
+LOCAL_QUEUE_DEPTH = 'partisan_local_queue_depth'
+WORKER_RESTARTS = 'partisan_worker_restarts_total'
+
+METRICS = {
+    TASKS_CLAIMED: (COUNTER, 'Tasks claimed by manager'),
+    TASKS_COMPLETED: (COUNTER, 'Tasks successfully processed'),
+    TASKS_FAILED: (COUNTER, 'Tasks failed with error'),
+    TASKS_RETRIED: (COUNTER, 'Tasks redelayed for retry on error'),
+    TASKS_POSTPONED: (COUNTER, 'Tasks postponed by processor'),
+    TASK_DURATION: (HISTOGRAM, 'Time of processor run'),
+    TASK_LAG: (HISTOGRAM, 'Time between task execute_after and its claim'),
+    LOCAL_QUEUE_DEPTH: (GAUGE, 'Tasks, waiting for workers in local queue'),
+    WORKER_RESTARTS: (COUNTER, 'Workers restarted after unexpected exit'),
+}
+
+BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    300,
+    600,
+    math.inf,
+)
+
+TEXTFILE_WRITE_INTERVAL_SECONDS = 5
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class MetricsRegistry:
+    """Aggregated metrics of manager and its workers"""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.values: Dict[str, Dict[Labels, float]] = {}
+        self.histograms: Dict[str, Dict[Labels, List[float]]] = {}
+
+    def record(self, name: str, value: float, labels: Labels) -> None:
+        kind, _ = METRICS[name]
+        with self.lock:
+            if kind == HISTOGRAM:
+                self.observe(name, value, labels)
+            elif kind == GAUGE:
+                self.values.setdefault(name, {})[labels] = value
+            else:
+                metric_values = self.values.setdefault(name, {})
+                metric_values[labels] = metric_values.get(labels, 0) + value
+
+    def observe(self, name: str, value: float, labels: Labels) -> None:
+        # Cumulative buckets counts, then sum and count of observed values
+        histogram = self.histograms.setdefault(name, {}).setdefault(
+            labels, [0.0] * (len(BUCKETS) + 2)
+        )
+        for i, bucket in enumerate(BUCKETS):
+            if value <= bucket:
+                histogram[i] += 1
+        histogram[-2] += value
+        histogram[-1] += 1
+
+    def render(self) -> str:
+        """Metrics in Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            for name, (kind, help_text) in METRICS.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in sorted(self.values.get(name, {}).items()):
+                    lines.append(f'{name}{format_labels(labels)} {value}')
+                for labels, histogram in sorted(self.histograms.get(name, {}).items()):
+                    lines.extend(self.render_histogram(name, labels, histogram))
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def render_histogram(
+        name: str, labels: Labels, histogram: List[float]
+    ) -> Iterator[str]:
+        for bucket, count in zip(BUCKETS, histogram):
+            le = '+Inf' if bucket == math.inf else str(bucket)
+            yield f'{name}_bucket{format_labels(labels + (("le", le),))} {count}'
+        yield f'{name}_sum{format_labels(labels)} {histogram[-2]}'
+        yield f'{name}_count{format_labels(labels)} {histogram[-1]}'
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    formatted = ','.join(
+        '{}="{}"'.format(
+            name,
+            value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'),
+        )
+        for name, value in labels
+    )
+    return f'{{{formatted}}}'
+
+
+_registry: Optional[MetricsRegistry] = None
+_events_queue: Optional[mp.Queue] = None
+
+
+def record(
+    name: str, labels: Optional[Dict[str, str]] = None, value: float = 1
+) -> None:
+    """Records metric value in manager registry or sends it to manager
+    from worker. Does nothing, if metrics are not enabled
+    """
+    if _events_queue is not None:
+        _events_queue.put((name, value, tuple(sorted((labels or {}).items()))))
+    elif _registry is not None:
+        _registry.record(name, value, tuple(sorted((labels or {}).items())))
+
+
+def use_events_queue(events_queue: Optional[mp.Queue]) -> None:
+    """Makes metrics, recorded in this process, to be sent to manager"""
+    global _events_queue, _registry
+    _events_queue = events_queue
+    _registry = None
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        body = self.server.registry.render().encode()  # type: ignore
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+class MetricsCollector:
+    """Collects metrics, sent by workers, in manager registry and exposes them
+    over HTTP port and/or by writing textfile for node exporter
+    """
+
+    def __init__(
+        self,
+        port: Optional[int] = None,
+        textfile: Optional[str] = None,
+        host: str = '127.0.0.1',
+    ):
+        self.port = port
+        self.host = host
+        self.textfile = textfile
+        self.registry = MetricsRegistry()
+        self.events: mp.Queue = mp.Queue()
+        self.server: Optional[HTTPServer] = None
+        self.last_textfile_write_time: Optional[float] = None
+
+    def start(self) -> None:
+        global _registry, _events_queue
+        _registry = self.registry
+        _events_queue = None
+        if self.port is not None:
+            self.server = HTTPServer((self.host, self.port), MetricsHandler)
+            self.server.registry = self.registry  # type: ignore
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+            logger.info('Serving metrics on %s:%d', self.host, self.port)
+
+    def collect(self) -> None:
+        """Aggregates metrics, sent by workers, and writes textfile"""
+        while True:
+            try:
+                name, value, labels = self.events.get(block=False)
+            except Empty:
+                break
+            self.registry.record(name, value, labels)
+        now = time.monotonic()
+        if self.textfile is not None and (
+            self.last_textfile_write_time is None
+            or now - self.last_textfile_write_time >= TEXTFILE_WRITE_INTERVAL_SECONDS
+        ):
+            self.write_textfile()
+            self.last_textfile_write_time = now
+
+    def write_textfile(self) -> None:
+        if self.textfile is None:
+            return
+        tmp_path = f'{self.textfile}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as textfile:
+            textfile.write(self.registry.render())
+        os.replace(tmp_path, self.textfile)
+
+    def close(self) -> None:
+        global _registry
+        self.collect()
+        self.write_textfile()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        _registry = None
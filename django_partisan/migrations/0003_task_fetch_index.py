@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_partisan', '0002_auto_20200721_0300'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=(
+                'CREATE INDEX "django_partisan_task_fetch_idx" '
+                'ON "django_partisan_task" ("queue_name", "priority" DESC, "execute_after") '
+                'WHERE "status" = \'new\''
+            ),
+            reverse_sql='DROP INDEX IF EXISTS "django_partisan_task_fetch_idx"',
+        ),
+    ]
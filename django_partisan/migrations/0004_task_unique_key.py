@@ -0,0 +1,24 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_partisan', '0003_task_fetch_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='unique_key',
+            field=models.CharField(editable=False, max_length=64, null=True),
+        ),
+        migrations.RunSQL(
+            sql=(
+                'CREATE UNIQUE INDEX "django_partisan_task_unique_key_idx" '
+                'ON "django_partisan_task" ("unique_key") '
+                'WHERE "status" = \'new\''
+            ),
+            reverse_sql='DROP INDEX IF EXISTS "django_partisan_task_unique_key_idx"',
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_partisan', '0004_task_unique_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='owner',
+            field=models.CharField(editable=False, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='lease_expires_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunSQL(
+            sql=(
+                'CREATE INDEX "django_partisan_task_lease_idx" '
+                'ON "django_partisan_task" ("queue_name", "lease_expires_at") '
+                'WHERE "status" = \'in_process\''
+            ),
+            reverse_sql='DROP INDEX IF EXISTS "django_partisan_task_lease_idx"',
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_partisan', '0005_task_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='claimed_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='started_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='run_duration_ms',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.1.14 on 2026-10-17 12:52
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_partisan', '0006_task_timing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTask',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('new', 'New'), ('in_process', 'In Process'), ('error', 'Error'), ('finished', 'Finished')], max_length=20)),
+                ('queue_name', models.CharField(max_length=50)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('processor_class', models.CharField(max_length=128)),
+                ('priority', models.IntegerField()),
+                ('execute_after', models.DateTimeField()),
+                ('arguments', django.contrib.postgres.fields.jsonb.JSONField(default=dict)),
+                ('extra', django.contrib.postgres.fields.jsonb.JSONField(default=dict)),
+                ('claimed_at', models.DateTimeField(null=True)),
+                ('started_at', models.DateTimeField(null=True)),
+                ('run_duration_ms', models.PositiveIntegerField(null=True)),
+                ('archived_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_partisan', '0008_ratelimitbucket'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=(
+                'CREATE INDEX "django_partisan_task_prune_idx" '
+                'ON "django_partisan_task" ("queue_name", "status", "updated_at") '
+                'WHERE "status" IN (\'finished\', \'error\')'
+            ),
+            reverse_sql='DROP INDEX IF EXISTS "django_partisan_task_prune_idx"',
+        ),
+    ]
@@ -1,17 +1,73 @@
-from datetime import timedelta
-from typing import Optional, Any, TYPE_CHECKING, List
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from concurrent.futures import Executor
+from contextlib import contextmanager, ExitStack
+from datetime import datetime, timedelta
+from typing import Optional, Any, TYPE_CHECKING, List, NamedTuple, Dict, Iterator
 
 from django.contrib.postgres.fields import JSONField
-from django.db import models, transaction
-from django.db.models import QuerySet
+from django.db import (
+    models,
+    transaction,
+    connections,
+    router,
+    IntegrityError,
+    OperationalError,
+)
+from django.db.models import QuerySet, Q, Case, When, Value, F, Count
 from django.utils import timezone
+from django.utils.functional import cached_property
 
-from django_partisan.config.processor_configs import PostponeConfig, ErrorsHandleConfig
+from django_partisan import metrics
+from django_partisan.config.processor_configs import (
+    PostponeConfig,
+    ErrorsHandleConfig,
+    RateLimitConfig,
+)
 from django_partisan.exceptions import PostponeTask, MaxPostponesReached
 from django_partisan.settings import get_queue_settings, const
+from django_partisan.settings.settings_models import QueueSettings
 
 if TYPE_CHECKING:
-    from django_partisan.processor import BaseTaskProcessor
+    from django_partisan.processor import BaseTaskProcessor, BatchTaskProcessor
+
+logger = logging.getLogger(__name__)
+
+CONCURRENCY_LOCK_PREFIX = 'django_partisan.concurrency:'
+
+# Order of tasks claim, served by fetch index
+CLAIM_ORDERING = ('-priority', 'execute_after')
+
+# SQLSTATE of update of row, moved to another partition by concurrent update
+SERIALIZATION_FAILURE = '40001'
+LEASE_UPDATE_ATTEMPTS = 3
+
+
+class TaskMessage(NamedTuple):
+    """Compact representation of claimed task to be passed to workers"""
+
+    id: int
+    processor_class: str
+    arguments: Dict[str, Any]
+    extra: Dict[str, Any]
+    queue_name: str
+
+
+class TaskTiming(NamedTuple):
+    """Timing of processed task to be saved with batched completion"""
+
+    started_at: datetime
+    run_duration_ms: int
+
+
+class ClaimLimits(NamedTuple):
+    """Limits of processor, checked when its tasks are claimed"""
+
+    rate_limit: Optional[RateLimitConfig] = None
+    max_concurrency: Optional[int] = None
 
 
 class TasksManager(models.Manager):
@@ -24,19 +80,420 @@ class TasksManager(models.Manager):
             status=Task.STATUS_IN_PROCESS
         ).update(status=Task.STATUS_NEW)
 
+    def renew_leases(
+        self, owner: str, queue_name: str = const.DEFAULT_QUEUE_NAME
+    ) -> int:
+        """Prolongs leases of tasks, claimed by owner, for TASK_LEASE_SECONDS"""
+        return self._update_claimed(
+            self.get_queryset().filter(
+                status=Task.STATUS_IN_PROCESS, owner=owner, queue_name=queue_name
+            ),
+            lease_expires_at=Task.get_lease_expiry(queue_name),
+        )
+
+    def release_tasks(
+        self, owner: str, queue_name: str = const.DEFAULT_QUEUE_NAME
+    ) -> int:
+        """Returns tasks, claimed by owner, to initial status"""
+        return self._requeue(
+            self.get_queryset().filter(
+                status=Task.STATUS_IN_PROCESS, owner=owner, queue_name=queue_name
+            )
+        )
+
+    def release_claimed_tasks(self, owner: str, tasks_ids: List[int]) -> int:
+        """Returns to initial status tasks from tasks_ids, still claimed by owner"""
+        return self._requeue(
+            self.get_queryset().filter(
+                pk__in=tasks_ids, status=Task.STATUS_IN_PROCESS, owner=owner
+            )
+        )
+
+    def requeue_expired_tasks(self, queue_name: str = const.DEFAULT_QUEUE_NAME) -> int:
+        """Returns to initial status tasks, which owners didn't renew
+        their leases in time. Tasks without lease are considered expired
+        """
+        return self._requeue(
+            self.get_queryset().filter(
+                Q(lease_expires_at__lt=timezone.now())
+                | Q(lease_expires_at__isnull=True),
+                status=Task.STATUS_IN_PROCESS,
+                queue_name=queue_name,
+            )
+        )
+
+    def _requeue(self, tasks_qs: QuerySet) -> int:
+        return self._update_claimed(
+            tasks_qs,
+            status=Task.STATUS_NEW,
+            owner=None,
+            lease_expires_at=None,
+            updated_at=timezone.now(),
+        )
+
+    def _update_claimed(self, tasks_qs: QuerySet, **values: Any) -> int:
+        """Updates claimed tasks. In partitioned table task, completed during
+        update, is moved to another partition and update fails, so it's retried
+        and skips completed task
+        """
+        for attempt in range(1, LEASE_UPDATE_ATTEMPTS + 1):
+            try:
+                with transaction.atomic(using=self.db):
+                    return tasks_qs.update(**values)
+            except OperationalError as err:
+                pgcode = getattr(err.__cause__, 'pgcode', None)
+                if pgcode != SERIALIZATION_FAILURE or attempt == LEASE_UPDATE_ATTEMPTS:
+                    raise
+                logger.warning('Claimed tasks update conflicted, retrying')
+        return 0  # pragma: no cover
+
+    def reschedule_task(
+        self,
+        task_id: int,
+        execute_after: datetime,
+        counter: Optional[str] = None,
+        unique_key: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Returns task to queue with one UPDATE. If counter is passed, its
+        count in `extra` is incremented by the same statement. Unique key,
+        dropped on claim, is restored, so new tasks are deduplicated with
+        rescheduled one. If pending task with the same key already exists,
+        rescheduled task is deleted as its duplicate.
+        Returns updated `extra` or None, if task doesn't exist or was deleted
+        """
+        if unique_key is None:
+            return self._reschedule_task(task_id, execute_after, counter, None)
+        try:
+            with transaction.atomic(using=self.db):
+                return self._reschedule_task(
+                    task_id, execute_after, counter, unique_key
+                )
+        except IntegrityError:
+            self.get_queryset().filter(pk=task_id).delete()
+            return None
+
+    def _reschedule_task(
+        self,
+        task_id: int,
+        execute_after: datetime,
+        counter: Optional[str],
+        unique_key: Optional[str],
+    ) -> Optional[Dict[str, Any]]:
+        connection = connections[self.db]
+        table_name = connection.ops.quote_name(self.model._meta.db_table)
+        extra_sql = '"extra"'
+        counter_params: List[Any] = []
+        if counter is not None:
+            extra_sql = (
+                'jsonb_set("extra", %s, jsonb_build_object('
+                '\'count\', COALESCE(("extra" #>> %s)::integer, 0) + 1))'
+            )
+            counter_params = [[counter], [counter, 'count']]
+        reschedule_sql = (
+            f'UPDATE {table_name} SET "status" = %s, "execute_after" = %s, '
+            f'"updated_at" = %s, "owner" = NULL, "lease_expires_at" = NULL, '
+            f'"unique_key" = %s, "extra" = {extra_sql} '
+            f'WHERE "id" = %s RETURNING "id", "extra"'
+        )
+        params = [
+            Task.STATUS_NEW,
+            execute_after,
+            timezone.now(),
+            unique_key,
+            *counter_params,
+            task_id,
+        ]
+        for task in self.raw(reschedule_sql, params):
+            return task.extra
+        return None
+
+    def create_unique(self, **task_data: Any) -> Optional['Task']:
+        """Creates task with INSERT ... ON CONFLICT DO NOTHING.
+        Returns None, if pending task with the same unique key already exists
+        """
+        created_tasks = self.bulk_create_unique([self.model(**task_data)])
+        return created_tasks[0] if created_tasks else None
+
+    def bulk_create_unique(self, tasks: List['Task']) -> List['Task']:
+        """Creates tasks with one INSERT ... ON CONFLICT DO NOTHING. Returns
+        created tasks, tasks with unique key of pending task are skipped
+        """
+        if not tasks:
+            return []
+        connection = connections[self.db]
+        fields = [
+            field for field in self.model._meta.concrete_fields if not field.primary_key
+        ]
+        values = [
+            field.get_db_prep_save(field.pre_save(task, True), connection)
+            for task in tasks
+            for field in fields
+        ]
+        row_sql = '({})'.format(', '.join(['%s'] * len(fields)))
+        insert_sql = (
+            'INSERT INTO {} ({}) VALUES {} ON CONFLICT DO NOTHING RETURNING {}, {}'
+        ).format(
+            connection.ops.quote_name(self.model._meta.db_table),
+            ', '.join(connection.ops.quote_name(field.column) for field in fields),
+            ', '.join([row_sql] * len(tasks)),
+            connection.ops.quote_name(self.model._meta.pk.column),
+            connection.ops.quote_name('unique_key'),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(insert_sql, values)
+            created_keys = dict((key, pk) for pk, key in cursor.fetchall())
+        created_tasks = []
+        for task in tasks:
+            # The first of tasks with the same key is inserted
+            pk = created_keys.pop(task.unique_key, None)
+            if pk is None:
+                continue
+            task.pk = pk
+            task._state.adding = False
+            task._state.db = self.db
+            created_tasks.append(task)
+        return created_tasks
+
+    def complete_tasks(
+        self,
+        tasks_ids: List[int],
+        delete: bool = False,
+        timings: Optional[Dict[int, TaskTiming]] = None,
+    ) -> None:
+        """Completes tasks with one query. If timings are passed,
+        they are saved with the same UPDATE
+        """
+        tasks_qs = self.get_queryset().filter(pk__in=tasks_ids)
+        if delete:
+            tasks_qs.delete()
+            return
+        timing_values: Dict[str, Any] = {}
+        if timings:
+            timing_values['started_at'] = Case(
+                *(
+                    When(pk=pk, then=Value(timing.started_at))
+                    for pk, timing in timings.items()
+                ),
+                default=F('started_at'),
+                output_field=models.DateTimeField(),
+            )
+            timing_values['run_duration_ms'] = Case(
+                *(
+                    When(pk=pk, then=Value(timing.run_duration_ms))
+                    for pk, timing in timings.items()
+                ),
+                default=F('run_duration_ms'),
+                output_field=models.PositiveIntegerField(),
+            )
+        tasks_qs.update(
+            status=Task.STATUS_FINISHED, updated_at=timezone.now(), **timing_values
+        )
+
+    def prune_tasks(
+        self,
+        queue_name: str,
+        status: str,
+        older_than: datetime,
+        batch_size: int,
+        archive: bool = False,
+    ) -> int:
+        """Deletes or moves to archive one batch of tasks with status,
+        not updated since older_than. Rows, locked by others, are skipped.
+        Returns count of pruned tasks
+        """
+        connection = connections[self.db]
+        ids_qs = (
+            self.get_queryset()
+            .filter(queue_name=queue_name, status=status, updated_at__lt=older_than)
+            .select_for_update(skip_locked=True)
+            .order_by()
+            .values('pk')[:batch_size]
+        )
+        ids_sql, params = ids_qs.query.get_compiler(using=self.db).as_sql()
+        table_name = connection.ops.quote_name(self.model._meta.db_table)
+        prune_sql = f'DELETE FROM {table_name} WHERE "id" IN ({ids_sql})'
+        if archive:
+            columns = ', '.join(
+                connection.ops.quote_name(field.column)
+                for field in ArchivedTask._meta.concrete_fields
+                if field.name != 'archived_at'
+            )
+            prune_sql = (
+                f'WITH pruned AS ({prune_sql} RETURNING {columns}) '
+                f'INSERT INTO {connection.ops.quote_name(ArchivedTask._meta.db_table)} '
+                f'({columns}, "archived_at") SELECT {columns}, %s FROM pruned'
+            )
+            params = (*params, timezone.now())
+        with connection.cursor() as cursor:
+            cursor.execute(prune_sql, params)
+            return cursor.rowcount
+
     @transaction.atomic
     def select_for_process(
-        self, count: Optional[int] = None, queue_name: str = const.DEFAULT_QUEUE_NAME
+        self,
+        count: Optional[int] = None,
+        queue_name: str = const.DEFAULT_QUEUE_NAME,
+        owner: Optional[str] = None,
+    ) -> List['Task']:
+        """Claims tasks for processing by owner till lease expiry. Tasks of
+        processors with RATE_LIMIT or MAX_CONCURRENCY are claimed, as much as
+        their limits allow, only if they are among count tasks with the highest
+        priority, other places are taken by tasks of not limited processors
+        """
+        tasks_qs = self._get_tasks_to_process_qs(queue_name)
+        claim_limits = self._get_claim_limits()
+        claimed_tasks: List[Task] = []
+        if claim_limits:
+            limited_counts = self._count_limited_tasks(tasks_qs, claim_limits, count)
+            for processor_name, limited_count in limited_counts.items():
+                claimed_tasks.extend(
+                    self._claim_limited(
+                        tasks_qs.filter(processor_class=processor_name),
+                        processor_name,
+                        claim_limits[processor_name],
+                        limited_count,
+                        queue_name,
+                        owner,
+                    )
+                )
+            tasks_qs = tasks_qs.exclude(processor_class__in=list(claim_limits))
+        if count is None:
+            claimed_tasks.extend(self._claim(tasks_qs, None, queue_name, owner))
+        elif len(claimed_tasks) < count:
+            claimed_tasks.extend(
+                self._claim(tasks_qs, count - len(claimed_tasks), queue_name, owner)
+            )
+        return sorted(claimed_tasks, key=lambda task: -task.priority)
+
+    def _claim(
+        self,
+        tasks_qs: QuerySet,
+        count: Optional[int],
+        queue_name: str,
+        owner: Optional[str],
+    ) -> List['Task']:
+        connection = connections[self.db]
+        if connection.vendor == 'postgresql' and getattr(
+            connection.features, 'has_select_for_update_skip_locked', False
+        ):
+            return self._claim_skip_locked(tasks_qs, count, queue_name, owner)
+        return self._claim_with_locks(tasks_qs, count, queue_name, owner)
+
+    def _count_limited_tasks(
+        self,
+        tasks_qs: QuerySet,
+        claim_limits: Dict[str, ClaimLimits],
+        count: Optional[int],
+    ) -> Dict[str, int]:
+        """Counts tasks of limited processors among count tasks to claim next,
+        so limits of processors without tasks in the queue are not checked
+        """
+        next_tasks_qs = tasks_qs.order_by(*CLAIM_ORDERING).values('pk')
+        if count is not None:
+            next_tasks_qs = next_tasks_qs[:count]
+        return dict(
+            self.get_queryset()
+            .filter(pk__in=next_tasks_qs, processor_class__in=list(claim_limits))
+            .order_by()
+            .values_list('processor_class')
+            .annotate(Count('pk'))
+        )
+
+    def _claim_limited(
+        self,
+        tasks_qs: QuerySet,
+        processor_name: str,
+        limits: ClaimLimits,
+        count: int,
+        queue_name: str,
+        owner: Optional[str],
     ) -> List['Task']:
-        base_qs = (
+        """Claims tasks of one processor, as much as its running tasks count
+        and rate limit bucket allow
+        """
+        if limits.max_concurrency is not None:
+            free_slots = limits.max_concurrency - self._lock_and_count_running(
+                processor_name
+            )
+            count = min(count, free_slots)
+        bucket = None
+        if limits.rate_limit is not None and count > 0:
+            bucket = RateLimitBucket.objects.acquire(processor_name, limits.rate_limit)
+            count = min(count, bucket.refill(limits.rate_limit))
+        if count < 1:
+            return []
+        tasks = self._claim(tasks_qs, count, queue_name, owner)
+        if bucket is not None and tasks:
+            bucket.consume(len(tasks))
+        return tasks
+
+    def _lock_and_count_running(self, processor_name: str) -> int:
+        """Counts claimed tasks of processor in all queues. Claims of processor
+        are serialized with advisory lock till the end of transaction,
+        so concurrent managers don't exceed its MAX_CONCURRENCY together.
+        Called only if processor has tasks to claim in the queue
+        """
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_advisory_xact_lock(hashtext(%s))',
+                [f'{CONCURRENCY_LOCK_PREFIX}{processor_name}'],
+            )
+        return (
+            self.get_queryset()
+            .filter(status=Task.STATUS_IN_PROCESS, processor_class=processor_name)
+            .count()
+        )
+
+    @staticmethod
+    def _get_claim_limits() -> Dict[str, ClaimLimits]:
+        from django_partisan.processor import BaseTaskProcessor
+
+        return BaseTaskProcessor.get_claim_limits()
+
+    def _get_tasks_to_process_qs(self, queue_name: str) -> QuerySet:
+        return (
             self.get_queryset()
-            .select_for_update()
             .filter(
                 status=Task.STATUS_NEW,
                 execute_after__lte=timezone.now(),
                 queue_name=queue_name,
             )
+            .order_by(*CLAIM_ORDERING)
         )
+
+    def _claim_skip_locked(
+        self,
+        tasks_qs: QuerySet,
+        count: Optional[int],
+        queue_name: str,
+        owner: Optional[str],
+    ) -> List['Task']:
+        """Fetch and mark tasks in one round trip, skipping rows
+        already locked by another manager. Ids are selected into array,
+        so planner can't rerun limited subquery and claim other tasks
+        """
+        connection = connections[self.db]
+        ids_qs = tasks_qs.select_for_update(skip_locked=True).values('pk')
+        if count is not None:
+            ids_qs = ids_qs[:count]
+        ids_sql, ids_params = ids_qs.query.get_compiler(using=self.db).as_sql()
+        table_name = connection.ops.quote_name(self.model._meta.db_table)
+        claim_values = self._get_claim_values(queue_name, owner)
+        set_sql = ', '.join(f'"{column}" = %s' for column in claim_values)
+        claim_sql = (
+            f'UPDATE {table_name} SET {set_sql} '
+            f'WHERE "id" = ANY(ARRAY({ids_sql})) RETURNING *'
+        )
+        return list(self.raw(claim_sql, [*claim_values.values(), *ids_params]))
+
+    def _claim_with_locks(
+        self,
+        tasks_qs: QuerySet,
+        count: Optional[int],
+        queue_name: str,
+        owner: Optional[str],
+    ) -> List['Task']:
+        base_qs = tasks_qs.select_for_update()
         if count is not None:
             base_qs = base_qs.all()[:count]
         new_tasks_list = list(base_qs.values_list('pk', flat=True))
@@ -44,10 +501,23 @@ class TasksManager(models.Manager):
             self.get_queryset().select_for_update().filter(id__in=new_tasks_list)
         )
         self.get_queryset().select_for_update().filter(id__in=new_tasks_list).update(
-            status=Task.STATUS_IN_PROCESS
+            **self._get_claim_values(queue_name, owner)
         )
         return list(selected_tasks)
 
+    @staticmethod
+    def _get_claim_values(queue_name: str, owner: Optional[str]) -> Dict[str, Any]:
+        # Claimed task doesn't block new ones, key is restored by reschedule_task
+        claim_values = {
+            'status': Task.STATUS_IN_PROCESS,
+            'unique_key': None,
+            'owner': owner,
+            'lease_expires_at': Task.get_lease_expiry(queue_name),
+        }
+        if get_queue_settings(queue_name).TRACK_TASK_TIMING:
+            claim_values['claimed_at'] = timezone.now()
+        return claim_values
+
 
 class Task(models.Model):
     STATUS_NEW = 'new'
@@ -60,6 +530,8 @@ class Task(models.Model):
         (STATUS_ERROR, 'Error'),
         (STATUS_FINISHED, 'Finished'),
     )
+    COUNTER_RETRIES = 'retries'
+    COUNTER_POSTPONES = 'postpones'
 
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_NEW)
     queue_name = models.CharField(max_length=50, default=const.DEFAULT_QUEUE_NAME)
@@ -70,12 +542,70 @@ class Task(models.Model):
     execute_after = models.DateTimeField(default=timezone.now)
     arguments = JSONField(default=dict)
     extra = JSONField(default=dict)
+    unique_key = models.CharField(max_length=64, null=True, editable=False)
+    owner = models.CharField(max_length=255, null=True, editable=False)
+    lease_expires_at = models.DateTimeField(null=True, editable=False)
+    claimed_at = models.DateTimeField(null=True, editable=False)
+    started_at = models.DateTimeField(null=True, editable=False)
+    run_duration_ms = models.PositiveIntegerField(null=True, editable=False)
 
     objects = TasksManager()
 
-    def __init__(self, *args: Any, **kwargs: Any) -> None:
-        super().__init__(*args, **kwargs)
-        self.settings = get_queue_settings(self.queue_name)
+    @cached_property
+    def settings(self) -> QueueSettings:
+        """Settings of task queue. Resolved on first use, as most of
+        fetched tasks never need them, and not pickled with task
+        """
+        return get_queue_settings(self.queue_name)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = super().__getstate__()
+        state.pop('settings', None)
+        return state
+
+    @staticmethod
+    def get_unique_key(processor_class: str, arguments: Dict[str, Any]) -> str:
+        """Hash of processor class and canonical arguments, pending tasks
+        of UNIQUE_FOR_PARAMS processors are deduplicated by it
+        """
+        canonical_arguments = json.dumps(
+            arguments, sort_keys=True, separators=(',', ':')
+        )
+        return hashlib.sha256(
+            f'{processor_class}:{canonical_arguments}'.encode()
+        ).hexdigest()
+
+    @staticmethod
+    def get_lease_expiry(queue_name: str) -> datetime:
+        return timezone.now() + timedelta(
+            seconds=get_queue_settings(queue_name).TASK_LEASE_SECONDS
+        )
+
+    def to_message(self) -> TaskMessage:
+        return TaskMessage(
+            id=self.pk,
+            processor_class=self.processor_class,
+            arguments=self.arguments,
+            extra=self.extra,
+            queue_name=self.queue_name,
+        )
+
+    @classmethod
+    def from_message(cls, message: TaskMessage) -> 'Task':
+        """Rebuilds claimed task without database query.
+        Fields, not passed in message, are deferred
+        """
+        values = {**message._asdict(), 'status': cls.STATUS_IN_PROCESS}
+        field_names = [
+            field.attname
+            for field in cls._meta.concrete_fields
+            if field.attname in values
+        ]
+        return cls.from_db(
+            router.db_for_write(cls),
+            field_names,
+            [values[field_name] for field_name in field_names],
+        )
 
     def get_initialized_processor(self) -> 'BaseTaskProcessor':
         from django_partisan.processor import BaseTaskProcessor
@@ -85,18 +615,102 @@ class Task(models.Model):
 
     def run(self) -> Any:
         processor = self.get_initialized_processor()
-        retries_config = processor.RETRY_ON_ERROR_CONFIG
-        postpones_config = processor.POSTPONE_CONFIG
-        errors_to_retry_on = (
-            retries_config.retry_on_errors if retries_config is not None else ()
-        )
+        try:
+            with self.track_run():
+                return processor.run()
+        except Exception as err:
+            self.handle_exception(processor, err)
+
+    async def run_async(self, executor: Optional[Executor] = None) -> Any:
+        """Awaits async processor or runs sync one in executor.
+        Postpones and retries are handled in executor, as they touch database
+        """
+        processor = self.get_initialized_processor()
+        loop = asyncio.get_event_loop()
+        try:
+            with self.track_run():
+                if asyncio.iscoroutinefunction(processor.run):
+                    return await processor.run()
+                return await loop.run_in_executor(executor, processor.run)
+        except Exception as err:
+            await loop.run_in_executor(executor, self.handle_exception, processor, err)
 
+    @classmethod
+    def run_batch(cls, tasks: List['Task']) -> List[Optional[Exception]]:
+        """Runs tasks of one batch processor with one `run_batch()` call.
+        Errors are postponed or retried per task, as in `run()`.
+        Returns not handled errors of tasks, None for processed ones
+        """
+        processors: List['BatchTaskProcessor'] = []
         try:
-            return processor.run()
-        except PostponeTask as postpone_signal:
-            self.handle_postpone(processor, postpones_config, postpone_signal)
-        except errors_to_retry_on as error_signal:
-            self.handle_error(processor, retries_config, error_signal)
+            processors = [
+                task.get_initialized_processor() for task in tasks  # type: ignore
+            ]
+            with ExitStack() as stack:
+                for task in tasks:
+                    stack.enter_context(task.track_run())
+                errors = type(processors[0]).run_batch(
+                    [(processor.args, processor.kwargs) for processor in processors]
+                )
+            if errors is not None and len(errors) != len(tasks):
+                raise ValueError(
+                    f'run_batch() returned {len(errors)} errors for {len(tasks)} tasks'
+                )
+        except Exception as err:
+            if not processors:
+                return [err] * len(tasks)
+            errors = [err] * len(tasks)
+        if errors is None:
+            return [None] * len(tasks)
+        not_handled_errors: List[Optional[Exception]] = []
+        for task, processor, error in zip(tasks, processors, errors):
+            if error is not None:
+                try:
+                    task.handle_exception(processor, error)
+                    error = None
+                except Exception as err:
+                    error = err
+            not_handled_errors.append(error)
+        return not_handled_errors
+
+    @contextmanager
+    def track_run(self) -> Iterator[None]:
+        """Measures processor run time. Keeps start time and duration to be
+        saved on completion, if TRACK_TASK_TIMING is set, and logs tasks,
+        running longer than SLOW_TASK_THRESHOLD_MS
+        """
+        started_at = timezone.now()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            duration = time.monotonic() - started
+            metrics.record(metrics.TASK_DURATION, self.get_metric_labels(), duration)
+            if self.settings.TRACK_TASK_TIMING:
+                self.started_at = started_at
+                self.run_duration_ms = round(duration * 1000)
+            threshold = self.settings.SLOW_TASK_THRESHOLD_MS
+            if threshold is not None and duration * 1000 >= threshold:
+                logger.warning(
+                    'Slow task %s with arguments %r took %.3f seconds',
+                    self.processor_class,
+                    self.arguments,
+                    duration,
+                )
+
+    def handle_exception(self, processor: 'BaseTaskProcessor', err: Exception) -> None:
+        """Postpones or redelays task for retry, if processor is configured so.
+        Otherwise raises error
+        """
+        retries_config = processor.RETRY_ON_ERROR_CONFIG
+        if isinstance(err, PostponeTask):
+            self.handle_postpone(processor, processor.POSTPONE_CONFIG, err)
+        elif retries_config is not None and isinstance(
+            err, retries_config.retry_on_errors
+        ):
+            self.handle_error(processor, retries_config, err)
+        else:
+            raise err
 
     def handle_postpone(
         self,
@@ -113,11 +727,18 @@ class Task(models.Model):
             and postpone_num > self.settings.DEFAULT_POSTPONES_COUNT
         ):
             raise MaxPostponesReached(postpone_num)
-        self.postpones_count = postpone_num
-        new_start_time_for_task = timezone.now() + timedelta(
-            seconds=postpone_signal.postpone_for_seconds
+        if postpones_config is not None:
+            new_start_time_for_task = postpones_config.get_new_datetime_for_postpone(
+                postpone_signal, postpone_num
+            )
+        else:
+            new_start_time_for_task = timezone.now() + timedelta(
+                seconds=postpone_signal.postpone_for_seconds
+            )
+        processor.delay_for_retry(
+            execute_after=new_start_time_for_task, counter=self.COUNTER_POSTPONES
         )
-        processor.delay_for_retry(execute_after=new_start_time_for_task)
+        metrics.record(metrics.TASKS_POSTPONED, self.get_metric_labels())
 
     def handle_error(
         self,
@@ -127,44 +748,95 @@ class Task(models.Model):
     ) -> None:
         try_num = self.tries_count + 1
         if not retries_config or not retries_config.shoud_be_retried(try_num):
-            raise
-        self.tries_count = try_num
+            raise error_signal
         new_start_time_for_task = retries_config.get_new_datetime_for_retry(try_num)
-        processor.delay_for_retry(execute_after=new_start_time_for_task)
+        processor.delay_for_retry(
+            execute_after=new_start_time_for_task, counter=self.COUNTER_RETRIES
+        )
+        metrics.record(metrics.TASKS_RETRIED, self.get_metric_labels())
+
+    def reschedule(
+        self,
+        execute_after: datetime,
+        counter: Optional[str] = None,
+        unique_key: Optional[str] = None,
+    ) -> None:
+        """Returns task to queue, incrementing counter of retries or postpones.
+        Only changed columns are written, counter is incremented atomically
+        by database
+        """
+        extra = Task.objects.reschedule_task(
+            self.pk, execute_after, counter, unique_key
+        )
+        self.status = self.STATUS_NEW
+        self.execute_after = execute_after
+        self.owner = None
+        self.lease_expires_at = None
+        self.unique_key = unique_key
+        if extra is not None:
+            self.extra = extra
 
     def complete(self) -> None:
         if self.settings.DELETE_TASKS_ON_COMPLETE:
             self.delete()
             return
         self.status = self.STATUS_FINISHED
-        self.save(update_fields=('status', 'updated_at'))
+        self.save(update_fields=['status', 'updated_at', *self.get_timing_fields()])
 
     def fail(self, err: Exception) -> None:
         self.status = self.STATUS_ERROR
         self.extra = {'message': str(err)}
-        self.save(update_fields=('status', 'extra', 'updated_at'))
+        self.save(
+            update_fields=['status', 'extra', 'updated_at', *self.get_timing_fields()]
+        )
+        metrics.record(metrics.TASKS_FAILED, self.get_metric_labels())
+
+    def get_timing_fields(self) -> List[str]:
+        # Tasks, rebuilt from message, have timing fields deferred until run
+        if (
+            not self.settings.TRACK_TASK_TIMING
+            or 'run_duration_ms' in self.get_deferred_fields()
+        ):
+            return []
+        return ['started_at', 'run_duration_ms']
+
+    def get_timing(self) -> Optional[TaskTiming]:
+        if self.started_at is None or self.run_duration_ms is None:
+            return None
+        return TaskTiming(self.started_at, self.run_duration_ms)
+
+    @property
+    def finished_at(self) -> Optional[datetime]:
+        timing = self.get_timing()
+        if timing is None:
+            return None
+        return timing.started_at + timedelta(milliseconds=timing.run_duration_ms)
+
+    def get_metric_labels(self) -> Dict[str, str]:
+        return {'queue': self.queue_name, 'processor': self.processor_class}
+
+    def get_counter(self, counter: str) -> int:
+        return self.extra.get(counter, {'count': 0}).get('count')
+
+    def set_counter(self, counter: str, num: int) -> None:
+        """Sets counter in memory only. Counters are saved by `reschedule()`"""
+        self.extra = {**self.extra, counter: {'count': num}}
 
     @property
     def postpones_count(self) -> int:
-        return self.extra.get('postpones', {'count': 0}).get('count')
+        return self.get_counter(self.COUNTER_POSTPONES)
 
     @postpones_count.setter
     def postpones_count(self, num: int) -> None:
-        extra_data = self.extra.get('postpones', {'count': 0})
-        extra_data.update({'postpones': {'count': num}})
-        self.extra = extra_data
-        self.save(update_fields=['updated_at', 'extra'])
+        self.set_counter(self.COUNTER_POSTPONES, num)
 
     @property
     def tries_count(self) -> int:
-        return self.extra.get('retries', {'count': 0}).get('count')
+        return self.get_counter(self.COUNTER_RETRIES)
 
     @tries_count.setter
     def tries_count(self, num: int) -> None:
-        extra_data = self.extra.get('retries', {'count': 0})
-        extra_data.update({'retries': {'count': num}})
-        self.extra = extra_data
-        self.save(update_fields=['updated_at', 'extra'])
+        self.set_counter(self.COUNTER_RETRIES, num)
 
     class Meta:
         ordering = ('-priority',)
@@ -173,3 +845,73 @@ class Task(models.Model):
         return '{} ({}) - {}'.format(
             self.processor_class, self.arguments, self.get_status_display()  # type: ignore
         )
+
+
+class ArchivedTask(models.Model):
+    """Finished and failed tasks, moved from tasks table by `prune_partisan`"""
+
+    id = models.IntegerField(primary_key=True)
+    status = models.CharField(max_length=20, choices=Task.STATUS_CHOICES)
+    queue_name = models.CharField(max_length=50)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    processor_class = models.CharField(max_length=128)
+    priority = models.IntegerField()
+    execute_after = models.DateTimeField()
+    arguments = JSONField(default=dict)
+    extra = JSONField(default=dict)
+    claimed_at = models.DateTimeField(null=True)
+    started_at = models.DateTimeField(null=True)
+    run_duration_ms = models.PositiveIntegerField(null=True)
+    archived_at = models.DateTimeField(db_index=True)
+
+    def __str__(self) -> str:
+        return '{} ({}) - {}'.format(
+            self.processor_class, self.arguments, self.get_status_display()  # type: ignore
+        )
+
+
+class RateLimitBucketsManager(models.Manager):
+    def acquire(self, key: str, rate_limit: RateLimitConfig) -> 'RateLimitBucket':
+        """Returns bucket, locked till the end of transaction.
+        New bucket is created full
+        """
+        connection = connections[self.db]
+        table_name = connection.ops.quote_name(self.model._meta.db_table)
+        acquire_sql = (
+            f'INSERT INTO {table_name} ("key", "tokens", "refilled_at") '
+            f'VALUES (%s, %s, %s) ON CONFLICT ("key") '
+            f'DO UPDATE SET "key" = EXCLUDED."key" RETURNING *'
+        )
+        params = [key, float(rate_limit.max_tasks), timezone.now()]
+        return list(self.raw(acquire_sql, params))[0]
+
+
+class RateLimitBucket(models.Model):
+    """Token bucket of rate limited processor, shared by all managers"""
+
+    key = models.CharField(max_length=128, primary_key=True)
+    tokens = models.FloatField()
+    refilled_at = models.DateTimeField()
+
+    objects = RateLimitBucketsManager()
+
+    def refill(self, rate_limit: RateLimitConfig) -> int:
+        """Adds tokens for time passed since last refill.
+        Returns count of tasks, that can be claimed now
+        """
+        now = timezone.now()
+        elapsed = max((now - self.refilled_at).total_seconds(), 0)
+        self.tokens = min(
+            float(rate_limit.max_tasks),
+            self.tokens + elapsed * rate_limit.tasks_per_second,
+        )
+        self.refilled_at = now
+        return int(self.tokens)
+
+    def consume(self, count: int) -> None:
+        self.tokens -= count
+        self.save(update_fields=['tokens', 'refilled_at'])
+
+    def __str__(self) -> str:
+        return f'{self.key} - {self.tokens}'
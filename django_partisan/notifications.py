@@ -0,0 +1,74 @@
+import logging
+import select
+from typing import Any, Optional
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = 'partisan_'
+
+
+def get_channel_name(queue_name: str) -> str:
+    return f'{CHANNEL_PREFIX}{queue_name}'
+
+
+def notify(queue_name: str) -> None:
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_notify(%s, %s)', [get_channel_name(queue_name), ''])
+
+
+class NotificationsListener:
+    """Waits for NOTIFY on queues channels on its own autocommit connection,
+    so it doesn't interfere with transactions of the manager
+    """
+
+    def __init__(self, *queue_names: str) -> None:
+        self.channel_names = [
+            get_channel_name(queue_name) for queue_name in queue_names
+        ]
+        self.connection: Optional[Any] = None
+
+    def listen(self) -> Any:
+        if self.connection is not None:
+            return self.connection
+        with connection.wrap_database_errors:
+            self.connection = connection.get_new_connection(
+                connection.get_connection_params()
+            )
+            self.connection.autocommit = True
+            with self.connection.cursor() as cursor:
+                for channel_name in self.channel_names:
+                    cursor.execute(f'LISTEN {connection.ops.quote_name(channel_name)}')
+        logger.info(
+            'Listening for notifications on "%s"', '", "'.join(self.channel_names)
+        )
+        return self.connection
+
+    def wait(self, timeout: float) -> bool:
+        """Blocks until notification is received or timeout is reached.
+        Returns True, if any notification was received
+        """
+        try:
+            listener_connection = self.listen()
+            with connection.wrap_database_errors:
+                listener_connection.poll()
+                if not listener_connection.notifies:
+                    ready, _, _ = select.select([listener_connection], [], [], timeout)
+                    if not ready:
+                        return False
+                    listener_connection.poll()
+                received = bool(listener_connection.notifies)
+                del listener_connection.notifies[:]
+                return received
+        except Exception:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        if self.connection is None:
+            return
+        try:
+            self.connection.close()
+        finally:
+            self.connection = None
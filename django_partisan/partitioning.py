@@ -0,0 +1,273 @@
+"""Optional partitioned layout of tasks table.
+
+Tasks table is partitioned by status into small `active` partition with new
+and claimed tasks and `done` partition with finished and failed ones. `done`
+is partitioned by `updated_at` into daily partitions, so old tasks can be
+dropped a whole partition at a time. Tasks, finished before conversion, are kept
+in `past` partition, and tasks, finished after the last daily partition,
+in `future` one, which is split into daily partitions as days come. `done` has
+no default partition, so partitions can be detached concurrently, what needs
+PostgreSQL 14+.
+
+Primary key of partitioned table would have to include `status` and `updated_at`,
+so it is replaced with unique index on `id` of `active` partition and not unique
+index on `id` of the whole table. Ids of finished tasks stay unique as they come
+from the same sequence, but it is not enforced.
+"""
+import datetime
+import logging
+import re
+from typing import List
+
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from django_partisan.models import Task
+
+logger = logging.getLogger(__name__)
+
+TABLE_NAME = Task._meta.db_table
+OLD_TABLE_NAME = f'{TABLE_NAME}_old'
+ACTIVE_PARTITION_NAME = f'{TABLE_NAME}_active'
+DONE_PARTITION_NAME = f'{TABLE_NAME}_done'
+PAST_DONE_PARTITION_NAME = f'{TABLE_NAME}_done_past'
+FUTURE_DONE_PARTITION_NAME = f'{TABLE_NAME}_done_future'
+DAILY_PARTITION_PREFIX = f'{TABLE_NAME}_done_'
+DAILY_PARTITION_DATE_FORMAT = '%Y%m%d'
+MIN_PG_VERSION = 140000
+
+PARTITIONED_INDEXES = (
+    f'CREATE UNIQUE INDEX "{ACTIVE_PARTITION_NAME}_id_key" '
+    f'ON "{ACTIVE_PARTITION_NAME}" ("id")',
+    f'CREATE INDEX "{TABLE_NAME}_id_idx" ON "{TABLE_NAME}" ("id")',
+    f'CREATE INDEX "{TABLE_NAME}_fetch_idx" ON "{ACTIVE_PARTITION_NAME}" '
+    f'("queue_name", "priority" DESC, "execute_after") WHERE "status" = \'new\'',
+    f'CREATE UNIQUE INDEX "{TABLE_NAME}_unique_key_idx" ON "{ACTIVE_PARTITION_NAME}" '
+    f'("unique_key") WHERE "status" = \'new\'',
+    f'CREATE INDEX "{TABLE_NAME}_lease_idx" ON "{ACTIVE_PARTITION_NAME}" '
+    f'("queue_name", "lease_expires_at") WHERE "status" = \'in_process\'',
+    f'CREATE INDEX "{TABLE_NAME}_prune_idx" ON "{DONE_PARTITION_NAME}" '
+    f'("queue_name", "status", "updated_at")',
+)
+
+# Indexes, created by migrations for plain table
+PLAIN_INDEXES = (
+    f'ALTER TABLE "{TABLE_NAME}" ADD CONSTRAINT "{TABLE_NAME}_pkey" PRIMARY KEY ("id")',
+    f'CREATE INDEX "{TABLE_NAME}_fetch_idx" ON "{TABLE_NAME}" '
+    f'("queue_name", "priority" DESC, "execute_after") WHERE "status" = \'new\'',
+    f'CREATE UNIQUE INDEX "{TABLE_NAME}_unique_key_idx" ON "{TABLE_NAME}" '
+    f'("unique_key") WHERE "status" = \'new\'',
+    f'CREATE INDEX "{TABLE_NAME}_lease_idx" ON "{TABLE_NAME}" '
+    f'("queue_name", "lease_expires_at") WHERE "status" = \'in_process\'',
+    f'CREATE INDEX "{TABLE_NAME}_prune_idx" ON "{TABLE_NAME}" '
+    f'("queue_name", "status", "updated_at") '
+    f'WHERE "status" IN (\'finished\', \'error\')',
+)
+
+
+def is_partitioned(using: str = DEFAULT_DB_ALIAS) -> bool:
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            'SELECT EXISTS (SELECT 1 FROM pg_partitioned_table '
+            'WHERE partrelid = to_regclass(%s))',
+            [TABLE_NAME],
+        )
+        return cursor.fetchone()[0]
+
+
+def convert_to_partitioned(days_ahead: int, using: str = DEFAULT_DB_ALIAS) -> List[str]:
+    """Moves tasks to new partitioned table. Table is locked until the end
+    of conversion. Returns names of created daily partitions
+    """
+    with transaction.atomic(using=using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(f'LOCK TABLE "{TABLE_NAME}" IN ACCESS EXCLUSIVE MODE')
+            cursor.execute(f'ALTER TABLE "{TABLE_NAME}" RENAME TO "{OLD_TABLE_NAME}"')
+            cursor.execute(
+                f'CREATE TABLE "{TABLE_NAME}" (LIKE "{OLD_TABLE_NAME}" '
+                f'INCLUDING DEFAULTS INCLUDING CONSTRAINTS) PARTITION BY LIST ("status")'
+            )
+            cursor.execute(
+                f'CREATE TABLE "{ACTIVE_PARTITION_NAME}" PARTITION OF "{TABLE_NAME}" '
+                f'FOR VALUES IN (%s, %s)',
+                [Task.STATUS_NEW, Task.STATUS_IN_PROCESS],
+            )
+            cursor.execute(
+                f'CREATE TABLE "{DONE_PARTITION_NAME}" PARTITION OF "{TABLE_NAME}" '
+                f'FOR VALUES IN (%s, %s) PARTITION BY RANGE ("updated_at")',
+                [Task.STATUS_FINISHED, Task.STATUS_ERROR],
+            )
+            today = timezone.now().date()
+            cursor.execute(
+                f'CREATE TABLE "{PAST_DONE_PARTITION_NAME}" '
+                f'PARTITION OF "{DONE_PARTITION_NAME}" '
+                f'FOR VALUES FROM (MINVALUE) TO (%s)',
+                [today],
+            )
+            cursor.execute(
+                f'CREATE TABLE "{FUTURE_DONE_PARTITION_NAME}" '
+                f'PARTITION OF "{DONE_PARTITION_NAME}" '
+                f'FOR VALUES FROM (%s) TO (MAXVALUE)',
+                [today],
+            )
+        created_partitions = create_daily_partitions(days_ahead, using)
+        move_table_data(using)
+        with connections[using].cursor() as cursor:
+            for index_sql in PARTITIONED_INDEXES:
+                cursor.execute(index_sql)
+    return created_partitions
+
+
+def convert_to_plain(using: str = DEFAULT_DB_ALIAS) -> None:
+    """Moves tasks back to not partitioned table"""
+    with transaction.atomic(using=using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(f'LOCK TABLE "{TABLE_NAME}" IN ACCESS EXCLUSIVE MODE')
+            cursor.execute(f'ALTER TABLE "{TABLE_NAME}" RENAME TO "{OLD_TABLE_NAME}"')
+            cursor.execute(
+                f'CREATE TABLE "{TABLE_NAME}" (LIKE "{OLD_TABLE_NAME}" '
+                f'INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+            )
+        move_table_data(using)
+        with connections[using].cursor() as cursor:
+            for index_sql in PLAIN_INDEXES:
+                cursor.execute(index_sql)
+
+
+def move_table_data(using: str) -> None:
+    """Copies tasks from old table to new one, passes ids sequence to new table
+    and drops old table with its partitions and indexes
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'INSERT INTO "{TABLE_NAME}" SELECT * FROM "{OLD_TABLE_NAME}"')
+        cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [OLD_TABLE_NAME, 'id'])
+        sequence_name = cursor.fetchone()[0]
+        cursor.execute(f'ALTER SEQUENCE {sequence_name} OWNED BY "{TABLE_NAME}"."id"')
+        cursor.execute(f'DROP TABLE "{OLD_TABLE_NAME}" CASCADE')
+
+
+def get_daily_partition_name(day: datetime.date) -> str:
+    return f'{DAILY_PARTITION_PREFIX}{day.strftime(DAILY_PARTITION_DATE_FORMAT)}'
+
+
+def get_daily_partition_day(partition_name: str) -> datetime.date:
+    return datetime.datetime.strptime(
+        partition_name[len(DAILY_PARTITION_PREFIX) :], DAILY_PARTITION_DATE_FORMAT
+    ).date()
+
+
+def get_done_partitions(using: str = DEFAULT_DB_ALIAS) -> List[str]:
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE pg_inherits.inhparent = to_regclass(%s) ORDER BY child.relname',
+            [DONE_PARTITION_NAME],
+        )
+        return [name for name, in cursor.fetchall()]
+
+
+def get_daily_partitions(using: str = DEFAULT_DB_ALIAS) -> List[str]:
+    return [
+        name
+        for name in get_done_partitions(using)
+        if re.fullmatch(rf'{DAILY_PARTITION_PREFIX}\d{{8}}', name)
+    ]
+
+
+def create_daily_partitions(
+    days_ahead: int, using: str = DEFAULT_DB_ALIAS
+) -> List[str]:
+    """Splits off `future` partition daily partitions up to days_ahead days
+    after today. Tasks of these days, that are already in `future` partition,
+    are moved to created partitions. Returns names of created partitions
+    """
+    daily_partitions = get_daily_partitions(using)
+    if daily_partitions:
+        first_day = get_daily_partition_day(daily_partitions[-1])
+        first_day += datetime.timedelta(days=1)
+    else:
+        first_day = timezone.now().date()
+    last_day = timezone.now().date() + datetime.timedelta(days=days_ahead)
+    if first_day > last_day:
+        return []
+    created_partitions = []
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        cursor.execute(
+            f'ALTER TABLE "{DONE_PARTITION_NAME}" '
+            f'DETACH PARTITION "{FUTURE_DONE_PARTITION_NAME}"'
+        )
+        day = first_day
+        while day <= last_day:
+            partition_name = get_daily_partition_name(day)
+            bounds = [day, day + datetime.timedelta(days=1)]
+            cursor.execute(
+                f'CREATE TABLE "{partition_name}" (LIKE "{DONE_PARTITION_NAME}" '
+                f'INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+            )
+            cursor.execute(
+                f'WITH moved AS (DELETE FROM "{FUTURE_DONE_PARTITION_NAME}" '
+                f'WHERE "updated_at" >= %s AND "updated_at" < %s RETURNING *) '
+                f'INSERT INTO "{partition_name}" SELECT * FROM moved',
+                bounds,
+            )
+            cursor.execute(
+                f'ALTER TABLE "{DONE_PARTITION_NAME}" ATTACH PARTITION '
+                f'"{partition_name}" FOR VALUES FROM (%s) TO (%s)',
+                bounds,
+            )
+            created_partitions.append(partition_name)
+            day += datetime.timedelta(days=1)
+        cursor.execute(
+            f'ALTER TABLE "{DONE_PARTITION_NAME}" ATTACH PARTITION '
+            f'"{FUTURE_DONE_PARTITION_NAME}" FOR VALUES FROM (%s) TO (MAXVALUE)',
+            [day],
+        )
+    for partition_name in created_partitions:
+        logger.info('Created partition "%s"', partition_name)
+    return created_partitions
+
+
+def drop_daily_partitions(
+    older_than: datetime.date, using: str = DEFAULT_DB_ALIAS
+) -> List[str]:
+    """Drops partitions of finished tasks, which all tasks were updated
+    before older_than day. Partition is detached concurrently first, so tasks
+    table is not locked, therefore it can't be called inside transaction.
+    Returns names of dropped partitions
+    """
+    daily_partitions = get_daily_partitions(using)
+    partitions_to_drop = [
+        partition_name
+        for partition_name in daily_partitions
+        if get_daily_partition_day(partition_name) < older_than
+    ]
+    # `past` partition holds tasks, updated before the first daily partition
+    if (
+        daily_partitions
+        and get_daily_partition_day(daily_partitions[0]) <= older_than
+        and PAST_DONE_PARTITION_NAME in get_done_partitions(using)
+    ):
+        partitions_to_drop.insert(0, PAST_DONE_PARTITION_NAME)
+    for partition_name in partitions_to_drop:
+        detach_partition(partition_name, using)
+        with connections[using].cursor() as cursor:
+            cursor.execute(f'DROP TABLE "{partition_name}"')
+        logger.info('Dropped partition "%s"', partition_name)
+    return partitions_to_drop
+
+
+def detach_partition(partition_name: str, using: str = DEFAULT_DB_ALIAS) -> None:
+    """Detaches partition of finished tasks concurrently. Detaching, interrupted
+    before, is finalized
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            'SELECT inhdetachpending FROM pg_inherits WHERE inhrelid = to_regclass(%s)',
+            [partition_name],
+        )
+        detach_pending = cursor.fetchone()[0]
+        cursor.execute(
+            f'ALTER TABLE "{DONE_PARTITION_NAME}" DETACH PARTITION "{partition_name}" '
+            f'{"FINALIZE" if detach_pending else "CONCURRENTLY"}'
+        )
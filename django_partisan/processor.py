@@ -1,14 +1,23 @@
 import abc
 from datetime import datetime
-from typing import Type, Any, Optional
+from functools import partial
+from itertools import islice
+from typing import Type, Any, Optional, Iterable, Tuple, Sequence, Dict, List
 
 from django.db import transaction
 from django.utils import timezone
 
-from django_partisan.config.processor_configs import ErrorsHandleConfig, PostponeConfig
-from django_partisan.exceptions import ProcessorClassNotFound
-from django_partisan.models import Task
-from django_partisan.registry.registry import registry
+from django_partisan.config.processor_configs import (
+    ErrorsHandleConfig,
+    PostponeConfig,
+    RateLimitConfig,
+)
+from django_partisan.exceptions import UniqueTaskConflict
+from django_partisan.models import Task, ClaimLimits
+from django_partisan.notifications import notify
+from django_partisan.registry.registry import registry, get_qualified_name
+
+UNIQUE_DELAY_ATTEMPTS = 2
 
 
 class BaseTaskProcessor(abc.ABC):
@@ -17,6 +26,13 @@ class BaseTaskProcessor(abc.ABC):
     UNIQUE_FOR_PARAMS: bool = False
     RETRY_ON_ERROR_CONFIG: Optional[ErrorsHandleConfig] = None
     POSTPONE_CONFIG: Optional[PostponeConfig] = None
+    USE_QUALIFIED_NAME: bool = False
+    RATE_LIMIT: Optional[RateLimitConfig] = None
+    MAX_CONCURRENCY: Optional[int] = None
+
+    def __init_subclass__(cls) -> None:
+        super().__init_subclass__()
+        registry.invalidate_index()
 
     def __init__(self, *args: Any, **kwargs: Any):
         self.task_obj: Optional[Task] = None
@@ -29,12 +45,30 @@ class BaseTaskProcessor(abc.ABC):
 
     @classmethod
     def get_processor_class(cls, processor_name: str) -> Type['BaseTaskProcessor']:
-        if registry.is_processor_registered(processor_name):
-            return registry.get_processor_class_by_name(processor_name)
-        for subclass in cls.__subclasses__():
-            if subclass.__name__ == processor_name:
-                return subclass
-        raise ProcessorClassNotFound(processor_name)
+        return registry.find_processor_class(processor_name, BaseTaskProcessor)
+
+    @classmethod
+    def get_claim_limits(cls) -> Dict[str, ClaimLimits]:
+        """Limits of processors with RATE_LIMIT or MAX_CONCURRENCY
+        by names, their tasks are stored with
+        """
+        return {
+            processor_class.get_processor_name(): ClaimLimits(
+                processor_class.RATE_LIMIT, processor_class.MAX_CONCURRENCY
+            )
+            for processor_class in registry.get_processor_classes(BaseTaskProcessor)
+            if processor_class.RATE_LIMIT is not None
+            or processor_class.MAX_CONCURRENCY is not None
+        }
+
+    @classmethod
+    def get_batch_sizes(cls) -> Dict[str, int]:
+        """Batch sizes of batch processors by names, their tasks are stored with"""
+        return {
+            processor_class.get_processor_name(): processor_class.BATCH_SIZE
+            for processor_class in registry.get_processor_classes(BaseTaskProcessor)
+            if issubclass(processor_class, BatchTaskProcessor)
+        }
 
     @classmethod
     def get_initialized_processor(cls, task_obj: Task) -> 'BaseTaskProcessor':
@@ -53,35 +87,146 @@ class BaseTaskProcessor(abc.ABC):
             raise TypeError(
                 'TaskProcessor initialized with task object not supports delay() method'
             )
-        if self.UNIQUE_FOR_PARAMS:
-            task_config = {
-                'arguments__args': self.args,
-                'arguments__kwargs': self.kwargs,
-                'status': Task.STATUS_NEW,
-                'processor_class': self.processor_name,
-            }
-            if Task.objects.select_for_update().filter(**task_config).exists():
-                return Task.objects.get(**task_config)
-
         task_data = {
             'processor_class': self.processor_name,
+            'queue_name': self.QUEUE,
             'arguments': {'args': self.args, 'kwargs': self.kwargs},
             'priority': priority or self.PRIORITY,
             'execute_after': execute_after or timezone.now(),
         }
-        return Task.objects.create(**task_data)
+        if self.UNIQUE_FOR_PARAMS:
+            task, created = self._delay_unique(task_data)
+            if not created:
+                return task
+        else:
+            task = Task.objects.create(**task_data)
+        if task.settings.USE_LISTEN_NOTIFY:
+            transaction.on_commit(partial(notify, task.queue_name))
+        return task
 
+    def _delay_unique(self, task_data: Dict[str, Any]) -> Tuple[Task, bool]:
+        """Returns created task or pending task with the same arguments
+        and flag, if task was created. Pending task can be claimed between
+        INSERT and SELECT, then INSERT is tried again
+        """
+        unique_key = Task.get_unique_key(self.processor_name, task_data['arguments'])
+        for _ in range(UNIQUE_DELAY_ATTEMPTS):
+            task = Task.objects.create_unique(unique_key=unique_key, **task_data)
+            if task is not None:
+                return task, True
+            existing_task = Task.objects.filter(
+                unique_key=unique_key, status=Task.STATUS_NEW
+            ).first()
+            if existing_task is not None:
+                return existing_task, False
+        raise UniqueTaskConflict(self.processor_name, UNIQUE_DELAY_ATTEMPTS)
+
+    @classmethod
     @transaction.atomic
-    def delay_for_retry(self, *, execute_after: datetime = None) -> Task:
+    def delay_many(
+        cls,
+        processors_arguments: Iterable[Tuple[Sequence[Any], Dict[str, Any]]],
+        *,
+        priority: int = 0,
+        execute_after: datetime = None,
+        chunk_size: int = 1000,
+    ) -> List[Task]:
+        """Delays task for every (args, kwargs) pair with one INSERT per chunk.
+        Returns created tasks
+        """
+        if chunk_size < 1:
+            raise ValueError('"chunk_size" should be bigger then 0')
+        execute_after = execute_after or timezone.now()
+        created_tasks: List[Task] = []
+        arguments_iterator = iter(processors_arguments)
+        while True:
+            chunk = [
+                Task(
+                    processor_class=cls.get_processor_name(),
+                    queue_name=cls.QUEUE,
+                    arguments={'args': list(args), 'kwargs': kwargs},
+                    priority=priority or cls.PRIORITY,
+                    execute_after=execute_after,
+                )
+                for args, kwargs in islice(arguments_iterator, chunk_size)
+            ]
+            if not chunk:
+                break
+            if cls.UNIQUE_FOR_PARAMS:
+                for task in chunk:
+                    task.unique_key = Task.get_unique_key(
+                        cls.get_processor_name(), task.arguments
+                    )
+                created_tasks.extend(Task.objects.bulk_create_unique(chunk))
+            else:
+                created_tasks.extend(Task.objects.bulk_create(chunk))
+        if created_tasks and created_tasks[0].settings.USE_LISTEN_NOTIFY:
+            transaction.on_commit(partial(notify, created_tasks[0].queue_name))
+        return created_tasks
+
+    def delay_for_retry(
+        self, *, execute_after: datetime = None, counter: Optional[str] = None
+    ) -> Task:
+        """Returns task to queue with one UPDATE. Counter of retries or
+        postpones, if passed, is incremented by the same query.
+        Task of UNIQUE_FOR_PARAMS processor gets its unique key back
+        """
         if self.task_obj is None:
             raise TypeError(
                 'TaskProcessor initialized without task object not supports delay_for_retry() method'
             )
-        self.task_obj.status = Task.STATUS_NEW
-        self.task_obj.execute_after = execute_after or datetime.now()
-        self.task_obj.save()
+        unique_key = None
+        if self.UNIQUE_FOR_PARAMS:
+            unique_key = Task.get_unique_key(
+                self.processor_name, self.task_obj.arguments
+            )
+        self.task_obj.reschedule(execute_after or timezone.now(), counter, unique_key)
         return self.task_obj
 
     @property
     def processor_name(self) -> str:
-        return self.__class__.__name__
+        return self.get_processor_name()
+
+    @classmethod
+    def get_processor_name(cls) -> str:
+        """Name, task is stored with. Import path is used, if USE_QUALIFIED_NAME
+        is set, so processors with the same names don't collide
+        """
+        if cls.USE_QUALIFIED_NAME:
+            return get_qualified_name(cls)
+        return cls.__name__
+
+
+class AsyncBaseTaskProcessor(BaseTaskProcessor):
+    """Base class for processors with `async def run()`.
+    Should be processed by queue with ASYNC_TASKS_PER_WORKER set
+    """
+
+    @abc.abstractmethod
+    async def run(self) -> Any:  # type: ignore
+        raise NotImplementedError()  # pragma: no cover
+
+
+class BatchTaskProcessor(BaseTaskProcessor):
+    """Base class for processors, which process many tasks at once.
+    Tasks of processor, claimed together, are passed to `run_batch()`
+    by up to BATCH_SIZE
+    """
+
+    BATCH_SIZE: int = 100
+
+    @classmethod
+    @abc.abstractmethod
+    def run_batch(
+        cls, arguments: List[Tuple[Tuple[Any, ...], Dict[str, Any]]]
+    ) -> Optional[Sequence[Optional[Exception]]]:
+        """Processes (args, kwargs) of tasks. Returns None, if all tasks are
+        processed, or errors of tasks in the same order with None for
+        processed ones. Raised error is an error of every task of batch
+        """
+        raise NotImplementedError()  # pragma: no cover
+
+    def run(self) -> None:
+        errors = self.run_batch([(self.args, self.kwargs)])
+        if errors and errors[0] is not None:
+            raise errors[0]
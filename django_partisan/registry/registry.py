@@ -1,4 +1,4 @@
-from typing import Type, Dict, TYPE_CHECKING
+from typing import Type, Dict, List, Optional, TYPE_CHECKING
 
 from django_partisan.exceptions import (
     ProcessorClassAlreadyRegistered,
@@ -9,9 +9,14 @@ if TYPE_CHECKING:
     from django_partisan.processor import BaseTaskProcessor
 
 
+def get_qualified_name(processor_class: Type['BaseTaskProcessor']) -> str:
+    return f'{processor_class.__module__}.{processor_class.__qualname__}'
+
+
 class Registry:
     def __init__(self) -> None:
         self._registry: Dict[str, Type['BaseTaskProcessor']] = {}
+        self._index: Optional[Dict[str, Type['BaseTaskProcessor']]] = None
 
     def register_processor_class(
         self, processor_class: Type['BaseTaskProcessor']
@@ -20,6 +25,52 @@ class Registry:
         if self.is_processor_registered(processor_name):
             raise ProcessorClassAlreadyRegistered(processor_name)
         self._registry[processor_name] = processor_class
+        self.invalidate_index()
+
+    def invalidate_index(self) -> None:
+        self._index = None
+
+    def find_processor_class(
+        self, processor_name: str, base_class: type
+    ) -> Type['BaseTaskProcessor']:
+        """Resolves processor class by its name or import path among registered
+        processors and all subclasses of base_class
+        """
+        try:
+            return self.get_index(base_class)[processor_name]
+        except KeyError:
+            raise ProcessorClassNotFound(processor_name) from None
+
+    def get_processor_classes(
+        self, base_class: type
+    ) -> List[Type['BaseTaskProcessor']]:
+        """All known processors classes, each once"""
+        return list(dict.fromkeys(self.get_index(base_class).values()))
+
+    def get_index(self, base_class: type) -> Dict[str, Type['BaseTaskProcessor']]:
+        if self._index is None:
+            self._index = self.build_index(base_class)
+        return self._index
+
+    def build_index(self, base_class: type) -> Dict[str, Type['BaseTaskProcessor']]:
+        """Maps names and import paths to processors classes. If several
+        subclasses have the same name, registered one or the first found is
+        used by name, others can be found only by import path
+        """
+        index: Dict[str, Type['BaseTaskProcessor']] = {}
+        classes_to_visit: List[type] = [base_class]
+        while classes_to_visit:
+            for subclass in classes_to_visit.pop(0).__subclasses__():
+                qualified_name = get_qualified_name(subclass)
+                if qualified_name in index:
+                    continue
+                index[qualified_name] = subclass
+                index.setdefault(subclass.__name__, subclass)
+                classes_to_visit.append(subclass)
+        for processor_name, processor_class in self._registry.items():
+            index[processor_name] = processor_class
+            index[get_qualified_name(processor_class)] = processor_class
+        return index
 
     def get_processor_class_by_name(
         self, processor_name: str
@@ -46,6 +46,79 @@ PARTISAN_CONFIG = {
                     const.DEFAULT_POSTPONES_COUNT,
                     defaults.DEFAULT_POSTPONES_COUNT,
                 ),
+                const.USE_LISTEN_NOTIFY: getattr(
+                    settings, const.USE_LISTEN_NOTIFY, defaults.USE_LISTEN_NOTIFY
+                ),
+                const.COMPACT_TASKS_TRANSPORT: getattr(
+                    settings,
+                    const.COMPACT_TASKS_TRANSPORT,
+                    defaults.COMPACT_TASKS_TRANSPORT,
+                ),
+                const.COMPLETE_BATCH_SIZE: getattr(
+                    settings, const.COMPLETE_BATCH_SIZE, defaults.COMPLETE_BATCH_SIZE
+                ),
+                const.COMPLETE_BATCH_TIMEOUT_MS: getattr(
+                    settings,
+                    const.COMPLETE_BATCH_TIMEOUT_MS,
+                    defaults.COMPLETE_BATCH_TIMEOUT_MS,
+                ),
+                const.WORKER_THREADS_COUNT: getattr(
+                    settings, const.WORKER_THREADS_COUNT, defaults.WORKER_THREADS_COUNT
+                ),
+                const.ASYNC_TASKS_PER_WORKER: getattr(
+                    settings,
+                    const.ASYNC_TASKS_PER_WORKER,
+                    defaults.ASYNC_TASKS_PER_WORKER,
+                ),
+                const.TASK_LEASE_SECONDS: getattr(
+                    settings, const.TASK_LEASE_SECONDS, defaults.TASK_LEASE_SECONDS
+                ),
+                const.QUEUE_WEIGHT: getattr(
+                    settings, const.QUEUE_WEIGHT, defaults.QUEUE_WEIGHT
+                ),
+                const.ADAPTIVE_PREFETCH_SECONDS: getattr(
+                    settings,
+                    const.ADAPTIVE_PREFETCH_SECONDS,
+                    defaults.ADAPTIVE_PREFETCH_SECONDS,
+                ),
+                const.MIN_WORKERS_COUNT: getattr(
+                    settings, const.MIN_WORKERS_COUNT, defaults.MIN_WORKERS_COUNT
+                ),
+                const.SCALE_DOWN_COOLDOWN_SECONDS: getattr(
+                    settings,
+                    const.SCALE_DOWN_COOLDOWN_SECONDS,
+                    defaults.SCALE_DOWN_COOLDOWN_SECONDS,
+                ),
+                const.METRICS_PORT: getattr(
+                    settings, const.METRICS_PORT, defaults.METRICS_PORT
+                ),
+                const.METRICS_HOST: getattr(
+                    settings, const.METRICS_HOST, defaults.METRICS_HOST
+                ),
+                const.METRICS_TEXTFILE: getattr(
+                    settings, const.METRICS_TEXTFILE, defaults.METRICS_TEXTFILE
+                ),
+                const.TRACK_TASK_TIMING: getattr(
+                    settings, const.TRACK_TASK_TIMING, defaults.TRACK_TASK_TIMING
+                ),
+                const.SLOW_TASK_THRESHOLD_MS: getattr(
+                    settings,
+                    const.SLOW_TASK_THRESHOLD_MS,
+                    defaults.SLOW_TASK_THRESHOLD_MS,
+                ),
+                const.FINISHED_TASKS_RETENTION_SECONDS: getattr(
+                    settings,
+                    const.FINISHED_TASKS_RETENTION_SECONDS,
+                    defaults.FINISHED_TASKS_RETENTION_SECONDS,
+                ),
+                const.ERROR_TASKS_RETENTION_SECONDS: getattr(
+                    settings,
+                    const.ERROR_TASKS_RETENTION_SECONDS,
+                    defaults.ERROR_TASKS_RETENTION_SECONDS,
+                ),
+                const.ARCHIVE_PRUNED_TASKS: getattr(
+                    settings, const.ARCHIVE_PRUNED_TASKS, defaults.ARCHIVE_PRUNED_TASKS
+                ),
             }
         )
     )
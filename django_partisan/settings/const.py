@@ -10,3 +10,26 @@ TASKS_PER_WORKER_INSTANCE = 'TASKS_PER_WORKER_INSTANCE'
 DELETE_TASKS_ON_COMPLETE = 'DELETE_TASKS_ON_COMPLETE'
 DEFAULT_POSTPONE_DELAY_SECONDS = 'DEFAULT_POSTPONE_DELAY_SECONDS'
 DEFAULT_POSTPONES_COUNT = 'DEFAULT_POSTPONES_COUNT'
+USE_LISTEN_NOTIFY = 'USE_LISTEN_NOTIFY'
+COMPACT_TASKS_TRANSPORT = 'COMPACT_TASKS_TRANSPORT'
+COMPLETE_BATCH_SIZE = 'COMPLETE_BATCH_SIZE'
+COMPLETE_BATCH_TIMEOUT_MS = 'COMPLETE_BATCH_TIMEOUT_MS'
+WORKER_THREADS_COUNT = 'WORKER_THREADS_COUNT'
+ASYNC_TASKS_PER_WORKER = 'ASYNC_TASKS_PER_WORKER'
+TASK_LEASE_SECONDS = 'TASK_LEASE_SECONDS'
+QUEUE_WEIGHT = 'QUEUE_WEIGHT'
+ADAPTIVE_PREFETCH_SECONDS = 'ADAPTIVE_PREFETCH_SECONDS'
+MIN_WORKERS_COUNT = 'MIN_WORKERS_COUNT'
+SCALE_DOWN_COOLDOWN_SECONDS = 'SCALE_DOWN_COOLDOWN_SECONDS'
+METRICS_PORT = 'METRICS_PORT'
+METRICS_HOST = 'METRICS_HOST'
+METRICS_TEXTFILE = 'METRICS_TEXTFILE'
+TRACK_TASK_TIMING = 'TRACK_TASK_TIMING'
+SLOW_TASK_THRESHOLD_MS = 'SLOW_TASK_THRESHOLD_MS'
+FINISHED_TASKS_RETENTION_SECONDS = 'FINISHED_TASKS_RETENTION_SECONDS'
+ERROR_TASKS_RETENTION_SECONDS = 'ERROR_TASKS_RETENTION_SECONDS'
+ARCHIVE_PRUNED_TASKS = 'ARCHIVE_PRUNED_TASKS'
+
+FETCH_STRATEGY_WEIGHTED = 'weighted'
+FETCH_STRATEGY_PRIORITY = 'priority'
+FETCH_STRATEGIES = (FETCH_STRATEGY_WEIGHTED, FETCH_STRATEGY_PRIORITY)
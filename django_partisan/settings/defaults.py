@@ -9,3 +9,22 @@ TASKS_PER_WORKER_INSTANCE = None
 DELETE_TASKS_ON_COMPLETE = False
 DEFAULT_POSTPONE_DELAY_SECONDS = 5
 DEFAULT_POSTPONES_COUNT = 15
+USE_LISTEN_NOTIFY = False
+COMPACT_TASKS_TRANSPORT = False
+COMPLETE_BATCH_SIZE = None
+COMPLETE_BATCH_TIMEOUT_MS = 1000
+WORKER_THREADS_COUNT = 1
+ASYNC_TASKS_PER_WORKER = None
+TASK_LEASE_SECONDS = 300
+QUEUE_WEIGHT = 1
+ADAPTIVE_PREFETCH_SECONDS = None
+MIN_WORKERS_COUNT = None
+SCALE_DOWN_COOLDOWN_SECONDS = 60
+METRICS_PORT = None
+METRICS_HOST = '127.0.0.1'
+METRICS_TEXTFILE = None
+TRACK_TASK_TIMING = False
+SLOW_TASK_THRESHOLD_MS = None
+FINISHED_TASKS_RETENTION_SECONDS = None
+ERROR_TASKS_RETENTION_SECONDS = None
+ARCHIVE_PRUNED_TASKS = False
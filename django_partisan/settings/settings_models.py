@@ -13,6 +13,25 @@ class QueueSettings(BaseModel):
     DELETE_TASKS_ON_COMPLETE: bool = False
     DEFAULT_POSTPONE_DELAY_SECONDS: int
     DEFAULT_POSTPONES_COUNT: Optional[int]
+    USE_LISTEN_NOTIFY: bool = False
+    COMPACT_TASKS_TRANSPORT: bool = False
+    COMPLETE_BATCH_SIZE: Optional[int] = None
+    COMPLETE_BATCH_TIMEOUT_MS: int = 1000
+    WORKER_THREADS_COUNT: int = 1
+    ASYNC_TASKS_PER_WORKER: Optional[int] = None
+    TASK_LEASE_SECONDS: int = 300
+    QUEUE_WEIGHT: int = 1
+    ADAPTIVE_PREFETCH_SECONDS: Optional[int] = None
+    MIN_WORKERS_COUNT: Optional[int] = None
+    SCALE_DOWN_COOLDOWN_SECONDS: int = 60
+    METRICS_PORT: Optional[int] = None
+    METRICS_HOST: str = '127.0.0.1'
+    METRICS_TEXTFILE: Optional[str] = None
+    TRACK_TASK_TIMING: bool = False
+    SLOW_TASK_THRESHOLD_MS: Optional[int] = None
+    FINISHED_TASKS_RETENTION_SECONDS: Optional[int] = None
+    ERROR_TASKS_RETENTION_SECONDS: Optional[int] = None
+    ARCHIVE_PRUNED_TASKS: bool = False
 
     @validator(
         'MIN_QUEUE_SIZE',
@@ -23,6 +42,11 @@ class QueueSettings(BaseModel):
         'TASKS_PER_WORKER_INSTANCE',
         'DEFAULT_POSTPONE_DELAY_SECONDS',
         'DEFAULT_POSTPONES_COUNT',
+        'COMPLETE_BATCH_SIZE',
+        'COMPLETE_BATCH_TIMEOUT_MS',
+        'SCALE_DOWN_COOLDOWN_SECONDS',
+        'METRICS_PORT',
+        'SLOW_TASK_THRESHOLD_MS',
     )
     def must_be_positive(cls, v: Optional[int]) -> Optional[int]:
         if v is None:
@@ -30,3 +54,20 @@ class QueueSettings(BaseModel):
         if v < 0:
             raise ValueError('Value should be positive integer')
         return v
+
+    @validator(
+        'WORKER_THREADS_COUNT',
+        'ASYNC_TASKS_PER_WORKER',
+        'TASK_LEASE_SECONDS',
+        'QUEUE_WEIGHT',
+        'ADAPTIVE_PREFETCH_SECONDS',
+        'MIN_WORKERS_COUNT',
+        'FINISHED_TASKS_RETENTION_SECONDS',
+        'ERROR_TASKS_RETENTION_SECONDS',
+    )
+    def must_be_bigger_than_zero(cls, v: Optional[int]) -> Optional[int]:
+        if v is None:
+            return None
+        if v < 1:
+            raise ValueError('Value should be bigger then 0')
+        return v
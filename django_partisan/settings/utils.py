@@ -20,4 +20,25 @@ def _get_default_config() -> Dict[str, Any]:
         const.DELETE_TASKS_ON_COMPLETE: defaults.DELETE_TASKS_ON_COMPLETE,
         const.DEFAULT_POSTPONE_DELAY_SECONDS: defaults.DEFAULT_POSTPONE_DELAY_SECONDS,
         const.DEFAULT_POSTPONES_COUNT: defaults.DEFAULT_POSTPONES_COUNT,
+        const.USE_LISTEN_NOTIFY: defaults.USE_LISTEN_NOTIFY,
+        const.COMPACT_TASKS_TRANSPORT: defaults.COMPACT_TASKS_TRANSPORT,
+        const.COMPLETE_BATCH_SIZE: defaults.COMPLETE_BATCH_SIZE,
+        const.COMPLETE_BATCH_TIMEOUT_MS: defaults.COMPLETE_BATCH_TIMEOUT_MS,
+        const.WORKER_THREADS_COUNT: defaults.WORKER_THREADS_COUNT,
+        const.ASYNC_TASKS_PER_WORKER: defaults.ASYNC_TASKS_PER_WORKER,
+        const.TASK_LEASE_SECONDS: defaults.TASK_LEASE_SECONDS,
+        const.QUEUE_WEIGHT: defaults.QUEUE_WEIGHT,
+        const.ADAPTIVE_PREFETCH_SECONDS: defaults.ADAPTIVE_PREFETCH_SECONDS,
+        const.MIN_WORKERS_COUNT: defaults.MIN_WORKERS_COUNT,
+        const.SCALE_DOWN_COOLDOWN_SECONDS: defaults.SCALE_DOWN_COOLDOWN_SECONDS,
+        const.METRICS_PORT: defaults.METRICS_PORT,
+        const.METRICS_HOST: defaults.METRICS_HOST,
+        const.METRICS_TEXTFILE: defaults.METRICS_TEXTFILE,
+        const.TRACK_TASK_TIMING: defaults.TRACK_TASK_TIMING,
+        const.SLOW_TASK_THRESHOLD_MS: defaults.SLOW_TASK_THRESHOLD_MS,
+        const.FINISHED_TASKS_RETENTION_SECONDS: (
+            defaults.FINISHED_TASKS_RETENTION_SECONDS
+        ),
+        const.ERROR_TASKS_RETENTION_SECONDS: defaults.ERROR_TASKS_RETENTION_SECONDS,
+        const.ARCHIVE_PRUNED_TASKS: defaults.ARCHIVE_PRUNED_TASKS,
     }
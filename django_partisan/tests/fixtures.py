@@ -1,6 +1,10 @@
 from django_partisan.config.processor_configs import ErrorsHandleConfig, PostponeConfig
 from django_partisan.exceptions import PostponeTask
-from django_partisan.processor import BaseTaskProcessor
+from django_partisan.processor import (
+    BaseTaskProcessor,
+    AsyncBaseTaskProcessor,
+    BatchTaskProcessor,
+)
 
 
 class TestTaskProcessor(BaseTaskProcessor):
@@ -36,3 +40,50 @@ class PostponableConfiguredTestTaskProcessor(BaseTaskProcessor):
 
     def run(self):
         raise PostponeTask(15)
+
+
+class FailingTestTaskProcessor(BaseTaskProcessor):
+    def run(self):
+        raise ValueError()
+
+
+class AsyncTestTaskProcessor(AsyncBaseTaskProcessor):
+    async def run(self):
+        return self.args[0]
+
+
+class AsyncConfiguredFailingTestTaskProcessor(AsyncBaseTaskProcessor):
+    RETRY_ON_ERROR_CONFIG = ErrorsHandleConfig(
+        retry_on_errors=[ValueError,], retries_count=5, retry_pause=0,
+    )
+
+    async def run(self):
+        raise ValueError()
+
+
+class AsyncPostponableTestTaskProcessor(AsyncBaseTaskProcessor):
+    async def run(self):
+        raise PostponeTask(15)
+
+
+class BatchTestTaskProcessor(BatchTaskProcessor):
+    """Fails tasks with "fail" argument, retries ones with "retry" argument"""
+
+    RETRY_ON_ERROR_CONFIG = ErrorsHandleConfig(
+        retry_on_errors=[KeyError], retries_count=5, retry_pause=0
+    )
+    batches = []
+
+    @classmethod
+    def run_batch(cls, arguments):
+        cls.batches.append(arguments)
+        errors = {'fail': ValueError(), 'retry': KeyError()}
+        return [errors.get(args[0]) for args, _ in arguments]
+
+
+class FailingBatchTestTaskProcessor(BatchTaskProcessor):
+    @classmethod
+    def run_batch(cls, arguments):
+        if arguments[0][0][0] == 'short':
+            return []
+        raise ValueError()
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+from queue import Empty
+from unittest.mock import patch, call, Mock, MagicMock, AsyncMock
+
+from django.test import TestCase
+
+from django_partisan.async_worker import AsyncWorker, QUEUE_GET_TIMEOUT
+from django_partisan.settings import get_queue_settings
+
+
+def get_task_mock(**kwargs):
+    return MagicMock(
+        queue_name='default',
+        settings=get_queue_settings(),
+        run_async=AsyncMock(**kwargs),
+    )
+
+
+@patch.object(get_queue_settings(), 'ASYNC_TASKS_PER_WORKER', 2)
+class TestAsyncWorker(TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger('django_partisan.async_worker')
+
+    def test_none_in_queue(self):
+        queue = Mock()
+        queue.get = MagicMock(return_value=None)
+        with patch.object(self.logger, 'info') as logger_info_mock:
+            AsyncWorker(queue).run()
+            logger_info_mock.assert_has_calls([call('Worker stopped')])
+
+    def test_tasks_processed(self):
+        tasks = [get_task_mock() for _ in range(4)]
+        queue = Mock()
+        queue.get.side_effect = [*tasks, None]
+        worker = AsyncWorker(queue)
+        worker.run()
+        for task in tasks:
+            task.run_async.assert_awaited_once()
+            task.complete.assert_called_once()
+        self.assertEqual(worker.tasks_processed, 4)
+
+    def test_tasks_run_at_once(self):
+        running = []
+        max_running = []
+
+        async def run_task(_):
+            running.append(1)
+            max_running.append(len(running))
+            await asyncio.sleep(0.05)
+            running.pop()
+
+        tasks = [get_task_mock(side_effect=run_task) for _ in range(5)]
+        queue = Mock()
+        queue.get.side_effect = [*tasks, None]
+        worker = AsyncWorker(queue)
+        worker.run()
+        self.assertEqual(max(max_running), 2)
+        self.assertEqual(worker.tasks_processed, 5)
+
+    def test_bad_task(self):
+        bad_task = get_task_mock(side_effect=ValueError)
+        queue = Mock()
+        queue.get.side_effect = [bad_task, get_task_mock(), None]
+        worker_logger = logging.getLogger('django_partisan.worker')
+        with patch.object(worker_logger, 'exception') as logger_mock:
+            AsyncWorker(queue).run()
+            logger_mock.assert_has_calls([call('Got exception, exiting')])
+        bad_task.fail.assert_called_once()
+        bad_task.complete.assert_not_called()
+
+    @patch('django_partisan.async_worker.Task')
+    def test_batch(self, task_class_mock):
+        batch = [get_task_mock(), get_task_mock(), get_task_mock()]
+        error = ValueError()
+        task_class_mock.run_batch.return_value = [None, error, None]
+        queue = Mock()
+        queue.get.side_effect = [batch, None]
+        worker_logger = logging.getLogger('django_partisan.worker')
+        with patch.object(worker_logger, 'exception') as logger_mock:
+            worker = AsyncWorker(queue)
+            worker.run()
+            logger_mock.assert_has_calls([call('Got exception, exiting')])
+        task_class_mock.run_batch.assert_called_once_with(batch)
+        batch[0].complete.assert_called_once()
+        batch[1].fail.assert_called_once_with(error)
+        batch[2].complete.assert_called_once()
+        self.assertEqual(worker.tasks_processed, 2)
+
+    def test_selfkill(self):
+        queue = Mock()
+        queue.get.side_effect = lambda *args: get_task_mock()
+        with patch.object(self.logger, 'info') as logger_mock:
+            AsyncWorker(queue, tasks_before_death=5).run()
+            logger_mock.assert_has_calls(
+                [call('Processed %d of %d tasks. Exiting', 5, 5)]
+            )
+
+    def test_empty_queue(self):
+        task = get_task_mock()
+        queue = Mock()
+        queue.get.side_effect = [task, Empty, None]
+        AsyncWorker(queue).run()
+        task.complete.assert_called_once()
+
+    def test_queue_timeout_with_running_tasks(self):
+        worker = AsyncWorker(Mock())
+        self.assertEqual(worker.get_queue_timeout(), 5)
+        self.assertEqual(
+            worker.get_queue_timeout(has_running_tasks=True), QUEUE_GET_TIMEOUT
+        )
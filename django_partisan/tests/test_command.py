@@ -1,7 +1,14 @@
+from datetime import timedelta
+from io import StringIO
 from unittest.mock import patch, Mock
 
 from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
+
+from django_partisan.models import Task, ArchivedTask
+from django_partisan.settings import get_queue_settings
+from django_partisan.tests.fixtures import TestTaskProcessor
 
 
 @patch('django_partisan.management.commands.start_partisan.WorkersManager')
@@ -33,10 +40,80 @@ class TestCommand(TestCase):
         manager_mock.assert_called_with(
             **{
                 'queue_name': 'default',
+                'queue_names': None,
+                'fetch_strategy': 'weighted',
                 self.min_queue_size: 1,
                 self.max_queue_size: 2,
                 self.checks_before_cleanup: 10,
                 self.workers_count: 1,
+                'min_workers_count': None,
                 self.sleep_delay_seconds: 1,
             }
         )
+
+    def test_queue_names_launch(self, manager_mock):
+        call_command(
+            self.command_name,
+            '--queue_names',
+            'first',
+            'second',
+            '--fetch_strategy=priority',
+        )
+        _, kwargs = manager_mock.call_args
+        self.assertEqual(kwargs['queue_names'], ['first', 'second'])
+        self.assertEqual(kwargs['fetch_strategy'], 'priority')
+
+
+class TestPruneCommand(TestCase):
+    command_name = 'prune_partisan'
+
+    def setUp(self):
+        self.settings = get_queue_settings()
+        old = timezone.now() - timedelta(days=2)
+        for i in range(5):
+            TestTaskProcessor(i).delay()
+        tasks_ids = list(Task.objects.values_list('pk', flat=True))
+        Task.objects.filter(pk__in=tasks_ids[:3]).update(
+            status=Task.STATUS_FINISHED, updated_at=old
+        )
+        Task.objects.filter(pk=tasks_ids[3]).update(
+            status=Task.STATUS_ERROR, updated_at=old
+        )
+        Task.objects.filter(pk=tasks_ids[4]).update(status=Task.STATUS_FINISHED)
+
+    def call_command(self, *args):
+        stdout = StringIO()
+        call_command(self.command_name, *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_nothing_configured(self):
+        output = self.call_command()
+        self.assertIn('Deleted 0 "finished" tasks of "default" queue', output)
+        self.assertEqual(Task.objects.count(), 5)
+
+    @patch('django_partisan.management.commands.prune_partisan.time')
+    def test_delete_by_batches(self, time_mock):
+        with patch.object(self.settings, 'FINISHED_TASKS_RETENTION_SECONDS', 3600):
+            output = self.call_command('--queue_names=default', '--batch_size=2')
+        self.assertIn('Deleted 3 "finished" tasks of "default" queue', output)
+        self.assertIn('Deleted 0 "error" tasks of "default" queue', output)
+        time_mock.sleep.assert_called_once_with(0)
+        self.assertEqual(
+            list(Task.objects.values_list('status', flat=True).order_by('status')),
+            [Task.STATUS_ERROR, Task.STATUS_FINISHED],
+        )
+
+    def test_archive(self):
+        with patch.object(self.settings, 'ERROR_TASKS_RETENTION_SECONDS', 3600):
+            with patch.object(self.settings, 'ARCHIVE_PRUNED_TASKS', True):
+                output = self.call_command()
+        self.assertIn('Archived 1 "error" tasks of "default" queue', output)
+        self.assertFalse(Task.objects.filter(status=Task.STATUS_ERROR).exists())
+        archived_task = ArchivedTask.objects.get()
+        self.assertEqual(archived_task.status, Task.STATUS_ERROR)
+        self.assertEqual(archived_task.processor_class, 'TestTaskProcessor')
+        self.assertEqual(
+            str(archived_task),
+            "TestTaskProcessor ({'args': [3], 'kwargs': {}}) - Error",
+        )
+        self.assertIsNotNone(archived_task.archived_at)
@@ -1,9 +1,16 @@
+from unittest import mock
+
 from django.test import TestCase
 from django.utils import timezone
 
 from django_partisan.settings import get_queue_settings
 from django_partisan.config import const
-from django_partisan.config.processor_configs import ErrorsHandleConfig, PostponeConfig
+from django_partisan.config.processor_configs import (
+    ErrorsHandleConfig,
+    PostponeConfig,
+    RateLimitConfig,
+    get_delay_seconds,
+)
 from django_partisan.exceptions import PostponeTask
 
 settings = get_queue_settings()
@@ -67,6 +74,27 @@ class TestErrorsHandleConfig(TestCase):
         new_date = config.get_new_datetime_for_retry(2)
         self.assertEqual(round(new_date.timestamp() - now), 10)
 
+    def test_config_get_new_datetime_for_delay_exponential_capped(self):
+        config = ErrorsHandleConfig(
+            **{
+                **self.normal_config,
+                'retries_count': 5,
+                'retry_pause_strategy': const.DELAY_STRATEGY_EXPONENTIAL,
+                'max_retry_pause': 30,
+            }
+        )
+        now = timezone.now().timestamp()
+        self.assertEqual(
+            round(config.get_new_datetime_for_retry(3).timestamp() - now), 20
+        )
+        self.assertEqual(
+            round(config.get_new_datetime_for_retry(5).timestamp() - now), 30
+        )
+
+    def test_validation_bad_max_pause(self):
+        with self.assertRaises(ValueError):
+            ErrorsHandleConfig(**{**self.normal_config, 'max_retry_pause': 0})
+
     def test_config_get_new_datetime_for_delay_error(self):
         config = ErrorsHandleConfig(
             **{
@@ -91,6 +119,36 @@ class TestPostponeConfig(TestCase):
             settings.DEFAULT_POSTPONE_DELAY_SECONDS,
         )
 
+    def test_get_new_datetime_for_postpone_exponential(self):
+        config = PostponeConfig(
+            max_postpones=10,
+            postpone_pause_strategy=const.DELAY_STRATEGY_EXPONENTIAL,
+            max_postpone_pause=60,
+        )
+        now = timezone.now().timestamp()
+        self.assertEqual(
+            round(
+                config.get_new_datetime_for_postpone(PostponeTask(10), 3).timestamp()
+                - now
+            ),
+            40,
+        )
+        self.assertEqual(
+            round(
+                config.get_new_datetime_for_postpone(PostponeTask(10), 4).timestamp()
+                - now
+            ),
+            60,
+        )
+
+    def test_validation_postpone_bad_strategy(self):
+        with self.assertRaises(ValueError):
+            PostponeConfig(max_postpones=10, postpone_pause_strategy='not strategy id')
+
+    def test_validation_postpone_bad_max_pause(self):
+        with self.assertRaises(ValueError):
+            PostponeConfig(max_postpones=10, max_postpone_pause=-1)
+
     def test_get_new_datetime_for_postpone_set_in_signal(self):
         config = PostponeConfig(max_postpones=10)
         now = timezone.now().timestamp()
@@ -98,3 +156,76 @@ class TestPostponeConfig(TestCase):
             PostponeTask(10)
         ).timestamp()
         self.assertEqual(round(new_datetime_for_postpone - now), 10)
+
+
+class TestDelayStrategies(TestCase):
+    def test_constant(self):
+        self.assertEqual(get_delay_seconds(const.DELAY_STRATEGY_CONSTANT, 5, 3), 5)
+
+    def test_incremental(self):
+        self.assertEqual(get_delay_seconds(const.DELAY_STRATEGY_INCREMENTAL, 5, 3), 15)
+
+    def test_exponential(self):
+        self.assertEqual(
+            [
+                get_delay_seconds(const.DELAY_STRATEGY_EXPONENTIAL, 5, attempt)
+                for attempt in range(1, 5)
+            ],
+            [5, 10, 20, 40],
+        )
+
+    def test_capped(self):
+        for strategy in const.DELAY_STRATEGIES:
+            self.assertEqual(get_delay_seconds(strategy, 5, 10, max_pause=3), 3)
+
+    def test_capped_by_max_delay(self):
+        for strategy in (
+            const.DELAY_STRATEGY_INCREMENTAL,
+            const.DELAY_STRATEGY_EXPONENTIAL,
+        ):
+            self.assertEqual(
+                get_delay_seconds(strategy, 60, 100000), const.MAX_DELAY_SECONDS
+            )
+
+    def test_big_retries_count(self):
+        for strategy in const.DELAY_STRATEGIES:
+            config = ErrorsHandleConfig(
+                retry_on_errors=(ValueError,),
+                retries_count=10000,
+                retry_pause=60,
+                retry_pause_strategy=strategy,
+            )
+            delay = config.get_new_datetime_for_retry(10000) - timezone.now()
+            self.assertLessEqual(delay.total_seconds(), const.MAX_DELAY_SECONDS)
+
+    def test_exponential_jitter_bounds(self):
+        for attempt in range(1, 6):
+            delay = get_delay_seconds(
+                const.DELAY_STRATEGY_EXPONENTIAL_JITTER, 2, attempt, max_pause=100
+            )
+            self.assertGreaterEqual(delay, 2)
+            self.assertLessEqual(delay, min(2 * 3 ** (attempt - 1), 100))
+
+    @mock.patch('django_partisan.config.processor_configs.random.uniform')
+    def test_exponential_jitter_range(self, uniform_mock):
+        uniform_mock.return_value = 7
+        delay = get_delay_seconds(
+            const.DELAY_STRATEGY_EXPONENTIAL_JITTER, 2, 4, max_pause=30
+        )
+        self.assertEqual(delay, 7)
+        uniform_mock.assert_called_once_with(2, 30)
+
+
+class TestRateLimitConfig(TestCase):
+    def test_tasks_per_second(self):
+        config = RateLimitConfig(max_tasks=30, per_seconds=60)
+        self.assertEqual(config.tasks_per_second, 0.5)
+        self.assertEqual(RateLimitConfig(max_tasks=3).tasks_per_second, 3)
+
+    def test_validation_zero_max_tasks(self):
+        with self.assertRaises(ValueError):
+            RateLimitConfig(max_tasks=0)
+
+    def test_validation_zero_per_seconds(self):
+        with self.assertRaises(ValueError):
+            RateLimitConfig(max_tasks=1, per_seconds=0)
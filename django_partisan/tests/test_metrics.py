@@ -0,0 +1,179 @@
+import os
+import tempfile
+import time
+from unittest.mock import patch, Mock
+from urllib.request import urlopen
+
+from django.test import TestCase
+
+from django_partisan import metrics
+from django_partisan.metrics import MetricsRegistry, MetricsCollector, format_labels
+from django_partisan.models import Task
+from django_partisan.tests.fixtures import (
+    ConfiguredFailingTestTaskProcessor,
+    PostponableTestTaskProcessor,
+    TestTaskProcessor,
+)
+from django_partisan.worker import Worker
+
+
+def collect_events(collector, expected_line):
+    """Events from other processes reach queue with a small delay"""
+    for _ in range(100):
+        collector.collect()
+        if expected_line in collector.registry.render():
+            return
+        time.sleep(0.01)
+
+
+class TestMetricsRegistry(TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_counter(self):
+        labels = (('processor', 'TestTaskProcessor'), ('queue', 'default'))
+        self.registry.record(metrics.TASKS_COMPLETED, 1, labels)
+        self.registry.record(metrics.TASKS_COMPLETED, 1, labels)
+        self.assertIn(
+            'partisan_tasks_completed_total'
+            '{processor="TestTaskProcessor",queue="default"} 2',
+            self.registry.render(),
+        )
+
+    def test_gauge(self):
+        self.registry.record(metrics.LOCAL_QUEUE_DEPTH, 5, ())
+        self.registry.record(metrics.LOCAL_QUEUE_DEPTH, 3, ())
+        rendered = self.registry.render()
+        self.assertIn('# TYPE partisan_local_queue_depth gauge', rendered)
+        self.assertIn('partisan_local_queue_depth 3', rendered)
+
+    def test_histogram(self):
+        labels = (('queue', 'default'),)
+        self.registry.record(metrics.TASK_LAG, 0.2, labels)
+        self.registry.record(metrics.TASK_LAG, 20, labels)
+        rendered = self.registry.render().splitlines()
+        self.assertIn('# TYPE partisan_task_lag_seconds histogram', rendered)
+        self.assertIn(
+            'partisan_task_lag_seconds_bucket{queue="default",le="0.1"} 0.0', rendered
+        )
+        self.assertIn(
+            'partisan_task_lag_seconds_bucket{queue="default",le="0.25"} 1.0', rendered
+        )
+        self.assertIn(
+            'partisan_task_lag_seconds_bucket{queue="default",le="+Inf"} 2.0', rendered
+        )
+        self.assertIn('partisan_task_lag_seconds_sum{queue="default"} 20.2', rendered)
+        self.assertIn('partisan_task_lag_seconds_count{queue="default"} 2.0', rendered)
+
+    def test_format_labels(self):
+        self.assertEqual(format_labels(()), '')
+        self.assertEqual(
+            format_labels((('processor', 'a"b\\c\nd'),)),
+            '{processor="a\\"b\\\\c\\nd"}',
+        )
+
+
+class TestMetricsCollector(TestCase):
+    def setUp(self):
+        self.collector = MetricsCollector()
+        self.collector.start()
+        self.addCleanup(self.collector.close)
+
+    def test_record_disabled(self):
+        self.collector.close()
+        metrics.record(metrics.WORKER_RESTARTS)
+        self.assertNotIn(
+            'partisan_worker_restarts_total 1', self.collector.registry.render()
+        )
+
+    def test_record_in_manager(self):
+        metrics.record(metrics.WORKER_RESTARTS)
+        self.assertIn(
+            'partisan_worker_restarts_total 1', self.collector.registry.render()
+        )
+
+    def test_record_from_worker(self):
+        with patch.object(metrics, '_events_queue', self.collector.events):
+            metrics.record(metrics.WORKER_RESTARTS)
+            metrics.record(metrics.WORKER_RESTARTS)
+        collect_events(self.collector, 'partisan_worker_restarts_total 2')
+        self.assertIn(
+            'partisan_worker_restarts_total 2', self.collector.registry.render()
+        )
+
+    def test_http(self):
+        collector = MetricsCollector(port=0)
+        collector.start()
+        self.addCleanup(collector.close)
+        metrics.record(metrics.WORKER_RESTARTS)
+        host, port = collector.server.server_address
+        self.assertEqual(host, '127.0.0.1')
+        with urlopen(f'http://127.0.0.1:{port}/metrics') as response:
+            body = response.read().decode()
+            self.assertIn('text/plain', response.headers['Content-Type'])
+        self.assertIn('partisan_worker_restarts_total 1', body)
+
+    def test_textfile(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'partisan.prom')
+            collector = MetricsCollector(textfile=path)
+            collector.start()
+            metrics.record(metrics.WORKER_RESTARTS)
+            with patch('django_partisan.metrics.time') as time_mock:
+                time_mock.monotonic.side_effect = [0, 1, 10]
+                collector.collect()
+                metrics.record(metrics.WORKER_RESTARTS)
+                collector.collect()
+                with open(path) as textfile:
+                    self.assertIn('partisan_worker_restarts_total 1', textfile.read())
+                collector.collect()
+                with open(path) as textfile:
+                    self.assertIn('partisan_worker_restarts_total 2', textfile.read())
+            collector.close()
+            self.assertEqual(os.listdir(directory), ['partisan.prom'])
+
+    def test_task_metrics(self):
+        ConfiguredFailingTestTaskProcessor(1).delay().run()
+        PostponableTestTaskProcessor().delay().run()
+        TestTaskProcessor(1).delay().fail(ValueError())
+        rendered = self.collector.registry.render()
+        self.assertIn(
+            'partisan_tasks_retried_total'
+            '{processor="ConfiguredFailingTestTaskProcessor",queue="default"} 1',
+            rendered,
+        )
+        self.assertIn(
+            'partisan_tasks_postponed_total'
+            '{processor="PostponableTestTaskProcessor",queue="default"} 1',
+            rendered,
+        )
+        self.assertIn(
+            'partisan_tasks_failed_total'
+            '{processor="TestTaskProcessor",queue="default"} 1',
+            rendered,
+        )
+        self.assertIn(
+            'partisan_task_duration_seconds_count'
+            '{processor="PostponableTestTaskProcessor",queue="default"} 1',
+            rendered,
+        )
+
+    def test_worker_metrics(self):
+        TestTaskProcessor(1).delay()
+        queue = Mock()
+        queue.get.side_effect = [Task.objects.select_for_process()[0], None]
+        with patch.object(metrics, 'use_events_queue') as use_events_queue_mock:
+            Worker(queue, metrics_queue=self.collector.events).run()
+        use_events_queue_mock.assert_called_once_with(self.collector.events)
+        self.assertIn(
+            'partisan_tasks_completed_total'
+            '{processor="TestTaskProcessor",queue="default"} 1',
+            self.collector.registry.render(),
+        )
+
+    def test_use_events_queue(self):
+        events = Mock()
+        metrics.use_events_queue(events)
+        self.addCleanup(metrics.use_events_queue, None)
+        metrics.record(metrics.WORKER_RESTARTS)
+        events.put.assert_called_once_with((metrics.WORKER_RESTARTS, 1, ()))
@@ -1,22 +1,47 @@
+import asyncio
+import pickle
+import threading
+from datetime import timedelta
 from unittest import mock
 
-from django.test import TestCase
+from django.db import connection, transaction, OperationalError
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
-from django_partisan.settings import get_queue_settings
-from django_partisan.exceptions import MaxPostponesReached
-from django_partisan.models import Task
+from django_partisan.config import const as config_const
+from django_partisan.config.processor_configs import PostponeConfig, RateLimitConfig
+from django_partisan.settings import get_queue_settings, const as settings_const
+from django_partisan.exceptions import (
+    MaxPostponesReached,
+    PostponeTask,
+    ProcessorClassNotFound,
+)
+from django_partisan.models import Task, TaskTiming, RateLimitBucket
 from django_partisan.tests.fixtures import (
     TestTaskProcessor,
     ConfiguredTestTaskProcessor,
     ConfiguredFailingTestTaskProcessor,
     PostponableTestTaskProcessor,
     PostponableConfiguredTestTaskProcessor,
+    FailingTestTaskProcessor,
+    AsyncTestTaskProcessor,
+    AsyncConfiguredFailingTestTaskProcessor,
+    AsyncPostponableTestTaskProcessor,
+    BatchTestTaskProcessor,
+    FailingBatchTestTaskProcessor,
 )
 
 settings = get_queue_settings()
 
 
+def get_moved_task_error(message: str) -> OperationalError:
+    error = OperationalError(message)
+    error.__cause__ = Exception(message)
+    error.__cause__.pgcode = '40001'  # type: ignore
+    return error
+
+
 class TestTaskModel(TestCase):
     def setUp(self) -> None:
         for i in range(10):
@@ -25,9 +50,30 @@ class TestTaskModel(TestCase):
     def test_task_verbose_name(self):
         new_task = Task.objects.first()
         self.assertEqual(
-            str(new_task), "TestTaskProcessor ({'args': [0], 'kwargs': {}}) - New",
+            str(new_task),
+            "TestTaskProcessor ({'args': [0], 'kwargs': {}}) - New",
         )
 
+    @mock.patch('django_partisan.models.get_queue_settings', wraps=get_queue_settings)
+    def test_settings_not_resolved_for_fetched_tasks(self, get_queue_settings_mock):
+        with self.assertNumQueries(1):
+            tasks = list(Task.objects.only('id'))
+        self.assertEqual(len(tasks), 10)
+        get_queue_settings_mock.assert_not_called()
+        tasks = Task.objects.select_for_process()
+        # Claim resolves settings of queue, not of every claimed task
+        self.assertLess(get_queue_settings_mock.call_count, len(tasks))
+
+    def test_settings_not_pickled(self):
+        task = Task.objects.first()
+        self.assertIs(task.settings, settings)
+        pickled_task = pickle.dumps(task)
+        self.assertNotIn(b'QueueSettings', pickled_task)
+        unpickled_task = pickle.loads(pickled_task)
+        self.assertIn('settings', task.__dict__)
+        self.assertNotIn('settings', unpickled_task.__dict__)
+        self.assertIs(unpickled_task.settings, settings)
+
     def test_select_for_processing_with_count(self):
         tasks = Task.objects.select_for_process()
         self.assertTrue(all([task.status == Task.STATUS_IN_PROCESS for task in tasks]))
@@ -44,11 +90,225 @@ class TestTaskModel(TestCase):
         self.assertTrue(all([task.status == Task.STATUS_IN_PROCESS for task in tasks]))
         self.assertEqual(len(tasks), 5)
 
+    def test_select_for_processing_without_skip_locked(self):
+        with mock.patch.object(
+            connection.features, 'has_select_for_update_skip_locked', False
+        ):
+            tasks = Task.objects.select_for_process(5)
+        self.assertTrue(all([task.status == Task.STATUS_IN_PROCESS for task in tasks]))
+        self.assertEqual(len(tasks), 5)
+        self.assertEqual(Task.objects.filter(status=Task.STATUS_NEW).count(), 5)
+
+    def test_select_for_processing_sets_lease(self):
+        tasks = Task.objects.select_for_process(5, owner='node-1')
+        expected_expiry = timezone.now() + timedelta(
+            seconds=settings.TASK_LEASE_SECONDS
+        )
+        for task in Task.objects.filter(pk__in=[task.pk for task in tasks]):
+            self.assertEqual(task.owner, 'node-1')
+            self.assertAlmostEqual(
+                task.lease_expires_at.timestamp(), expected_expiry.timestamp(), 0
+            )
+
+    def test_select_for_processing_without_skip_locked_sets_lease(self):
+        with mock.patch.object(
+            connection.features, 'has_select_for_update_skip_locked', False
+        ):
+            Task.objects.select_for_process(5, owner='node-1')
+        self.assertEqual(
+            Task.objects.filter(owner='node-1', lease_expires_at__isnull=False).count(),
+            5,
+        )
+
+    def test_renew_leases(self):
+        Task.objects.select_for_process(3, owner='node-1')
+        Task.objects.select_for_process(3, owner='node-2')
+        Task.objects.update(lease_expires_at=timezone.now())
+        self.assertEqual(Task.objects.renew_leases('node-1'), 3)
+        self.assertEqual(
+            Task.objects.filter(lease_expires_at__gt=timezone.now()).count(), 3
+        )
+
+    def test_renew_leases_retried_on_moved_task(self):
+        moved_error = get_moved_task_error('tuple to be locked was already moved')
+        with mock.patch(
+            'django_partisan.models.QuerySet.update', side_effect=[moved_error, 2]
+        ) as update_mock:
+            self.assertEqual(Task.objects.renew_leases('node-1'), 2)
+        self.assertEqual(update_mock.call_count, 2)
+
+    def test_renew_leases_not_retried_on_other_errors(self):
+        with mock.patch(
+            'django_partisan.models.QuerySet.update', side_effect=OperationalError
+        ) as update_mock:
+            with self.assertRaises(OperationalError):
+                Task.objects.renew_leases('node-1')
+        self.assertEqual(update_mock.call_count, 1)
+
+    def test_requeue_retries_are_bounded(self):
+        moved_error = get_moved_task_error('tuple to be updated was already moved')
+        with mock.patch(
+            'django_partisan.models.QuerySet.update', side_effect=moved_error
+        ) as update_mock:
+            with self.assertRaises(OperationalError):
+                Task.objects.requeue_expired_tasks()
+        self.assertEqual(update_mock.call_count, 3)
+
+    def test_requeue_expired_tasks(self):
+        Task.objects.select_for_process(3, owner='node-1')
+        Task.objects.select_for_process(3, owner='node-2')
+        Task.objects.filter(owner='node-1').update(
+            lease_expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        self.assertEqual(Task.objects.requeue_expired_tasks(), 3)
+        self.assertEqual(Task.objects.filter(status=Task.STATUS_NEW).count(), 7)
+        self.assertFalse(Task.objects.filter(owner='node-1').exists())
+        self.assertEqual(Task.objects.requeue_expired_tasks('another_queue'), 0)
+
+    def test_requeue_tasks_without_lease(self):
+        Task.objects.select_for_process(3)
+        Task.objects.update(lease_expires_at=None)
+        self.assertEqual(Task.objects.requeue_expired_tasks(), 3)
+
+    def test_release_tasks(self):
+        Task.objects.select_for_process(3, owner='node-1')
+        Task.objects.select_for_process(3, owner='node-2')
+        self.assertEqual(Task.objects.release_tasks('node-1'), 3)
+        self.assertEqual(
+            list(
+                Task.objects.filter(status=Task.STATUS_IN_PROCESS)
+                .values_list('owner', flat=True)
+                .distinct()
+            ),
+            ['node-2'],
+        )
+
+    def test_release_claimed_tasks(self):
+        tasks = Task.objects.select_for_process(3, owner='node-1')
+        other_task = Task.objects.select_for_process(1, owner='node-2')[0]
+        tasks[0].complete()
+        tasks_ids = [task.pk for task in tasks] + [other_task.pk]
+        self.assertEqual(Task.objects.release_claimed_tasks('node-1', tasks_ids), 2)
+        self.assertEqual(Task.objects.get(pk=tasks[0].pk).status, Task.STATUS_FINISHED)
+        self.assertEqual(Task.objects.get(pk=tasks[1].pk).status, Task.STATUS_NEW)
+        self.assertEqual(
+            Task.objects.get(pk=other_task.pk).status, Task.STATUS_IN_PROCESS
+        )
+
+    def test_select_for_processing_single_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            tasks = Task.objects.select_for_process(5)
+        statements = [
+            query['sql'] for query in queries if 'SAVEPOINT' not in query['sql']
+        ]
+        self.assertEqual(len(statements), 1)
+        self.assertIn('SKIP LOCKED', statements[0])
+        self.assertEqual(
+            Task.objects.filter(status=Task.STATUS_IN_PROCESS).count(), len(tasks)
+        )
+
+    def test_select_for_processing_ordered_by_priority(self):
+        TestTaskProcessor(100).delay(priority=100)
+        tasks = Task.objects.select_for_process(3)
+        self.assertEqual(tasks[0].priority, 100)
+
+    def test_select_for_processing_ordered_by_execute_after(self):
+        Task.objects.update(execute_after=timezone.now() - timedelta(minutes=1))
+        oldest_task = TestTaskProcessor(100).delay(
+            execute_after=timezone.now() - timedelta(minutes=5)
+        )
+        with connection.cursor() as cursor:
+            # Without fetch index tasks come in order of insertion
+            cursor.execute('SET LOCAL enable_indexscan = off')
+            cursor.execute('SET LOCAL enable_bitmapscan = off')
+        for claim_with_skip_locked in (True, False):
+            with mock.patch.object(
+                connection.features,
+                'has_select_for_update_skip_locked',
+                claim_with_skip_locked,
+            ):
+                tasks = Task.objects.select_for_process(1)
+            self.assertEqual(tasks[0].pk, oldest_task.pk)
+            Task.objects.reset_tasks_to_initial_status()
+
+    def test_select_for_processing_skips_not_ready(self):
+        Task.objects.update(execute_after=timezone.now() + timedelta(minutes=5))
+        self.assertEqual(Task.objects.select_for_process(), [])
+
+    def test_select_for_processing_uses_fetch_index(self):
+        fetch_qs = Task.objects.filter(
+            status=Task.STATUS_NEW,
+            execute_after__lte=timezone.now(),
+            queue_name=settings_const.DEFAULT_QUEUE_NAME,
+        )[:5]
+        sql, params = fetch_qs.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            # Other partial indexes of new tasks need sort to keep priority order
+            cursor.execute('SET LOCAL enable_sort = off')
+            cursor.execute(f'EXPLAIN {sql}', params)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        self.assertIn('django_partisan_task_fetch_idx', plan)
+
+    def test_prune_tasks_uses_prune_index(self):
+        prune_qs = Task.objects.filter(
+            queue_name=settings_const.DEFAULT_QUEUE_NAME,
+            status=Task.STATUS_FINISHED,
+            updated_at__lt=timezone.now(),
+        ).values('pk')[:5]
+        sql, params = prune_qs.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN {sql}', params)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        self.assertIn('django_partisan_task_prune_idx', plan)
+
+    def test_task_message(self):
+        task = Task.objects.select_for_process(1)[0]
+        message = task.to_message()
+        self.assertEqual(message.id, task.id)
+        self.assertEqual(message.arguments, task.arguments)
+        with self.assertNumQueries(0):
+            restored_task = Task.from_message(message)
+            self.assertEqual(restored_task.pk, task.pk)
+            self.assertEqual(restored_task.processor_class, task.processor_class)
+            self.assertEqual(restored_task.status, Task.STATUS_IN_PROCESS)
+        self.assertEqual(restored_task.priority, task.priority)
+
+    def test_task_from_message_complete(self):
+        task = Task.from_message(Task.objects.select_for_process(1)[0].to_message())
+        self.assertEqual(task.run(), 0)
+        task.complete()
+        self.assertEqual(
+            Task.objects.get(pk=task.pk).status,
+            Task.STATUS_FINISHED,
+        )
+
+    def test_task_from_message_redelayed(self):
+        task = ConfiguredFailingTestTaskProcessor(10).delay()
+        Task.objects.select_for_process()
+        task = Task.from_message(task.to_message())
+        task.run()
+        db_task = Task.objects.get(pk=task.pk)
+        self.assertEqual(db_task.status, Task.STATUS_NEW)
+        self.assertEqual(db_task.tries_count, 1)
+
     def test_task_complete(self):
         task = Task.objects.select_for_process()[0]
         task.complete()
         self.assertEqual(task.status, Task.STATUS_FINISHED)
 
+    def test_complete_tasks(self):
+        tasks = Task.objects.select_for_process(3)
+        with self.assertNumQueries(1):
+            Task.objects.complete_tasks([task.pk for task in tasks])
+        self.assertEqual(Task.objects.filter(status=Task.STATUS_FINISHED).count(), 3)
+
+    def test_complete_tasks_delete(self):
+        tasks = Task.objects.select_for_process(3)
+        Task.objects.complete_tasks([task.pk for task in tasks], delete=True)
+        self.assertEqual(Task.objects.count(), 7)
+
     def test_task_fail(self):
         exception_text = 'Some exception text'
         task = Task.objects.select_for_process()[0]
@@ -70,6 +330,70 @@ class TestTaskModel(TestCase):
         task.tries_count = 6
         self.assertEqual(task.tries_count, 6)
 
+    def test_counters_kept_separately(self):
+        task = Task.objects.select_for_process()[0]
+        task.tries_count = 2
+        task.postpones_count = 3
+        self.assertEqual(task.tries_count, 2)
+        self.assertEqual(task.postpones_count, 3)
+
+    def test_reschedule_single_query(self):
+        task = Task.objects.select_for_process(owner='owner')[0]
+        execute_after = timezone.now() + timedelta(seconds=30)
+        with self.assertNumQueries(1):
+            task.reschedule(execute_after, Task.COUNTER_RETRIES)
+        db_task = Task.objects.get(pk=task.pk)
+        self.assertEqual(db_task.status, Task.STATUS_NEW)
+        self.assertEqual(db_task.execute_after, execute_after)
+        self.assertIsNone(db_task.owner)
+        self.assertIsNone(db_task.lease_expires_at)
+        self.assertEqual(db_task.tries_count, 1)
+        self.assertEqual(task.tries_count, 1)
+
+    def test_reschedule_increments_counter_in_database(self):
+        task = Task.objects.select_for_process()[0]
+        Task.objects.filter(pk=task.pk).update(
+            extra={'retries': {'count': 3}, 'postpones': {'count': 1}}
+        )
+        task.reschedule(timezone.now(), Task.COUNTER_RETRIES)
+        self.assertEqual(
+            task.extra, {'retries': {'count': 4}, 'postpones': {'count': 1}}
+        )
+        task.reschedule(timezone.now(), Task.COUNTER_POSTPONES)
+        self.assertEqual(
+            Task.objects.get(pk=task.pk).extra,
+            {'retries': {'count': 4}, 'postpones': {'count': 2}},
+        )
+
+    def test_reschedule_without_counter(self):
+        task = Task.objects.select_for_process()[0]
+        task.reschedule(timezone.now())
+        self.assertEqual(Task.objects.get(pk=task.pk).extra, {})
+
+    def test_reschedule_restores_unique_key(self):
+        task = Task.objects.select_for_process()[0]
+        self.assertIsNone(task.unique_key)
+        with self.assertNumQueries(3):
+            task.reschedule(timezone.now(), unique_key='key')
+        self.assertEqual(Task.objects.get(pk=task.pk).unique_key, 'key')
+        self.assertEqual(task.unique_key, 'key')
+
+    def test_reschedule_drops_duplicate_of_pending_task(self):
+        task = Task.objects.select_for_process()[0]
+        pending_task = Task.objects.create_unique(
+            processor_class='TestTaskProcessor', unique_key='key'
+        )
+        self.assertIsNone(
+            Task.objects.reschedule_task(task.pk, timezone.now(), unique_key='key')
+        )
+        self.assertFalse(Task.objects.filter(pk=task.pk).exists())
+        self.assertEqual(Task.objects.get(pk=pending_task.pk).status, Task.STATUS_NEW)
+
+    def test_reschedule_deleted_task(self):
+        task = Task.objects.select_for_process()[0]
+        Task.objects.filter(pk=task.pk).delete()
+        self.assertIsNone(Task.objects.reschedule_task(task.pk, timezone.now()))
+
     def test_get_initialized_processor(self):
         task = TestTaskProcessor(10, test_key='test').delay()
         processor = task.get_initialized_processor()
@@ -102,6 +426,20 @@ class TestTaskModel(TestCase):
         self.assertEqual(task.status, Task.STATUS_NEW)
         self.assertEqual(round(task.execute_after.timestamp() - now), 15)
 
+    def test_postponable_configured_processor_run_uses_strategy(self):
+        task = PostponableConfiguredTestTaskProcessor().delay()
+        task.postpones_count = 1
+        config = PostponeConfig(
+            max_postpones=5,
+            postpone_pause_strategy=config_const.DELAY_STRATEGY_EXPONENTIAL,
+        )
+        with mock.patch.object(
+            PostponableConfiguredTestTaskProcessor, 'POSTPONE_CONFIG', config
+        ):
+            task.run()
+        now = timezone.now().timestamp()
+        self.assertEqual(round(task.execute_after.timestamp() - now), 30)
+
     def test_postpones_count(self):
         task = PostponableTestTaskProcessor().delay()
         self.assertEqual(task.postpones_count, 0)
@@ -121,3 +459,405 @@ class TestTaskModel(TestCase):
         task.postpones_count = 5
         with self.assertRaises(MaxPostponesReached):
             task.run()
+
+    def test_not_configured_processor_run_fails(self):
+        task = FailingTestTaskProcessor().delay()
+        with self.assertRaises(ValueError):
+            task.run()
+        self.assertEqual(task.tries_count, 0)
+
+
+class TestTaskModelRunAsync(TestCase):
+    def test_async_processor_run(self):
+        task = AsyncTestTaskProcessor(10).delay()
+        self.assertEqual(asyncio.run(task.run_async()), 10)
+
+    def test_sync_processor_run(self):
+        task = TestTaskProcessor(10).delay()
+        self.assertEqual(asyncio.run(task.run_async()), 10)
+
+    @mock.patch.object(Task, 'handle_exception')
+    def test_async_processor_run_error_handled(self, handle_exception_mock):
+        task = AsyncConfiguredFailingTestTaskProcessor().delay()
+        asyncio.run(task.run_async())
+        handle_exception_mock.assert_called_once()
+        processor, err = handle_exception_mock.call_args[0]
+        self.assertIsInstance(processor, AsyncConfiguredFailingTestTaskProcessor)
+        self.assertIsInstance(err, ValueError)
+
+    @mock.patch.object(Task, 'handle_exception')
+    def test_async_processor_postpone_handled(self, handle_exception_mock):
+        task = AsyncPostponableTestTaskProcessor().delay()
+        asyncio.run(task.run_async())
+        handle_exception_mock.assert_called_once()
+        self.assertIsInstance(handle_exception_mock.call_args[0][1], PostponeTask)
+
+    def test_async_processor_run_fails(self):
+        task = AsyncConfiguredFailingTestTaskProcessor().delay()
+        task.tries_count = 5
+        with self.assertRaises(ValueError):
+            asyncio.run(task.run_async())
+
+    def test_sync_processor_run_fails(self):
+        task = FailingTestTaskProcessor().delay()
+        with self.assertRaises(ValueError):
+            asyncio.run(task.run_async())
+
+
+@mock.patch.object(settings, 'TRACK_TASK_TIMING', True)
+class TestTaskTiming(TestCase):
+    def setUp(self) -> None:
+        for i in range(3):
+            TestTaskProcessor(i).delay()
+
+    def test_claimed_at(self):
+        tasks = Task.objects.select_for_process(1)
+        self.assertIsNotNone(Task.objects.get(pk=tasks[0].pk).claimed_at)
+        with mock.patch.object(
+            connection.features, 'has_select_for_update_skip_locked', False
+        ):
+            tasks = Task.objects.select_for_process(1)
+        self.assertIsNotNone(Task.objects.get(pk=tasks[0].pk).claimed_at)
+        with mock.patch.object(settings, 'TRACK_TASK_TIMING', False):
+            tasks = Task.objects.select_for_process(1)
+        self.assertIsNone(Task.objects.get(pk=tasks[0].pk).claimed_at)
+
+    @mock.patch('django_partisan.models.time')
+    def test_run_and_complete(self, time_mock):
+        time_mock.monotonic.side_effect = [10, 10.25]
+        task = Task.objects.select_for_process(1)[0]
+        task.run()
+        task.complete()
+        db_task = Task.objects.get(pk=task.pk)
+        self.assertEqual(db_task.run_duration_ms, 250)
+        self.assertLessEqual(db_task.claimed_at, db_task.started_at)
+        self.assertEqual(
+            db_task.finished_at, db_task.started_at + timedelta(milliseconds=250)
+        )
+
+    def test_run_and_fail(self):
+        task = Task.objects.select_for_process(1)[0]
+        task.run()
+        task.fail(ValueError())
+        self.assertIsNotNone(Task.objects.get(pk=task.pk).run_duration_ms)
+
+    def test_not_tracked(self):
+        task = Task.objects.select_for_process(1)[0]
+        with mock.patch.object(settings, 'TRACK_TASK_TIMING', False):
+            task.run()
+            task.complete()
+        db_task = Task.objects.get(pk=task.pk)
+        self.assertIsNone(db_task.started_at)
+        self.assertIsNone(db_task.finished_at)
+
+    def test_fail_not_run_task_from_message(self):
+        task = Task.from_message(Task.objects.select_for_process(1)[0].to_message())
+        with self.assertNumQueries(1):
+            task.fail(ValueError())
+        self.assertIsNone(Task.objects.get(pk=task.pk).started_at)
+
+    def test_complete_tasks_with_timings(self):
+        tasks = Task.objects.select_for_process(3)
+        started_at = timezone.now()
+        timings = {
+            tasks[0].pk: TaskTiming(started_at, 10),
+            tasks[1].pk: TaskTiming(started_at, 20),
+        }
+        with self.assertNumQueries(1):
+            Task.objects.complete_tasks([task.pk for task in tasks], timings=timings)
+        self.assertEqual(
+            {
+                task.pk: (task.status, task.started_at, task.run_duration_ms)
+                for task in Task.objects.all()
+            },
+            {
+                tasks[0].pk: (Task.STATUS_FINISHED, started_at, 10),
+                tasks[1].pk: (Task.STATUS_FINISHED, started_at, 20),
+                tasks[2].pk: (Task.STATUS_FINISHED, None, None),
+            },
+        )
+
+    @mock.patch('django_partisan.models.logger')
+    @mock.patch('django_partisan.models.time')
+    def test_slow_task(self, time_mock, logger_mock):
+        time_mock.monotonic.side_effect = [10, 10.5, 20, 22]
+        task = Task.objects.select_for_process(1)[0]
+        with mock.patch.object(settings, 'SLOW_TASK_THRESHOLD_MS', 1000):
+            task.run()
+            logger_mock.warning.assert_not_called()
+            task.run()
+        logger_mock.warning.assert_called_once_with(
+            'Slow task %s with arguments %r took %.3f seconds',
+            'TestTaskProcessor',
+            task.arguments,
+            2,
+        )
+
+
+class TestRateLimits(TestCase):
+    def setUp(self) -> None:
+        for i in range(5):
+            ConfiguredTestTaskProcessor(i).delay()
+            TestTaskProcessor(i).delay()
+        patcher = mock.patch.object(
+            ConfiguredTestTaskProcessor,
+            'RATE_LIMIT',
+            RateLimitConfig(max_tasks=3, per_seconds=60),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_claimed_count(self, processor_class):
+        return Task.objects.filter(
+            status=Task.STATUS_IN_PROCESS, processor_class=processor_class.__name__
+        ).count()
+
+    def test_limited_processor_throttled(self):
+        tasks = Task.objects.select_for_process()
+        self.assertEqual(len(tasks), 8)
+        self.assertEqual(self.get_claimed_count(ConfiguredTestTaskProcessor), 3)
+        self.assertEqual(self.get_claimed_count(TestTaskProcessor), 5)
+        self.assertEqual(Task.objects.select_for_process(), [])
+        bucket = RateLimitBucket.objects.get(pk='ConfiguredTestTaskProcessor')
+        self.assertEqual(bucket.tokens, 0)
+
+    def test_limited_processor_throttled_without_skip_locked(self):
+        with mock.patch.object(
+            connection.features, 'has_select_for_update_skip_locked', False
+        ):
+            Task.objects.select_for_process()
+            Task.objects.select_for_process()
+        self.assertEqual(self.get_claimed_count(ConfiguredTestTaskProcessor), 3)
+        self.assertEqual(self.get_claimed_count(TestTaskProcessor), 5)
+
+    def test_throttled_processor_not_claimed(self):
+        Task.objects.select_for_process()
+        TestTaskProcessor(10).delay()
+        with CaptureQueriesContext(connection) as queries:
+            tasks = Task.objects.select_for_process()
+        self.assertEqual(len(tasks), 1)
+        statements = [
+            query['sql'] for query in queries if 'SAVEPOINT' not in query['sql']
+        ]
+        # Count of limited tasks to claim, locking of empty bucket
+        # and claim of not limited processors
+        self.assertEqual(len(statements), 3)
+
+    def test_tokens_refilled(self):
+        Task.objects.select_for_process()
+        RateLimitBucket.objects.update(
+            refilled_at=timezone.now() - timedelta(seconds=40)
+        )
+        Task.objects.select_for_process()
+        self.assertEqual(self.get_claimed_count(ConfiguredTestTaskProcessor), 5)
+        RateLimitBucket.objects.update(
+            refilled_at=timezone.now() - timedelta(seconds=600)
+        )
+        bucket = RateLimitBucket.objects.acquire(
+            'ConfiguredTestTaskProcessor', ConfiguredTestTaskProcessor.RATE_LIMIT
+        )
+        self.assertEqual(bucket.refill(ConfiguredTestTaskProcessor.RATE_LIMIT), 3)
+
+    def test_tokens_not_spent_over_count(self):
+        tasks = Task.objects.select_for_process(2)
+        self.assertEqual(len(tasks), 2)
+        self.assertEqual(self.get_claimed_count(ConfiguredTestTaskProcessor), 1)
+        self.assertEqual(RateLimitBucket.objects.get().tokens, 2)
+        Task.objects.select_for_process(6)
+        self.assertEqual(self.get_claimed_count(ConfiguredTestTaskProcessor), 3)
+        self.assertEqual(self.get_claimed_count(TestTaskProcessor), 5)
+
+    def test_bucket_not_acquired_without_tasks(self):
+        Task.objects.filter(processor_class='ConfiguredTestTaskProcessor').update(
+            execute_after=timezone.now() + timedelta(minutes=1)
+        )
+        self.assertEqual(len(Task.objects.select_for_process()), 5)
+        self.assertFalse(RateLimitBucket.objects.exists())
+
+    def test_higher_priority_claimed_first(self):
+        high_priority_task = TestTaskProcessor(10).delay(priority=20)
+        tasks = Task.objects.select_for_process(1)
+        self.assertEqual(tasks, [high_priority_task])
+        self.assertFalse(RateLimitBucket.objects.exists())
+        limited_task = ConfiguredTestTaskProcessor(10).delay(priority=30)
+        self.assertEqual(Task.objects.select_for_process(1), [limited_task])
+
+    def test_bucket_shared_by_owners(self):
+        Task.objects.select_for_process(2, owner='node-1')
+        Task.objects.select_for_process(owner='node-2')
+        self.assertEqual(
+            Task.objects.filter(
+                processor_class='ConfiguredTestTaskProcessor', owner='node-2'
+            ).count(),
+            2,
+        )
+
+    def test_count_reached_by_limited_processors(self):
+        with mock.patch.object(
+            TestTaskProcessor, 'RATE_LIMIT', RateLimitConfig(max_tasks=3)
+        ):
+            tasks = Task.objects.select_for_process(1)
+        self.assertEqual(len(tasks), 1)
+        self.assertEqual(RateLimitBucket.objects.count(), 1)
+        self.assertEqual(
+            str(RateLimitBucket.objects.get()), f'{tasks[0].processor_class} - 2.0'
+        )
+
+
+class TestConcurrencyLimits(TestCase):
+    def setUp(self) -> None:
+        for i in range(5):
+            ConfiguredTestTaskProcessor(i).delay()
+            TestTaskProcessor(i).delay()
+        patcher = mock.patch.object(ConfiguredTestTaskProcessor, 'MAX_CONCURRENCY', 2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_claimed_count(self, processor_class):
+        return Task.objects.filter(
+            status=Task.STATUS_IN_PROCESS, processor_class=processor_class.__name__
+        ).count()
+
+    def test_concurrency_limited(self):
+        tasks = Task.objects.select_for_process(owner='node-1')
+        self.assertEqual(len(tasks), 7)
+        self.assertEqual(self.get_claimed_count(ConfiguredTestTaskProcessor), 2)
+        self.assertEqual(Task.objects.select_for_process(owner='node-2'), [])
+        limited_task = next(
+            task
+            for task in tasks
+            if task.processor_class == 'ConfiguredTestTaskProcessor'
+        )
+        limited_task.complete()
+        self.assertEqual(len(Task.objects.select_for_process(owner='node-2')), 1)
+        self.assertEqual(self.get_claimed_count(ConfiguredTestTaskProcessor), 2)
+
+    def test_claims_serialized_with_lock(self):
+        with CaptureQueriesContext(connection) as queries:
+            Task.objects.select_for_process()
+        self.assertTrue(
+            any('pg_advisory_xact_lock' in query['sql'] for query in queries)
+        )
+
+    def test_no_lock_without_tasks(self):
+        Task.objects.filter(processor_class='ConfiguredTestTaskProcessor').update(
+            queue_name='another_queue'
+        )
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(len(Task.objects.select_for_process()), 5)
+        self.assertFalse(
+            any('pg_advisory_xact_lock' in query['sql'] for query in queries)
+        )
+
+    def test_no_lock_for_lower_priority_tasks(self):
+        TestTaskProcessor(10).delay(priority=20)
+        with CaptureQueriesContext(connection) as queries:
+            tasks = Task.objects.select_for_process(1)
+        self.assertEqual(tasks[0].processor_class, 'TestTaskProcessor')
+        self.assertFalse(
+            any('pg_advisory_xact_lock' in query['sql'] for query in queries)
+        )
+
+    def test_count_less_than_free_slots(self):
+        self.assertEqual(len(Task.objects.select_for_process(1)), 1)
+        self.assertEqual(self.get_claimed_count(ConfiguredTestTaskProcessor), 1)
+
+    def test_rate_limit_and_concurrency(self):
+        with mock.patch.object(
+            ConfiguredTestTaskProcessor, 'RATE_LIMIT', RateLimitConfig(max_tasks=3)
+        ):
+            Task.objects.select_for_process()
+            self.assertEqual(RateLimitBucket.objects.get().tokens, 1)
+            Task.objects.select_for_process()
+        self.assertEqual(self.get_claimed_count(ConfiguredTestTaskProcessor), 2)
+        # Bucket is not touched, while there are no free slots
+        self.assertEqual(RateLimitBucket.objects.get().tokens, 1)
+
+
+class TestConcurrencyLimitsLock(TransactionTestCase):
+    def claim_from_thread(self, claimed_tasks):
+        try:
+            claimed_tasks.extend(Task.objects.select_for_process(owner='node-2'))
+        finally:
+            connection.close()
+
+    @mock.patch.object(ConfiguredTestTaskProcessor, 'MAX_CONCURRENCY', 1)
+    def test_concurrent_claims_not_exceed_limit(self):
+        ConfiguredTestTaskProcessor(1).delay()
+        ConfiguredTestTaskProcessor(2).delay()
+        claimed_tasks = []
+        thread = threading.Thread(target=self.claim_from_thread, args=[claimed_tasks])
+        with transaction.atomic():
+            self.assertEqual(len(Task.objects.select_for_process(owner='node-1')), 1)
+            thread.start()
+            thread.join(0.5)
+            # Claim of other manager waits for the end of this transaction
+            self.assertTrue(thread.is_alive())
+        thread.join()
+        self.assertEqual(claimed_tasks, [])
+        self.assertEqual(Task.objects.filter(status=Task.STATUS_NEW).count(), 1)
+
+
+class TestTaskModelRunBatch(TestCase):
+    def setUp(self) -> None:
+        BatchTestTaskProcessor.batches = []
+
+    def test_run_batch(self):
+        tasks = [BatchTestTaskProcessor(i, key=i).delay() for i in range(3)]
+        self.assertEqual(Task.run_batch(tasks), [None, None, None])
+        self.assertEqual(
+            BatchTestTaskProcessor.batches,
+            [[((0,), {'key': 0}), ((1,), {'key': 1}), ((2,), {'key': 2})]],
+        )
+
+    def test_run_batch_without_errors(self):
+        tasks = [BatchTestTaskProcessor(i).delay() for i in range(2)]
+        with mock.patch.object(
+            BatchTestTaskProcessor, 'run_batch', return_value=None
+        ) as run_batch_mock:
+            self.assertEqual(Task.run_batch(tasks), [None, None])
+        run_batch_mock.assert_called_once_with([((0,), {}), ((1,), {})])
+
+    def test_run_batch_errors_per_task(self):
+        tasks = [
+            BatchTestTaskProcessor(argument).delay()
+            for argument in ('ok', 'fail', 'retry')
+        ]
+        errors = Task.run_batch(tasks)
+        self.assertIsNone(errors[0])
+        self.assertIsInstance(errors[1], ValueError)
+        self.assertIsNone(errors[2])
+        retried_task = Task.objects.get(pk=tasks[2].pk)
+        self.assertEqual(retried_task.status, Task.STATUS_NEW)
+        self.assertEqual(retried_task.tries_count, 1)
+        self.assertEqual(tasks[2].status, Task.STATUS_NEW)
+
+    def test_run_batch_raised_error(self):
+        tasks = [FailingBatchTestTaskProcessor(i).delay() for i in range(2)]
+        errors = Task.run_batch(tasks)
+        self.assertEqual(len(errors), 2)
+        self.assertTrue(all(isinstance(err, ValueError) for err in errors))
+
+    def test_run_batch_wrong_errors_count(self):
+        tasks = [FailingBatchTestTaskProcessor('short').delay()]
+        errors = Task.run_batch(tasks)
+        self.assertIsInstance(errors[0], ValueError)
+
+    def test_run_batch_unknown_processor(self):
+        tasks = [BatchTestTaskProcessor(1).delay()]
+        tasks[0].processor_class = 'UnknownProcessor'
+        errors = Task.run_batch(tasks)
+        self.assertIsInstance(errors[0], ProcessorClassNotFound)
+
+    def test_run_batch_timing(self):
+        tasks = [BatchTestTaskProcessor(i).delay() for i in range(2)]
+        with mock.patch.object(settings, 'TRACK_TASK_TIMING', True):
+            Task.run_batch(tasks)
+        for task in tasks:
+            self.assertIsNotNone(task.get_timing())
+
+    def test_batch_processor_single_run(self):
+        self.assertIsNone(BatchTestTaskProcessor(1).delay().run())
+        self.assertEqual(BatchTestTaskProcessor.batches, [[((1,), {})]])
+        with self.assertRaises(ValueError):
+            BatchTestTaskProcessor('fail').delay().run()
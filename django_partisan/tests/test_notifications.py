@@ -0,0 +1,93 @@
+from threading import Timer
+from unittest import mock
+
+from django.db import Error, connection
+from django.test import TransactionTestCase
+
+from django_partisan.notifications import (
+    NotificationsListener,
+    notify,
+    get_channel_name,
+)
+from django_partisan.settings import get_queue_settings
+from django_partisan.tests.fixtures import TestTaskProcessor
+
+settings = get_queue_settings()
+
+
+def notify_from_thread(queue_name):
+    try:
+        notify(queue_name)
+    finally:
+        connection.close()
+
+
+class TestNotifications(TransactionTestCase):
+    def setUp(self) -> None:
+        self.listener = NotificationsListener('default')
+        self.listener.listen()
+
+    def tearDown(self) -> None:
+        self.listener.close()
+
+    def test_channel_name(self):
+        self.assertEqual(get_channel_name('default'), 'partisan_default')
+
+    def test_wait_timeout(self):
+        self.assertFalse(self.listener.wait(0.01))
+
+    def test_wait_notified(self):
+        notify('default')
+        self.assertTrue(self.listener.wait(1))
+        self.assertFalse(self.listener.wait(0.01))
+
+    def test_wait_notified_while_waiting(self):
+        timer = Timer(0.05, notify_from_thread, args=('default',))
+        timer.start()
+        self.assertTrue(self.listener.wait(5))
+        timer.join()
+
+    def test_close_twice(self):
+        self.listener.close()
+        self.listener.close()
+        self.assertIsNone(self.listener.connection)
+
+    def test_other_queue_not_notified(self):
+        notify('another_queue')
+        self.assertFalse(self.listener.wait(0.01))
+
+    def test_several_queues(self):
+        listener = NotificationsListener('default', 'another_queue')
+        listener.listen()
+        try:
+            notify('another_queue')
+            self.assertTrue(listener.wait(1))
+            notify('default')
+            self.assertTrue(listener.wait(1))
+        finally:
+            listener.close()
+
+    def test_delay_notifies(self):
+        with mock.patch.object(settings, 'USE_LISTEN_NOTIFY', True):
+            TestTaskProcessor(1).delay()
+        self.assertTrue(self.listener.wait(1))
+
+    def test_delay_many_notifies(self):
+        with mock.patch.object(settings, 'USE_LISTEN_NOTIFY', True):
+            TestTaskProcessor.delay_many([((1,), {}), ((2,), {})])
+        self.assertTrue(self.listener.wait(1))
+
+    def test_delay_not_notifies_if_disabled(self):
+        TestTaskProcessor(1).delay()
+        self.assertFalse(self.listener.wait(0.01))
+
+    def test_listen_is_idempotent(self):
+        connection = self.listener.connection
+        self.assertIs(self.listener.listen(), connection)
+
+    def test_connection_error_closes_listener(self):
+        self.listener.connection.close()
+        with self.assertRaises(Error):
+            self.listener.wait(0.01)
+        self.assertIsNone(self.listener.connection)
+        self.assertFalse(self.listener.wait(0.01))
@@ -0,0 +1,180 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from django_partisan import partitioning
+from django_partisan.models import Task
+from django_partisan.settings import get_queue_settings
+from django_partisan.tests.fixtures import TestTaskProcessor
+
+
+class UniqueTestTaskProcessor(TestTaskProcessor):
+    UNIQUE_FOR_PARAMS = True
+
+
+def get_partition_of(task: Task) -> str:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT tableoid::regclass::text FROM "{partitioning.TABLE_NAME}" '
+            f'WHERE "id" = %s',
+            [task.pk],
+        )
+        return cursor.fetchone()[0]
+
+
+class TestPartitioning(TestCase):
+    command_name = 'partition_partisan'
+
+    def setUp(self):
+        self.settings = get_queue_settings()
+        self.old_task = TestTaskProcessor(1).delay()
+        Task.objects.filter(pk=self.old_task.pk).update(
+            status=Task.STATUS_FINISHED, updated_at=timezone.now() - timedelta(days=10)
+        )
+        self.new_task = TestTaskProcessor(2).delay()
+
+    def call_command(self, *args):
+        stdout = StringIO()
+        call_command(self.command_name, *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_convert(self):
+        output = self.call_command('--convert', '--days_ahead=2')
+        self.assertTrue(partitioning.is_partitioned())
+        today_partition = partitioning.get_daily_partition_name(timezone.now().date())
+        self.assertIn('Tasks table is converted to partitioned', output)
+        self.assertIn(f'Created partition "{today_partition}"', output)
+        self.assertIn('Partitions are not dropped', output)
+        self.assertEqual(len(partitioning.get_daily_partitions()), 3)
+        self.assertEqual(
+            get_partition_of(self.old_task), partitioning.PAST_DONE_PARTITION_NAME
+        )
+        self.assertEqual(
+            get_partition_of(self.new_task), partitioning.ACTIVE_PARTITION_NAME
+        )
+
+        self.assertIsNotNone(UniqueTestTaskProcessor(1).delay())
+        UniqueTestTaskProcessor(1).delay()
+        self.assertEqual(
+            Task.objects.filter(processor_class='UniqueTestTaskProcessor').count(), 1
+        )
+        tasks = Task.objects.select_for_process()
+        self.assertEqual(len(tasks), 2)
+        for task in tasks:
+            task.complete()
+        self.assertEqual(get_partition_of(self.new_task), today_partition)
+        self.assertGreater(TestTaskProcessor(3).delay().pk, self.new_task.pk)
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, partitioning.ACTIVE_PARTITION_NAME
+            )
+        self.assertTrue(
+            constraints[f'{partitioning.ACTIVE_PARTITION_NAME}_id_key']['unique']
+        )
+
+    def test_old_postgres(self):
+        with patch.object(connection, 'pg_version', 130000):
+            with self.assertRaisesMessage(CommandError, 'PostgreSQL 14'):
+                self.call_command('--convert')
+        self.assertFalse(partitioning.is_partitioned())
+
+    def test_convert_twice(self):
+        self.call_command('--convert')
+        with self.assertRaises(CommandError):
+            self.call_command('--convert')
+
+    def test_maintain_not_partitioned(self):
+        with self.assertRaises(CommandError):
+            self.call_command()
+
+    def test_revert(self):
+        self.call_command('--convert')
+        output = self.call_command('--revert')
+        self.assertIn('Tasks table is converted to not partitioned', output)
+        self.assertFalse(partitioning.is_partitioned())
+        self.assertEqual(Task.objects.count(), 2)
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, partitioning.TABLE_NAME
+            )
+        self.assertTrue(constraints[f'{partitioning.TABLE_NAME}_pkey']['primary_key'])
+        self.assertIn(f'{partitioning.TABLE_NAME}_unique_key_idx', constraints)
+        self.assertIn(f'{partitioning.TABLE_NAME}_prune_idx', constraints)
+        with self.assertRaises(CommandError):
+            self.call_command('--revert')
+
+    def test_create_partitions_moves_tasks_from_future(self):
+        partitioning.convert_to_partitioned(days_ahead=0)
+        tomorrow = timezone.now() + timedelta(days=1)
+        Task.objects.filter(pk=self.new_task.pk).update(
+            status=Task.STATUS_FINISHED, updated_at=tomorrow
+        )
+        self.assertEqual(
+            get_partition_of(self.new_task), partitioning.FUTURE_DONE_PARTITION_NAME
+        )
+        output = self.call_command('--days_ahead=1')
+        tomorrow_partition = partitioning.get_daily_partition_name(tomorrow.date())
+        self.assertEqual(output.count('Created partition'), 1)
+        self.assertEqual(get_partition_of(self.new_task), tomorrow_partition)
+
+    def test_drop_partitions_with_archive(self):
+        partitioning.convert_to_partitioned(days_ahead=0)
+        with patch.object(self.settings, 'FINISHED_TASKS_RETENTION_SECONDS', 86400):
+            with patch.object(self.settings, 'ERROR_TASKS_RETENTION_SECONDS', 3600):
+                with patch.object(self.settings, 'ARCHIVE_PRUNED_TASKS', True):
+                    output = self.call_command('--days_ahead=0')
+        self.assertIn('Partitions are not dropped', output)
+        self.assertEqual(
+            get_partition_of(self.old_task), partitioning.PAST_DONE_PARTITION_NAME
+        )
+
+
+class TestDropPartitions(TransactionTestCase):
+    """Partitions are detached concurrently, what can't be done in transaction"""
+
+    def setUp(self):
+        self.settings = get_queue_settings()
+        self.old_task = TestTaskProcessor(1).delay()
+        Task.objects.filter(pk=self.old_task.pk).update(
+            status=Task.STATUS_FINISHED, updated_at=timezone.now() - timedelta(days=10)
+        )
+        self.new_task = TestTaskProcessor(2).delay()
+
+    def tearDown(self):
+        if partitioning.is_partitioned():
+            partitioning.convert_to_plain()
+
+    def test_drop_partitions(self):
+        with patch('django_partisan.partitioning.timezone') as timezone_mock:
+            timezone_mock.now.return_value = timezone.now() - timedelta(days=10)
+            partitioning.convert_to_partitioned(days_ahead=1)
+        self.old_task.refresh_from_db()
+        self.assertEqual(
+            get_partition_of(self.old_task),
+            partitioning.get_daily_partition_name(self.old_task.updated_at.date()),
+        )
+        with patch.object(self.settings, 'FINISHED_TASKS_RETENTION_SECONDS', 86400):
+            with patch.object(self.settings, 'ERROR_TASKS_RETENTION_SECONDS', 3600):
+                output = StringIO()
+                call_command('partition_partisan', '--days_ahead=0', stdout=output)
+        output = output.getvalue()
+        self.assertEqual(output.count('Created partition'), 9)
+        self.assertEqual(output.count('Dropped partition'), 10)
+        self.assertIn(
+            f'Dropped partition "{partitioning.PAST_DONE_PARTITION_NAME}"', output
+        )
+        self.assertFalse(Task.objects.filter(pk=self.old_task.pk).exists())
+        self.assertTrue(Task.objects.filter(pk=self.new_task.pk).exists())
+        self.assertEqual(len(partitioning.get_daily_partitions()), 2)
+        TestTaskProcessor(3).delay()
+        task = Task.objects.select_for_process()[0]
+        task.complete()
+        self.assertEqual(
+            get_partition_of(task),
+            partitioning.get_daily_partition_name(timezone.now().date()),
+        )
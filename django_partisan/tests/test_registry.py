@@ -1,3 +1,5 @@
+from unittest.mock import patch
+
 from django.test import TestCase
 
 from django_partisan.registry import registry
@@ -43,7 +45,119 @@ class TestTaskProcessor(TestCase):
         with self.assertRaises(ProcessorClassAlreadyRegistered):
             local_registry.register_processor_class(RegisteredSimpleTaskProcessor)
 
+    def test_get_registered_processor_class_by_name(self):
+        self.assertEqual(
+            registry.registry.get_processor_class_by_name(
+                'RegisteredSimpleTaskProcessor'
+            ),
+            RegisteredSimpleTaskProcessor,
+        )
+
     def test_processor_is_not_registered(self):
         local_registry = registry.Registry()
         with self.assertRaises(ProcessorClassNotFound):
             local_registry.get_processor_class_by_name('NotRegisteredTaskProcessor')
+
+
+class DeepSimpleTaskProcessor(NotRegisteredSimpleTaskProcessor):
+    pass
+
+
+class OtherDeepSimpleTaskProcessor(NotRegisteredSimpleTaskProcessor):
+    pass
+
+
+class DiamondSimpleTaskProcessor(DeepSimpleTaskProcessor, OtherDeepSimpleTaskProcessor):
+    pass
+
+
+class QualifiedSimpleTaskProcessor(BaseTaskProcessor):
+    USE_QUALIFIED_NAME = True
+
+    def run(self):
+        return self.args[0]
+
+
+class TestProcessorsIndex(TestCase):
+    def test_deep_subclass(self):
+        self.assertEqual(
+            BaseTaskProcessor.get_processor_class('DiamondSimpleTaskProcessor'),
+            DiamondSimpleTaskProcessor,
+        )
+
+    def test_qualified_name(self):
+        task = QualifiedSimpleTaskProcessor(5).delay()
+        self.assertEqual(
+            task.processor_class,
+            'django_partisan.tests.test_registry.QualifiedSimpleTaskProcessor',
+        )
+        self.assertEqual(Task.objects.get(pk=task.pk).run(), 5)
+        self.assertEqual(
+            BaseTaskProcessor.get_processor_class('QualifiedSimpleTaskProcessor'),
+            QualifiedSimpleTaskProcessor,
+        )
+
+    def test_same_names(self):
+        class DeepSimpleTaskProcessor(BaseTaskProcessor):
+            def run(self):
+                pass
+
+        self.assertEqual(
+            BaseTaskProcessor.get_processor_class(
+                'django_partisan.tests.test_registry.TestProcessorsIndex.'
+                'test_same_names.<locals>.DeepSimpleTaskProcessor'
+            ),
+            DeepSimpleTaskProcessor,
+        )
+        self.assertEqual(
+            BaseTaskProcessor.get_processor_class(
+                'django_partisan.tests.test_registry.DeepSimpleTaskProcessor'
+            ),
+            globals()['DeepSimpleTaskProcessor'],
+        )
+
+    def test_get_processor_classes(self):
+        processor_classes = registry.Registry().get_processor_classes(
+            NotRegisteredSimpleTaskProcessor
+        )
+        self.assertEqual(
+            processor_classes,
+            [
+                DeepSimpleTaskProcessor,
+                OtherDeepSimpleTaskProcessor,
+                DiamondSimpleTaskProcessor,
+            ],
+        )
+
+    def test_registered_processor_wins(self):
+        local_registry = registry.Registry()
+        local_registry.register_processor_class(DeepSimpleTaskProcessor)
+        self.assertEqual(
+            local_registry.find_processor_class(
+                'DeepSimpleTaskProcessor', OtherDeepSimpleTaskProcessor
+            ),
+            DeepSimpleTaskProcessor,
+        )
+
+    def test_index_cached(self):
+        local_registry = registry.Registry()
+        with patch.object(
+            local_registry, 'build_index', wraps=local_registry.build_index
+        ) as build_index_mock:
+            local_registry.find_processor_class('TestTaskProcessor', BaseTaskProcessor)
+            local_registry.find_processor_class('TestTaskProcessor', BaseTaskProcessor)
+            self.assertEqual(build_index_mock.call_count, 1)
+            local_registry.register_processor_class(RegisteredSimpleTaskProcessor)
+            local_registry.find_processor_class('TestTaskProcessor', BaseTaskProcessor)
+            self.assertEqual(build_index_mock.call_count, 2)
+
+    def test_index_invalidated_by_new_subclass(self):
+        BaseTaskProcessor.get_processor_class('DeepSimpleTaskProcessor')
+
+        class NewSimpleTaskProcessor(DeepSimpleTaskProcessor):
+            pass
+
+        self.assertEqual(
+            BaseTaskProcessor.get_processor_class('NewSimpleTaskProcessor'),
+            NewSimpleTaskProcessor,
+        )
@@ -26,6 +26,14 @@ class TestQueueSettings(TestCase):
         with self.assertRaises(ValueError):
             QueueSettings(**invalid_settings)
 
+    def test_invalid_worker_threads_count(self):
+        with self.assertRaises(ValueError):
+            QueueSettings(**{**self.valid_settings, 'WORKER_THREADS_COUNT': 0})
+
+    def test_invalid_async_tasks_per_worker(self):
+        with self.assertRaises(ValueError):
+            QueueSettings(**{**self.valid_settings, 'ASYNC_TASKS_PER_WORKER': 0})
+
     def test_get_queue_settings(self):
         self.assertIsNotNone(get_queue_settings())
 
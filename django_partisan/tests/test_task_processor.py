@@ -1,11 +1,15 @@
 from datetime import timedelta
+from unittest.mock import patch
 
 from django.test import TestCase
 from django.utils import timezone
 
-from django_partisan.exceptions import ProcessorClassNotFound
-from django_partisan.models import Task
+from django_partisan.config.processor_configs import RateLimitConfig
+from django_partisan.exceptions import ProcessorClassNotFound, UniqueTaskConflict
+from django_partisan.models import Task, ClaimLimits, TasksManager
 from django_partisan.processor import BaseTaskProcessor
+from django_partisan.settings import get_queue_settings
+from django_partisan.tests.fixtures import BatchTestTaskProcessor
 
 
 class SimpleTaskProcessor(BaseTaskProcessor):
@@ -59,6 +63,152 @@ class TestTaskProcessor(TestCase):
         SimpleUniqueTaskProcessor(1).delay()
         self.assertEqual(Task.objects.count(), 1)
 
+    def test_delay_many(self):
+        tasks = SimpleTaskProcessor.delay_many(
+            [((i,), {'key': i}) for i in range(5)], chunk_size=2
+        )
+        self.assertEqual(len(tasks), 5)
+        self.assertEqual(Task.objects.count(), 5)
+        db_task = Task.objects.get(pk=tasks[3].pk)
+        self.assertEqual(db_task.processor_class, 'SimpleTaskProcessor')
+        self.assertEqual(db_task.status, Task.STATUS_NEW)
+        self.assertEqual(db_task.arguments, {'args': [3], 'kwargs': {'key': 3}})
+        self.assertEqual(db_task.priority, SimpleTaskProcessor.PRIORITY)
+
+    def test_delay_many_priority_and_execute_after(self):
+        execute_after = timezone.now() + timedelta(minutes=5)
+        SimpleHighPriorityTaskProcessor.delay_many([((1,), {})])
+        SimpleTaskProcessor.delay_many(
+            [((1,), {})], priority=1000, execute_after=execute_after
+        )
+        high_priority_task: Task = Task.objects.first()
+        self.assertEqual(high_priority_task.priority, 1000)
+        self.assertEqual(high_priority_task.execute_after, execute_after)
+        self.assertEqual(Task.objects.last().priority, 100)
+
+    def test_delay_many_unique(self):
+        SimpleUniqueTaskProcessor(1).delay()
+        with self.assertNumQueries(4):
+            tasks = SimpleUniqueTaskProcessor.delay_many(
+                [((i,), {}) for i in [1, 2, 2, 3, 4]], chunk_size=3
+            )
+        self.assertEqual(len(tasks), 3)
+        self.assertEqual(Task.objects.count(), 4)
+        SimpleUniqueTaskProcessor(2).delay()
+        self.assertEqual(Task.objects.count(), 4)
+
+    def test_delay_many_unique_delayed_concurrently(self):
+        bulk_create_unique = TasksManager.bulk_create_unique
+
+        def delay_concurrently(manager, tasks):
+            arguments = {'args': [2], 'kwargs': {}}
+            Task.objects.create(
+                processor_class='SimpleUniqueTaskProcessor',
+                arguments=arguments,
+                unique_key=Task.get_unique_key('SimpleUniqueTaskProcessor', arguments),
+            )
+            return bulk_create_unique(manager, tasks)
+
+        with patch.object(
+            TasksManager,
+            'bulk_create_unique',
+            autospec=True,
+            side_effect=delay_concurrently,
+        ):
+            tasks = SimpleUniqueTaskProcessor.delay_many([((i,), {}) for i in [1, 2]])
+        self.assertEqual([task.arguments['args'] for task in tasks], [[1]])
+        self.assertEqual(Task.objects.count(), 2)
+
+    def test_delay_to_processor_queue(self):
+        config = {'another_queue': get_queue_settings()}
+        with patch.dict('django_partisan.settings.PARTISAN_CONFIG', config):
+            with patch.object(SimpleTaskProcessor, 'QUEUE', 'another_queue'):
+                task = SimpleTaskProcessor(1).delay()
+                tasks = SimpleTaskProcessor.delay_many([((2,), {})])
+        self.assertEqual(task.queue_name, 'another_queue')
+        self.assertEqual(tasks[0].queue_name, 'another_queue')
+
+    def test_delay_many_empty(self):
+        self.assertEqual(SimpleTaskProcessor.delay_many([]), [])
+
+    def test_delay_many_bad_chunk_size(self):
+        with self.assertRaises(ValueError):
+            SimpleTaskProcessor.delay_many([((1,), {})], chunk_size=0)
+
+    def test_unique_task_returns_existing(self):
+        task = SimpleUniqueTaskProcessor(1, key='value').delay()
+        with self.assertNumQueries(4):
+            same_task = SimpleUniqueTaskProcessor(1, key='value').delay()
+        self.assertEqual(same_task.pk, task.pk)
+        self.assertEqual(task.unique_key, same_task.unique_key)
+
+    def test_unique_task_creating_single_insert(self):
+        with self.assertNumQueries(3):
+            task = SimpleUniqueTaskProcessor(1).delay()
+        self.assertIsNotNone(task.pk)
+        self.assertEqual(Task.objects.get(pk=task.pk).unique_key, task.unique_key)
+
+    def test_unique_task_creating_after_claim(self):
+        SimpleUniqueTaskProcessor(1).delay()
+        claimed_task = Task.objects.select_for_process()[0]
+        self.assertIsNone(claimed_task.unique_key)
+        pending_task = SimpleUniqueTaskProcessor(1).delay()
+        self.assertEqual(Task.objects.count(), 2)
+        SimpleUniqueTaskProcessor.get_initialized_processor(
+            claimed_task
+        ).delay_for_retry()
+        self.assertEqual(
+            list(Task.objects.values_list('pk', flat=True)), [pending_task.pk]
+        )
+
+    def test_unique_task_existing_claimed_meanwhile(self):
+        task = SimpleTaskProcessor(1).delay()
+        with patch.object(Task.objects, 'create_unique', side_effect=[None, task]):
+            self.assertEqual(SimpleUniqueTaskProcessor(1).delay(), task)
+
+    def test_unique_task_conflict(self):
+        with patch.object(
+            Task.objects, 'create_unique', return_value=None
+        ) as create_unique_mock:
+            with self.assertRaises(UniqueTaskConflict):
+                SimpleUniqueTaskProcessor(1).delay()
+        self.assertEqual(create_unique_mock.call_count, 2)
+
+    def test_unique_task_delayed_after_retry(self):
+        SimpleUniqueTaskProcessor(1).delay()
+        claimed_task = Task.objects.select_for_process()[0]
+        SimpleUniqueTaskProcessor.get_initialized_processor(
+            claimed_task
+        ).delay_for_retry()
+        self.assertEqual(SimpleUniqueTaskProcessor(1).delay().pk, claimed_task.pk)
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_not_unique_task_has_no_unique_key(self):
+        self.assertIsNone(SimpleTaskProcessor(1).delay().unique_key)
+
+    def test_unique_key_is_canonical(self):
+        self.assertEqual(
+            Task.get_unique_key('Processor', {'args': [1], 'kwargs': {'a': 1, 'b': 2}}),
+            Task.get_unique_key(
+                'Processor', {'kwargs': {'b': 2, 'a': 1}, 'args': (1,)}
+            ),
+        )
+        self.assertNotEqual(
+            Task.get_unique_key('Processor', {'args': [1], 'kwargs': {}}),
+            Task.get_unique_key('AnotherProcessor', {'args': [1], 'kwargs': {}}),
+        )
+
+    def test_create_unique_conflict(self):
+        task_data = {
+            'processor_class': 'SimpleUniqueTaskProcessor',
+            'arguments': {'args': [1], 'kwargs': {}},
+            'unique_key': 'key',
+        }
+        self.assertIsNotNone(Task.objects.create_unique(**task_data))
+        self.assertIsNone(Task.objects.create_unique(**task_data))
+        self.assertEqual(Task.objects.count(), 1)
+        self.assertEqual(Task.objects.bulk_create_unique([]), [])
+
     def test_getting_processor_class(self):
         SimpleTaskProcessor(1).delay()
         task_obj: Task = Task.objects.first()
@@ -67,6 +217,46 @@ class TestTaskProcessor(TestCase):
             SimpleTaskProcessor,
         )
 
+    def test_get_claim_limits(self):
+        rate_limit = RateLimitConfig(max_tasks=5)
+        self.assertEqual(BaseTaskProcessor.get_claim_limits(), {})
+        with patch.object(SimpleTaskProcessorWithConfig, 'RATE_LIMIT', rate_limit):
+            self.assertEqual(
+                BaseTaskProcessor.get_claim_limits(),
+                {'SimpleTaskProcessorWithConfig': ClaimLimits(rate_limit, None)},
+            )
+            with patch.object(SimpleTaskProcessor, 'MAX_CONCURRENCY', 2):
+                self.assertEqual(
+                    BaseTaskProcessor.get_claim_limits()['SimpleTaskProcessor'],
+                    ClaimLimits(None, 2),
+                )
+            with patch.object(
+                SimpleTaskProcessorWithConfig, 'USE_QUALIFIED_NAME', True
+            ):
+                self.assertEqual(
+                    list(BaseTaskProcessor.get_claim_limits()),
+                    [
+                        'django_partisan.tests.test_task_processor.'
+                        'SimpleTaskProcessorWithConfig'
+                    ],
+                )
+
+    def test_get_batch_sizes(self):
+        batch_sizes = BaseTaskProcessor.get_batch_sizes()
+        self.assertEqual(batch_sizes['BatchTestTaskProcessor'], 100)
+        self.assertNotIn('SimpleTaskProcessor', batch_sizes)
+        with patch.object(BatchTestTaskProcessor, 'BATCH_SIZE', 2):
+            self.assertEqual(
+                BaseTaskProcessor.get_batch_sizes()['BatchTestTaskProcessor'], 2
+            )
+
+    def test_batch_processor_runs_single_task(self):
+        BatchTestTaskProcessor.batches = []
+        BatchTestTaskProcessor('ok', flag=True).run()
+        self.assertEqual(BatchTestTaskProcessor.batches, [[(('ok',), {'flag': True})]])
+        with self.assertRaises(ValueError):
+            BatchTestTaskProcessor('fail').run()
+
     def test_priority(self):
         SimpleTaskProcessor(1).delay()
         SimpleHighPriorityTaskProcessor(10).delay()
@@ -1,9 +1,19 @@
 import logging
+import time
+from queue import Empty
+from threading import Barrier, Lock, get_ident
 from unittest.mock import patch, call, Mock, MagicMock
 
 from django.test import TestCase
+from django.utils import timezone
 
-from django_partisan.worker import Worker
+from django_partisan.models import Task, TaskMessage, TaskTiming
+from django_partisan.settings import get_queue_settings
+from django_partisan.worker import Worker, RUNNING_TASKS_CHECK_TIMEOUT
+
+
+def get_task_mock(**kwargs):
+    return MagicMock(queue_name='default', settings=get_queue_settings(), **kwargs)
 
 
 class TestBackgroundWorker(TestCase):
@@ -21,11 +31,14 @@ class TestBackgroundWorker(TestCase):
         with patch.object(self.logger, 'info') as logger_info_mock:
             Worker(queue).run()
             logger_info_mock.assert_has_calls(
-                [call('Worker started'), call('Worker stopped'),]
+                [
+                    call('Worker started'),
+                    call('Worker stopped'),
+                ]
             )
 
     def test_bad_task(self):
-        task_mock = MagicMock(**{'run.side_effect': ValueError})
+        task_mock = get_task_mock(**{'run.side_effect': ValueError})
         queue = Mock()
         queue.get.return_value = task_mock
         with patch.object(self.logger, 'exception') as logger_mock:
@@ -34,8 +47,210 @@ class TestBackgroundWorker(TestCase):
         task_mock.run.assert_called()
         task_mock.fail.assert_called()
 
+    @patch('django_partisan.worker.Task')
+    def test_task_message(self, task_class_mock):
+        message = TaskMessage(1, 'TestTaskProcessor', {}, {}, 'default')
+        task_class_mock.from_message.return_value = get_task_mock()
+        queue = Mock()
+        queue.get.side_effect = [message, None]
+        Worker(queue).run()
+        task_class_mock.from_message.assert_called_once_with(message)
+        task_class_mock.from_message.return_value.run.assert_called_once()
+        task_class_mock.from_message.return_value.complete.assert_called_once()
+
+    @patch('django_partisan.worker.Task')
+    def test_batched_complete(self, task_class_mock):
+        tasks = [get_task_mock(pk=i) for i in range(5)]
+        queue = Mock()
+        queue.get.side_effect = [*tasks, None]
+        worker = Worker(queue)
+        with patch.object(worker.settings, 'COMPLETE_BATCH_SIZE', 2):
+            worker.run()
+        for task in tasks:
+            task.complete.assert_not_called()
+        task_class_mock.objects.complete_tasks.assert_has_calls(
+            [
+                call([0, 1], delete=False, timings=None),
+                call([2, 3], delete=False, timings=None),
+                call([4], delete=False, timings=None),
+            ]
+        )
+
+    @patch('django_partisan.worker.Task')
+    def test_batched_complete_on_timeout(self, task_class_mock):
+        queue = Mock()
+        queue.get.side_effect = [get_task_mock(pk=1), Empty, None]
+        worker = Worker(queue)
+        with patch.object(worker.settings, 'COMPLETE_BATCH_SIZE', 10):
+            worker.run()
+        task_class_mock.objects.complete_tasks.assert_called_once_with(
+            [1], delete=False, timings=None
+        )
+        self.assertEqual(queue.get.call_args_list[0], call(timeout=5))
+        self.assertLessEqual(queue.get.call_args_list[1][1]['timeout'], 1)
+
+    @patch('django_partisan.worker.Task')
+    def test_batched_complete_on_death(self, task_class_mock):
+        queue = Mock()
+        queue.get.side_effect = [get_task_mock(pk=1), get_task_mock(pk=2)]
+        worker = Worker(queue, tasks_before_death=2)
+        with patch.object(worker.settings, 'COMPLETE_BATCH_SIZE', 10):
+            worker.run()
+        task_class_mock.objects.complete_tasks.assert_called_once_with(
+            [1, 2], delete=False, timings=None
+        )
+
+    @patch('django_partisan.worker.Task')
+    def test_batched_complete_on_crash(self, task_class_mock):
+        failing_task = get_task_mock(pk=2, **{'run.side_effect': ValueError})
+        queue = Mock()
+        queue.get.side_effect = [get_task_mock(pk=1), failing_task]
+        worker = Worker(queue)
+        with patch.object(worker.settings, 'COMPLETE_BATCH_SIZE', 10):
+            worker.run()
+        failing_task.fail.assert_called_once()
+        task_class_mock.objects.complete_tasks.assert_called_once_with(
+            [1], delete=False, timings=None
+        )
+
+    @patch('django_partisan.worker.Task')
+    def test_batched_complete_with_timings(self, task_class_mock):
+        timing = TaskTiming(timezone.now(), 10)
+        tasks = [
+            get_task_mock(pk=1, **{'get_timing.return_value': timing}),
+            get_task_mock(pk=2, **{'get_timing.return_value': None}),
+        ]
+        queue = Mock()
+        queue.get.side_effect = [*tasks, None]
+        worker = Worker(queue)
+        with patch.object(worker.settings, 'COMPLETE_BATCH_SIZE', 10):
+            with patch.object(worker.settings, 'TRACK_TASK_TIMING', True):
+                worker.run()
+        task_class_mock.objects.complete_tasks.assert_called_once_with(
+            [1, 2], delete=False, timings={1: timing}
+        )
+        self.assertEqual(worker.completed_tasks_timings, {})
+
+    @patch('django_partisan.worker.Task')
+    def test_batched_complete_error(self, task_class_mock):
+        task_class_mock.objects.complete_tasks.side_effect = ValueError
+        queue = Mock()
+        queue.get.side_effect = [get_task_mock(pk=1), None]
+        worker = Worker(queue)
+        with patch.object(worker.settings, 'COMPLETE_BATCH_SIZE', 10):
+            with patch.object(self.logger, 'exception') as logger_mock:
+                with patch.object(self.logger, 'error') as error_logger_mock:
+                    worker.run()
+        logger_mock.assert_called_once_with(
+            'Got exception while completing %d tasks', 1
+        )
+        error_logger_mock.assert_called_once_with(
+            'Exiting with %d not completed tasks', 1
+        )
+        self.assertEqual(worker.completed_tasks_ids, {'default': [1]})
+
+    @patch('django_partisan.worker.Task')
+    def test_batched_complete_error_retried(self, task_class_mock):
+        task_class_mock.objects.complete_tasks.side_effect = [ValueError, None]
+        queue = Mock()
+        queue.get.side_effect = [get_task_mock(pk=1), Empty, get_task_mock(pk=2), None]
+        worker = Worker(queue)
+        with patch.object(worker.settings, 'COMPLETE_BATCH_SIZE', 10):
+            with patch.object(self.logger, 'exception'):
+                with patch.object(self.logger, 'error') as logger_mock:
+                    worker.run()
+        self.assertEqual(task_class_mock.objects.complete_tasks.call_count, 2)
+        task_class_mock.objects.complete_tasks.assert_called_with(
+            [1, 2], delete=False, timings=None
+        )
+        logger_mock.assert_not_called()
+        self.assertEqual(worker.completed_tasks_ids, {})
+
+    def test_tasks_reported_to_manager(self):
+        events_queue = Mock()
+        tasks = [
+            get_task_mock(pk=1),
+            get_task_mock(pk=2, **{'run.side_effect': ValueError}),
+        ]
+        queue = Mock()
+        queue.get.side_effect = tasks
+        with patch('django_partisan.worker.os.getpid', return_value=10):
+            Worker(queue, events_queue=events_queue).run()
+        events_queue.put.assert_has_calls(
+            [
+                call(('taken', 10, [1])),
+                call(('done', 10, [1])),
+                call(('taken', 10, [2])),
+                call(('done', 10, [2])),
+            ]
+        )
+
+    @patch('django_partisan.worker.Task')
+    def test_batched_complete_reported_on_flush(self, task_class_mock):
+        events_queue = Mock()
+        queue = Mock()
+        queue.get.side_effect = [get_task_mock(pk=1), get_task_mock(pk=2), None]
+        worker = Worker(queue, events_queue=events_queue)
+        with patch.object(worker.settings, 'COMPLETE_BATCH_SIZE', 10):
+            with patch('django_partisan.worker.os.getpid', return_value=10):
+                worker.run()
+        self.assertEqual(
+            events_queue.put.call_args_list[-1], call(('done', 10, [1, 2]))
+        )
+        self.assertEqual(events_queue.put.call_count, 4)
+
+    def test_stop_reported_to_manager(self):
+        events_queue = Mock()
+        queue = Mock()
+        queue.get.return_value = None
+        with patch('django_partisan.worker.os.getpid', return_value=10):
+            Worker(queue, events_queue=events_queue).run()
+        events_queue.put.assert_called_once_with(('stopped', 10, []))
+
+    def test_rescheduled_task_not_completed(self):
+        task_mock = get_task_mock(status=Task.STATUS_NEW)
+        queue = Mock()
+        queue.get.side_effect = [task_mock, None]
+        worker = Worker(queue)
+        worker.run()
+        task_mock.run.assert_called_once()
+        task_mock.complete.assert_not_called()
+
+    @patch('django_partisan.worker.Task')
+    def test_batch(self, task_class_mock):
+        message = TaskMessage(1, 'BatchTestTaskProcessor', {}, {}, 'default')
+        task_class_mock.from_message.return_value = get_task_mock(pk=1)
+        tasks = [get_task_mock(pk=2), get_task_mock(pk=3)]
+        task_class_mock.run_batch.return_value = [None, None, None]
+        queue = Mock()
+        queue.get.side_effect = [[message, *tasks], None]
+        worker = Worker(queue)
+        worker.run()
+        task_class_mock.run_batch.assert_called_once_with(
+            [task_class_mock.from_message.return_value, *tasks]
+        )
+        task_class_mock.from_message.return_value.complete.assert_called_once()
+        for task in tasks:
+            task.complete.assert_called_once()
+        self.assertEqual(worker.tasks_processed, 3)
+
+    @patch('django_partisan.worker.Task')
+    def test_batch_with_failed_task(self, task_class_mock):
+        tasks = [get_task_mock(pk=1), get_task_mock(pk=2), get_task_mock(pk=3)]
+        error = ValueError()
+        task_class_mock.run_batch.return_value = [None, error, None]
+        queue = Mock()
+        queue.get.side_effect = [tasks, None]
+        with patch.object(self.logger, 'exception') as logger_mock:
+            Worker(queue).run()
+            logger_mock.assert_called_once_with('Got exception, exiting')
+        tasks[0].complete.assert_called_once()
+        tasks[1].fail.assert_called_once_with(error)
+        tasks[1].complete.assert_not_called()
+        tasks[2].complete.assert_called_once()
+
     def test_selfkill(self):
-        task_mock = MagicMock()
+        task_mock = get_task_mock()
         queue = Mock()
         queue.get.return_value = task_mock
         with patch.object(self.logger, 'info') as logger_mock:
@@ -44,3 +259,156 @@ class TestBackgroundWorker(TestCase):
                 [call('Processed %d of %d tasks. Exiting', 5, 5)]
             )
         self.assertEqual(queue.get.call_count, 5)
+
+
+@patch.object(get_queue_settings(), 'WORKER_THREADS_COUNT', 2)
+class TestThreadedWorker(TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger('django_partisan.worker')
+
+    def test_tasks_processed(self):
+        tasks = [get_task_mock() for _ in range(4)]
+        queue = Mock()
+        queue.get.side_effect = [*tasks, None]
+        worker = Worker(queue)
+        worker.run()
+        for task in tasks:
+            task.run.assert_called_once()
+            task.complete.assert_called_once()
+        self.assertEqual(worker.tasks_processed, 4)
+
+    def test_tasks_run_at_once(self):
+        barrier = Barrier(2, timeout=5)
+        tasks = [get_task_mock(**{'run.side_effect': barrier.wait}) for _ in range(2)]
+        queue = Mock()
+        queue.get.side_effect = [*tasks, None]
+        worker = Worker(queue)
+        worker.run()
+        self.assertFalse(barrier.broken)
+        self.assertEqual(worker.tasks_processed, 2)
+
+    def test_waits_for_free_thread(self):
+        lock = Lock()
+        running = []
+        max_running = []
+
+        def run_task():
+            with lock:
+                running.append(1)
+                max_running.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.pop()
+
+        tasks = [get_task_mock(**{'run.side_effect': run_task}) for _ in range(5)]
+        queue = Mock()
+        queue.get.side_effect = [*tasks, None]
+        worker = Worker(queue)
+        worker.run()
+        self.assertEqual(max(max_running), 2)
+        self.assertEqual(worker.tasks_processed, 5)
+
+    def test_bad_task(self):
+        barrier = Barrier(2, timeout=5)
+
+        def fail_after_barrier():
+            barrier.wait()
+            raise ValueError()
+
+        bad_task = get_task_mock(**{'run.side_effect': fail_after_barrier})
+        good_task = get_task_mock(**{'run.side_effect': barrier.wait})
+        queue = Mock()
+        queue.get.side_effect = [bad_task, good_task, None]
+        with patch.object(self.logger, 'exception') as logger_mock:
+            Worker(queue).run()
+            logger_mock.assert_has_calls([call('Got exception, exiting')])
+        bad_task.fail.assert_called_once()
+        bad_task.complete.assert_not_called()
+        good_task.complete.assert_called_once()
+
+    @patch('django_partisan.worker.Task')
+    def test_batch(self, task_class_mock):
+        batch = [get_task_mock(), get_task_mock()]
+        error = ValueError()
+        task_class_mock.run_batch.return_value = [error, None]
+        queue = Mock()
+        queue.get.side_effect = [batch, None]
+        with patch.object(self.logger, 'exception') as logger_mock:
+            worker = Worker(queue)
+            worker.run()
+            logger_mock.assert_has_calls([call('Got exception, exiting')])
+        task_class_mock.run_batch.assert_called_once_with(batch)
+        batch[0].fail.assert_called_once_with(error)
+        batch[1].complete.assert_called_once()
+        self.assertEqual(worker.tasks_processed, 1)
+
+    def test_selfkill(self):
+        queue = Mock()
+        queue.get.side_effect = lambda timeout: get_task_mock()
+        with patch.object(self.logger, 'info') as logger_mock:
+            Worker(queue, tasks_before_death=5).run()
+            logger_mock.assert_has_calls(
+                [call('Processed %d of %d tasks. Exiting', 5, 5)]
+            )
+        self.assertEqual(queue.get.call_count, 5)
+
+    def test_empty_queue(self):
+        task = get_task_mock()
+        queue = Mock()
+        queue.get.side_effect = [task, Empty, None]
+        Worker(queue).run()
+        task.complete.assert_called_once()
+
+    @patch('django_partisan.worker.db')
+    def test_run_task_keeps_connections(self, db_mock):
+        connection = Mock(errors_occurred=False)
+        db_mock.connections.all.return_value = [connection]
+        task = get_task_mock(**{'run.return_value': 10})
+        worker = Worker(Mock())
+        self.assertEqual(worker.run_task(task), 10)
+        connection.close.assert_not_called()
+        self.assertEqual(list(worker.threads_connections.values()), [[connection]])
+
+    @patch('django_partisan.worker.db')
+    def test_run_task_closes_unusable_connections(self, db_mock):
+        broken_connection = Mock(
+            errors_occurred=True, **{'is_usable.return_value': False}
+        )
+        usable_connection = Mock(
+            errors_occurred=True, **{'is_usable.return_value': True}
+        )
+        db_mock.connections.all.return_value = [broken_connection, usable_connection]
+        Worker(Mock()).run_task(get_task_mock())
+        broken_connection.close.assert_called_once()
+        usable_connection.close.assert_not_called()
+        self.assertFalse(usable_connection.errors_occurred)
+
+    @patch('django_partisan.worker.db')
+    def test_threads_connections_closed_on_exit(self, db_mock):
+        threads_connections = {}
+
+        def get_thread_connections():
+            return [
+                threads_connections.setdefault(
+                    get_ident(), Mock(connection=None, errors_occurred=False)
+                )
+            ]
+
+        db_mock.connections.all.side_effect = get_thread_connections
+        queue = Mock()
+        queue.get.side_effect = [get_task_mock() for _ in range(4)] + [None]
+        worker = Worker(queue)
+        worker.run()
+        self.assertEqual(worker.tasks_processed, 4)
+        self.assertTrue(threads_connections)
+        for connection in threads_connections.values():
+            connection.close.assert_called_once()
+        self.assertEqual(worker.threads_connections, {})
+
+    def test_queue_timeout_with_running_tasks(self):
+        worker = Worker(Mock())
+        self.assertEqual(worker.get_queue_timeout(), 5)
+        self.assertEqual(
+            worker.get_queue_timeout(has_running_tasks=True),
+            RUNNING_TASKS_CHECK_TIMEOUT,
+        )
@@ -1,9 +1,13 @@
+import datetime
 from queue import Empty
 from unittest.mock import patch, Mock, MagicMock, call, ANY
 
 from django.db import DatabaseError
 from django.test import TestCase
+from django.utils import timezone
 
+from django_partisan.settings import get_queue_settings
+from django_partisan.tests.fixtures import BatchTestTaskProcessor
 from django_partisan.workers_manager import WorkersManager
 
 is_alive_return_value = 'is_alive.return_value'
@@ -38,11 +42,23 @@ class TestWorkersManager(TestCase):
         task_mock,
         logger_mock,
     ):
-        manage_queue_mock.side_effect = [DatabaseError, None]
-        manage_workers_mock.side_effect = ValueError
+        manage_queue_mock.side_effect = [DatabaseError, None, None]
+        manage_workers_mock.side_effect = [None, ValueError]
+        time_mock.monotonic.return_value = 0
         mp_mock.active_children.return_value = 10
         manager = WorkersManager()
-        manager.run_partisan()
+        manager.listener = Mock()
+        manager.metrics = Mock()
+        with patch.object(
+            manager, 'manage_leases', wraps=manager.manage_leases
+        ) as manage_leases_mock:
+            manager.run_partisan()
+        self.assertEqual(manager.listener.listen.call_count, 3)
+        self.assertEqual(manage_leases_mock.call_count, 3)
+        manager.listener.close.assert_called_once()
+        manager.metrics.start.assert_called_once()
+        manager.metrics.collect.assert_called()
+        manager.metrics.close.assert_called_once()
         logger_mock.exception.assert_has_calls(
             [call("Database error"), call("Unexpected error"),]
         )
@@ -58,7 +74,11 @@ class TestWorkersManager(TestCase):
         flush_queue_mock.assert_called_once()
         stop_workers_mock.assert_called_once()
         sys_mock.exit.assert_called_once()
-        task_mock.objects.reset_tasks_to_initial_status.assert_called_once()
+        task_mock.objects.reset_tasks_to_initial_status.assert_not_called()
+        task_mock.objects.requeue_expired_tasks.assert_called_once_with('default')
+        task_mock.objects.release_tasks.assert_called_once_with(
+            manager.owner, 'default'
+        )
 
     def test_bad_settings(
         self, worker_mock, mp_mock, db_mock, time_mock, task_mock, logger_mock
@@ -74,12 +94,29 @@ class TestWorkersManager(TestCase):
         manager.create_workers()
         self.assertEqual(worker_mock.call_count, test_workers_count)
 
+    @patch('django_partisan.workers_manager.AsyncWorker')
+    def test_create_async_workers(
+        self,
+        async_worker_mock,
+        worker_mock,
+        mp_mock,
+        db_mock,
+        time_mock,
+        task_mock,
+        logger_mock,
+    ):
+        manager = WorkersManager(workers_count=2)
+        with patch.object(manager.settings, 'ASYNC_TASKS_PER_WORKER', 10):
+            manager.create_workers()
+        self.assertEqual(async_worker_mock.call_count, 2)
+        worker_mock.assert_not_called()
+
     def test_manage_queue_queue_is_full(
         self, worker_mock, mp_mock, db_mock, time_mock, task_mock, logger_mock
     ):
         manager = WorkersManager(workers_count=4, min_queue_size=4)
         queue_mock = Mock()
-        queue_mock.qsize = MagicMock(return_value=5)
+        manager.queued_tasks_count = 5
         manager.queue = queue_mock
         manager.manage_queue()
         time_mock.sleep.assert_called_once_with(2)
@@ -89,16 +126,232 @@ class TestWorkersManager(TestCase):
     ):
         manager = WorkersManager(workers_count=4, min_queue_size=4, max_queue_size=8)
         queue_mock = Mock()
-        queue_mock.qsize = MagicMock(return_value=2)
+        manager.queued_tasks_count = 2
         task_mock.objects.select_for_process = MagicMock(
-            return_value=[1, 2, 3, 4, 5, 6]
+            return_value=[Mock() for _ in range(6)]
         )
         manager.queue = queue_mock
         manager.manage_queue()
-        task_mock.objects.select_for_process.assert_called_with(6, 'default')
+        task_mock.objects.select_for_process.assert_called_with(
+            6, 'default', manager.owner
+        )
         self.assertEqual(queue_mock.put.call_count, 6)
+        self.assertEqual(manager.queued_tasks_count, 8)
+        time_mock.sleep.assert_not_called()
+
+    @patch('django_partisan.workers_manager.metrics')
+    def test_manage_queue_records_metrics(
+        self,
+        metrics_mock,
+        worker_mock,
+        mp_mock,
+        db_mock,
+        time_mock,
+        task_mock,
+        logger_mock,
+    ):
+        manager = WorkersManager(workers_count=4, min_queue_size=4, max_queue_size=8)
+        manager.metrics = Mock()
+        manager.queue = Mock()
+        manager.queued_tasks_count = 2
+        task_obj = Mock(
+            queue_name='default',
+            execute_after=timezone.now() - datetime.timedelta(seconds=30),
+            **{'get_metric_labels.return_value': {'queue': 'default'}},
+        )
+        task_mock.objects.select_for_process.return_value = [task_obj]
+        manager.manage_queue()
+        metrics_mock.record.assert_any_call(
+            metrics_mock.TASKS_CLAIMED, {'queue': 'default'}
+        )
+        lag_call = metrics_mock.record.call_args_list[1]
+        self.assertEqual(lag_call[0][:2], (metrics_mock.TASK_LAG, {'queue': 'default'}))
+        self.assertAlmostEqual(lag_call[0][2], 30, delta=1)
+        metrics_mock.record.assert_called_with(metrics_mock.LOCAL_QUEUE_DEPTH, value=3)
+
+    def test_metrics_from_settings(
+        self, worker_mock, mp_mock, db_mock, time_mock, task_mock, logger_mock
+    ):
+        self.assertIsNone(WorkersManager().metrics)
+        with patch.object(get_queue_settings(), 'METRICS_TEXTFILE', 'partisan.prom'):
+            manager = WorkersManager(workers_count=1)
+        self.assertEqual(manager.metrics.textfile, 'partisan.prom')
+        self.assertEqual(manager.metrics.host, '127.0.0.1')
+        manager.create_workers()
+        worker_mock.assert_called_once_with(
+            manager.queue,
+            'default',
+            metrics_queue=manager.metrics.events,
+            events_queue=manager.workers_events,
+        )
+
+    def test_manage_queue_adaptive_prefetch(
+        self, worker_mock, mp_mock, db_mock, time_mock, task_mock, logger_mock
+    ):
+        time_mock.monotonic.side_effect = [0, 1]
+        manager = WorkersManager(workers_count=4, min_queue_size=2, max_queue_size=20)
+        manager.queue = Mock()
+        manager.workers_events = Mock()
+        manager.workers_events.get.side_effect = [
+            Empty,
+            ('taken', 10, [1, 2]),
+            ('taken', 20, [3, 4]),
+            Empty,
+        ]
+        task_mock.objects.select_for_process.side_effect = [[Mock()] * 4, [Mock()] * 8]
+        with patch.object(manager.settings, 'ADAPTIVE_PREFETCH_SECONDS', 5):
+            manager.manage_queue()
+            manager.manage_queue()
+        # 4 tasks were taken in 1 second and queue was drained: rate 0.3 * 8
+        task_mock.objects.select_for_process.assert_has_calls(
+            [call(4, 'default', manager.owner), call(12, 'default', manager.owner)]
+        )
+
+    def test_update_processing_rate(
+        self, worker_mock, mp_mock, db_mock, time_mock, task_mock, logger_mock
+    ):
+        time_mock.monotonic.side_effect = [0, 2, 2, 4]
+        manager = WorkersManager()
+        manager.update_processing_rate(10)
+        manager.update_processing_rate(6)
+        self.assertAlmostEqual(manager.processing_rate, 0.6)
+        manager.update_processing_rate(6)
+        self.assertAlmostEqual(manager.processing_rate, 0.6)
+        manager.update_processing_rate(0)
+        self.assertAlmostEqual(manager.processing_rate, 0.6 + 0.3 * (6 - 0.6))
+
+    def test_get_fetch_size(
+        self, worker_mock, mp_mock, db_mock, time_mock, task_mock, logger_mock
+    ):
+        manager = WorkersManager(workers_count=4, min_queue_size=2, max_queue_size=20)
+        self.assertEqual(manager.get_fetch_size(2), 18)
+        with patch.object(manager.settings, 'ADAPTIVE_PREFETCH_SECONDS', 5):
+            self.assertEqual(manager.get_fetch_size(1), 3)
+            manager.processing_rate = 2.1
+            self.assertEqual(manager.get_fetch_size(1), 10)
+            manager.processing_rate = 10
+            self.assertEqual(manager.get_fetch_size(1), 19)
+            self.assertEqual(manager.get_fetch_size(25), 0)
+
+    def test_manage_queue_compact_transport(
+        self, worker_mock, mp_mock, db_mock, time_mock, task_mock, logger_mock
+    ):
+        manager = WorkersManager(workers_count=4, min_queue_size=4, max_queue_size=8)
+        queue_mock = Mock()
+        manager.queued_tasks_count = 2
+        task_obj = Mock()
+        task_mock.objects.select_for_process = MagicMock(return_value=[task_obj])
+        manager.queue = queue_mock
+        with patch.object(manager.settings, 'COMPACT_TASKS_TRANSPORT', True):
+            manager.manage_queue()
+        queue_mock.put.assert_called_once_with(task_obj.to_message.return_value)
+
+    @patch.object(BatchTestTaskProcessor, 'BATCH_SIZE', 2)
+    def test_manage_queue_batches(
+        self, worker_mock, mp_mock, db_mock, time_mock, task_mock, logger_mock
+    ):
+        manager = WorkersManager(workers_count=4, min_queue_size=4, max_queue_size=8)
+        queue_mock = Mock()
+        manager.queued_tasks_count = 2
+        batch_tasks = [
+            Mock(processor_class='BatchTestTaskProcessor', queue_name='default')
+            for _ in range(3)
+        ]
+        other_queue_task = Mock(
+            processor_class='BatchTestTaskProcessor', queue_name='other'
+        )
+        task_obj = Mock(processor_class='TestTaskProcessor', queue_name='default')
+        task_mock.objects.select_for_process = MagicMock(
+            return_value=[*batch_tasks[:2], other_queue_task, task_obj, batch_tasks[2]]
+        )
+        manager.queue = queue_mock
+        manager.manage_queue()
+        queue_mock.put.assert_has_calls(
+            [
+                call(batch_tasks[:2]),
+                call([other_queue_task]),
+                call(task_obj),
+                call(batch_tasks[2:]),
+            ]
+        )
+        self.assertEqual(queue_mock.put.call_count, 4)
+        self.assertEqual(manager.queued_tasks_count, 7)
+        manager.workers_events = Mock()
+        manager.workers_events.get.side_effect = [('taken', 10, [1, 2]), Empty]
+        manager.collect_workers_events()
+        self.assertEqual(manager.queued_tasks_count, 5)
+
+    def test_manage_queue_waits_for_notification(
+        self, worker_mock, mp_mock, db_mock, time_mock, task_mock, logger_mock
+    ):
+        manager = WorkersManager(workers_count=4, min_queue_size=4)
+        manager.listener = Mock()
+        queue_mock = Mock()
+        manager.queued_tasks_count = 5
+        manager.queue = queue_mock
+        manager.manage_queue()
+        manager.listener.wait.assert_called_once_with(2)
         time_mock.sleep.assert_not_called()
 
+    @patch('django_partisan.workers_manager.NotificationsListener')
+    def test_listener_created_from_settings(
+        self,
+        listener_mock,
+        worker_mock,
+        mp_mock,
+        db_mock,
+        time_mock,
+        task_mock,
+        logger_mock,
+    ):
+        self.assertIsNone(WorkersManager().listener)
+        with patch.object(get_queue_settings(), 'USE_LISTEN_NOTIFY', True):
+            manager = WorkersManager()
+        listener_mock.assert_called_once_with('default')
+        self.assertEqual(manager.listener, listener_mock.return_value)
+
+    def test_managers_have_different_owners(
+        self, worker_mock, mp_mock, db_mock, time_mock, task_mock, logger_mock
+    ):
+        self.assertNotEqual(WorkersManager().owner, WorkersManager().owner)
+
+    def test_manage_leases(
+        self, worker_mock, mp_mock, db_mock, time_mock, task_mock, logger_mock
+    ):
+        time_mock.monotonic.side_effect = [1000, 1050, 1100]
+        task_mock.objects.requeue_expired_tasks.return_value = 3
+        manager = WorkersManager()
+        manager.manage_leases()
+        manager.manage_leases()
+        manager.manage_leases()
+        task_mock.objects.renew_leases.assert_has_calls(
+            [call(manager.owner, 'default'), call(manager.owner, 'default')]
+        )
+        self.assertEqual(task_mock.objects.requeue_expired_tasks.call_count, 2)
+        logger_mock.warning.assert_called_with(
+            "Returned to queue %d tasks with expired leases", 3
+        )
+
+    def test_release_tasks(
+        self, worker_mock, mp_mock, db_mock, time_mock, task_mock, logger_mock
+    ):
+        task_mock.objects.release_tasks.return_value = 2
+        manager = WorkersManager()
+        manager.release_tasks()
+        task_mock.objects.release_tasks.assert_called_once_with(
+            manager.owner, 'default'
+        )
+        logger_mock.info.assert_called_with(
+            "Returned to queue %d not processed tasks", 2
+        )
+
+    def test_release_tasks_error(
+        self, worker_mock, mp_mock, db_mock, time_mock, task_mock, logger_mock
+    ):
+        task_mock.objects.release_tasks.side_effect = DatabaseError
+        WorkersManager().release_tasks()
+        logger_mock.exception.assert_called_once_with("Database error")
+
     def test_manage_workers(
         self, worker_mock, mp_mock, db_mock, time_mock, task_mock, logger_mock
     ):
@@ -132,14 +385,165 @@ class TestWorkersManager(TestCase):
             Mock(**{is_alive_return_value: False}),
         ]
         manager.cleanup_counter = 50
-        manager.manage_workers()
+        with patch('django_partisan.workers_manager.metrics') as metrics_mock:
+            manager.manage_workers()
         db_mock.asser_was_called()
         self.assertEqual(worker_mock.call_count, 2)
+        metrics_mock.record.assert_has_calls([call(metrics_mock.WORKER_RESTARTS)] * 2)
         manager.workers[0].start.assert_not_called()
         manager.workers[1].start.assert_called()
         manager.workers[2].start.assert_not_called()
         manager.workers[3].start.assert_called()
 
+    def test_collect_workers_events(
+        self, worker_mock, mp_mock, db_mock, time_mock, task_mock, logger_mock
+    ):
+        manager = WorkersManager(workers_count=2)
+        manager.workers_events = Mock()
+        manager.workers_events.get.side_effect = [
+            ('taken', 10, [1]),
+            ('taken', 10, [2, 3]),
+            ('taken', 20, [4]),
+            ('done', 10, [1, 2]),
+            ('done', 30, [5]),
+            Empty,
+        ]
+        manager.collect_workers_events()
+        self.assertEqual(manager.workers_tasks, {10: {3}, 20: {4}})
+
+    def test_manage_workers_releases_tasks_of_dead_worker(
+        self, worker_mock, mp_mock, db_mock, time_mock, task_mock, logger_mock
+    ):
+        manager = WorkersManager(workers_count=2)
+        manager.workers_events = Mock(**{'get.side_effect': Empty})
+        manager.workers = [
+            Mock(pid=10, **{is_alive_return_value: True}),
+            Mock(pid=20, **{is_alive_return_value: False}),
+        ]
+        manager.workers_tasks = {10: {1}, 20: {2, 3}}
+        task_mock.objects.release_claimed_tasks.return_value = 2
+        manager.cleanup_counter = 50
+        manager.manage_workers()
+        task_mock.objects.release_claimed_tasks.assert_called_once_with(
+            manager.owner, [2, 3]
+        )
+        self.assertEqual(manager.workers_tasks, {10: {1}})
+        logger_mock.warning.assert_has_calls(
+            [call("Returned to queue %d tasks of exited worker %d", 2, 20)]
+        )
+        self.assertEqual(worker_mock.call_count, 1)
+
+    def test_manage_workers_retired(
+        self, worker_mock, mp_mock, db_mock, time_mock, task_mock, logger_mock
+    ):
+        manager = WorkersManager(workers_count=4,)
+        manager.workers_events = Mock()
+        manager.workers_events.get.side_effect = [('stopped', 30, []), Empty, Empty]
+        dead_worker = Mock(pid=20, **{is_alive_return_value: False})
+        retired_worker = Mock(pid=30, **{is_alive_return_value: False})
+        manager.workers = [
+            Mock(pid=10, **{is_alive_return_value: True}),
+            dead_worker,
+            retired_worker,
+        ]
+        manager.retiring_workers_count = 2
+        manager.cleanup_counter = 50
+        manager.manage_workers()
+        self.assertEqual(len(manager.workers), 2)
+        self.assertNotIn(retired_worker, manager.workers)
+        self.assertNotIn(dead_worker, manager.workers)
+        self.assertEqual(worker_mock.call_count, 1)
+        self.assertEqual(manager.retiring_workers_count, 1)
+        self.assertEqual(manager.retired_workers_pids, set())
+
+    def test_manage_workers_retiring_alive(
+        self, worker_mock, mp_mock, db_mock, time_mock, task_mock, logger_mock
+    ):
+        manager = WorkersManager(workers_count=4, min_workers_count=1)
+        manager.workers_events = Mock()
+        manager.workers_events.get.side_effect = [('stopped', 10, []), Empty]
+        manager.workers = [
+            Mock(pid=10, **{is_alive_return_value: True}),
+            Mock(pid=20, **{is_alive_return_value: True}),
+        ]
+        manager.retiring_workers_count = 1
+        manager.manage_workers()
+        self.assertEqual(manager.retiring_workers_count, 0)
+        self.assertEqual(manager.retired_workers_pids, {10})
+        manager.queue = Mock()
+        manager.queued_tasks_count = 1
+        manager.scale_workers()
+        self.assertEqual(len(manager.workers), 3)
+
+    def test_create_workers_autoscaling(
+        self, worker_mock, mp_mock, db_mock, time_mock, task_mock, logger_mock
+    ):
+        manager = WorkersManager(workers_count=4, min_workers_count=10)
+        self.assertEqual(manager.min_workers_count, 4)
+        manager = WorkersManager(workers_count=4, min_workers_count=1)
+        manager.create_workers()
+        self.assertEqual(worker_mock.call_count, 1)
+
+    def test_scale_workers_disabled(
+        self, worker_mock, mp_mock, db_mock, time_mock, task_mock, logger_mock
+    ):
+        manager = WorkersManager(workers_count=4)
+        manager.queued_tasks_count = 10
+        manager.scale_workers()
+        worker_mock.assert_not_called()
+
+    def test_scale_workers_up(
+        self, worker_mock, mp_mock, db_mock, time_mock, task_mock, logger_mock
+    ):
+        manager = WorkersManager(workers_count=3, min_workers_count=1)
+        manager.queue = Mock()
+        manager.queued_tasks_count = 2
+        manager.create_workers()
+        for _ in range(4):
+            manager.scale_workers()
+        self.assertEqual(len(manager.workers), 3)
+        self.assertEqual(worker_mock.call_count, 3)
+
+    def test_scale_workers_up_not_needed(
+        self, worker_mock, mp_mock, db_mock, time_mock, task_mock, logger_mock
+    ):
+        manager = WorkersManager(workers_count=3, min_workers_count=2)
+        manager.queue = Mock()
+        manager.queued_tasks_count = 1
+        manager.create_workers()
+        manager.idle_since = 10
+        manager.scale_workers()
+        self.assertEqual(len(manager.workers), 2)
+        self.assertIsNone(manager.idle_since)
+
+    def test_scale_workers_up_not_by_stop_messages(
+        self, worker_mock, mp_mock, db_mock, time_mock, task_mock, logger_mock
+    ):
+        manager = WorkersManager(workers_count=3, min_workers_count=1)
+        manager.workers = [Mock(), Mock(), Mock()]
+        manager.retiring_workers_count = 1
+        # Only stop message is in queue
+        manager.queue = Mock(**{'qsize.return_value': 1})
+        manager.queued_tasks_count = 0
+        time_mock.monotonic.return_value = 20
+        manager.scale_workers()
+        self.assertEqual(worker_mock.call_count, 0)
+        self.assertEqual(manager.idle_since, 20)
+
+    def test_scale_workers_down(
+        self, worker_mock, mp_mock, db_mock, time_mock, task_mock, logger_mock
+    ):
+        time_mock.monotonic.side_effect = [0, 30, 60, 90, 120, 180]
+        manager = WorkersManager(workers_count=3, min_workers_count=1)
+        manager.workers = [Mock(), Mock(), Mock()]
+        manager.queue = Mock()
+        manager.queued_tasks_count = 0
+        for _ in range(6):
+            manager.scale_workers()
+        self.assertEqual(manager.queue.put.call_count, 2)
+        manager.queue.put.assert_called_with(None)
+        self.assertEqual(manager.retiring_workers_count, 2)
+
     def test_flush_empty_queue(
         self, worker_mock, mp_mock, db_mock, time_mock, task_mock, logger_mock
     ):
@@ -209,3 +613,133 @@ class TestWorkersManager(TestCase):
         worker_dead.terminate.assert_not_called()
         worker_normally_finished.join.assert_called_once()
         worker_normally_finished.terminate.assert_not_called()
+
+
+def get_queues_config(**weights):
+    return {
+        queue_name: get_queue_settings().copy(update={'QUEUE_WEIGHT': weight})
+        for queue_name, weight in weights.items()
+    }
+
+
+@patch('django_partisan.workers_manager.Task')
+class TestMultiQueueWorkersManager(TestCase):
+    def setUp(self):
+        config_patcher = patch.dict(
+            'django_partisan.workers_manager.PARTISAN_CONFIG',
+            get_queues_config(first=3, second=1),
+        )
+        config_patcher.start()
+        self.addCleanup(config_patcher.stop)
+
+    @staticmethod
+    def claim_from(available):
+        def select_for_process(count, queue_name, owner):
+            claimed = available[queue_name][:count]
+            available[queue_name] = available[queue_name][count:]
+            return claimed
+
+        return select_for_process
+
+    def test_pool_configured_by_first_queue(self, task_mock):
+        manager = WorkersManager(queue_names=['second', 'first'])
+        self.assertEqual(manager.queue_name, 'second')
+        self.assertEqual(manager.settings.QUEUE_WEIGHT, 1)
+
+    def test_bad_settings(self, task_mock):
+        with self.assertRaises(RuntimeError):
+            WorkersManager(queue_names=['first', 'some_bad_queue_name'])
+
+    def test_bad_fetch_strategy(self, task_mock):
+        with self.assertRaises(ValueError):
+            WorkersManager(queue_names=['first', 'second'], fetch_strategy='random')
+
+    def test_fetch_weighted(self, task_mock):
+        task_mock.objects.select_for_process.side_effect = self.claim_from(
+            {'first': list(range(10)), 'second': list(range(10, 20))}
+        )
+        manager = WorkersManager(queue_names=['first', 'second'])
+        self.assertEqual(manager.fetch_tasks(8), [0, 1, 2, 3, 4, 5, 10, 11])
+
+    def test_different_worker_modes(self, task_mock):
+        config = get_queues_config(first=1, second=1)
+        config['second'] = config['second'].copy(update={'ASYNC_TASKS_PER_WORKER': 10})
+        with patch.dict('django_partisan.workers_manager.PARTISAN_CONFIG', config):
+            with self.assertRaises(ValueError):
+                WorkersManager(queue_names=['first', 'second'])
+
+    def test_fetch_weighted_less_than_queues(self, task_mock):
+        task_mock.objects.select_for_process.side_effect = self.claim_from(
+            {'first': list(range(10)), 'second': list(range(10, 20))}
+        )
+        manager = WorkersManager(queue_names=['first', 'second'])
+        self.assertEqual(
+            [manager.fetch_tasks(1) for _ in range(8)],
+            [[0], [1], [10], [2], [3], [4], [11], [5]],
+        )
+        self.assertEqual(task_mock.objects.select_for_process.call_count, 8)
+
+    def test_fetch_weighted_remainder_shared(self, task_mock):
+        task_mock.objects.select_for_process.side_effect = self.claim_from(
+            {'first': list(range(10)), 'second': list(range(10, 20))}
+        )
+        manager = WorkersManager(queue_names=['first', 'second'])
+        self.assertEqual(
+            [manager.fetch_tasks(2) for _ in range(4)],
+            [[0, 1], [2, 3], [4, 10], [5, 6]],
+        )
+
+    def test_fetch_weighted_gives_unused_share_to_others(self, task_mock):
+        task_mock.objects.select_for_process.side_effect = self.claim_from(
+            {'first': [0], 'second': list(range(10, 20))}
+        )
+        manager = WorkersManager(queue_names=['first', 'second'])
+        self.assertEqual(manager.fetch_tasks(4), [0, 10, 11, 12])
+        task_mock.objects.select_for_process.assert_has_calls(
+            [
+                call(3, 'first', manager.owner),
+                call(1, 'second', manager.owner),
+                call(2, 'second', manager.owner),
+            ]
+        )
+
+    def test_fetch_priority(self, task_mock):
+        task_mock.objects.select_for_process.side_effect = self.claim_from(
+            {'first': [0, 1], 'second': list(range(10, 20))}
+        )
+        manager = WorkersManager(
+            queue_names=['first', 'second'], fetch_strategy='priority'
+        )
+        self.assertEqual(manager.fetch_tasks(4), [0, 1, 10, 11])
+        self.assertEqual(manager.fetch_tasks(4), [12, 13, 14, 15])
+        task_mock.objects.select_for_process.assert_called_with(
+            4, 'second', manager.owner
+        )
+
+    def test_manage_leases(self, task_mock):
+        task_mock.objects.requeue_expired_tasks.return_value = 0
+        manager = WorkersManager(queue_names=['first', 'second'])
+        manager.manage_leases()
+        task_mock.objects.renew_leases.assert_has_calls(
+            [call(manager.owner, 'first'), call(manager.owner, 'second')]
+        )
+        task_mock.objects.requeue_expired_tasks.assert_has_calls(
+            [call('first'), call('second')]
+        )
+
+    def test_release_tasks(self, task_mock):
+        task_mock.objects.release_tasks.return_value = 1
+        manager = WorkersManager(queue_names=['first', 'second'])
+        manager.release_tasks()
+        task_mock.objects.release_tasks.assert_has_calls(
+            [call(manager.owner, 'first'), call(manager.owner, 'second')]
+        )
+
+    @patch('django_partisan.workers_manager.NotificationsListener')
+    def test_listener_for_notified_queues(self, listener_mock, task_mock):
+        config = get_queues_config(first=1, second=1, third=1)
+        config['second'] = config['second'].copy(update={'USE_LISTEN_NOTIFY': True})
+        config['third'] = config['third'].copy(update={'USE_LISTEN_NOTIFY': True})
+        with patch.dict('django_partisan.workers_manager.PARTISAN_CONFIG', config):
+            WorkersManager(queue_names=['first', 'second', 'third'])
+        listener_mock.assert_called_once_with('second', 'third')
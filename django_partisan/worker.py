@@ -2,20 +2,30 @@ import logging
 import multiprocessing as mp
 import os
 import signal
+import threading
+import time
 from queue import Empty
-from typing import Optional, TYPE_CHECKING
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Optional, Union, List, Dict, Any
 
 import setproctitle
 from django import db
 
-from django_partisan.settings import PARTISAN_CONFIG
+from django_partisan import metrics
+from django_partisan.models import Task, TaskMessage, TaskTiming
+from django_partisan.settings import PARTISAN_CONFIG, get_queue_settings
 from django_partisan.settings.const import DEFAULT_QUEUE_NAME
 
-if TYPE_CHECKING:
-    from django_partisan.models import Task
-
 logger = logging.getLogger(__name__)
 
+RUNNING_TASKS_CHECK_TIMEOUT = 0.1
+
+TASKS_TAKEN = 'taken'
+TASKS_DONE = 'done'
+WORKER_STOPPED = 'stopped'
+
+QueueItem = Union[Task, TaskMessage, List[Union[Task, TaskMessage]], None]
+
 
 class Worker(mp.Process):
     def __init__(
@@ -23,53 +33,295 @@ class Worker(mp.Process):
         queue: mp.Queue,
         queue_name: str = DEFAULT_QUEUE_NAME,
         tasks_before_death: Optional[int] = None,
+        metrics_queue: Optional[mp.Queue] = None,
+        events_queue: Optional[mp.Queue] = None,
     ) -> None:
         super().__init__()
         self.queue = queue
+        self.metrics_queue = metrics_queue
+        self.events_queue = events_queue
         self.queue_name = queue_name
-        self.settings = PARTISAN_CONFIG.get(self.queue_name)
-        if not self.settings:
+        settings = PARTISAN_CONFIG.get(self.queue_name)
+        if not settings:
             raise RuntimeError(f'No settings for queue "{queue_name}" found!')
+        self.settings = settings
         self.tasks_before_death = (
             tasks_before_death or self.settings.TASKS_PER_WORKER_INSTANCE
         )
         self.tasks_processed = 0
+        # Buffered completed tasks by queues, completed with settings of their queue
+        self.completed_tasks_ids: Dict[str, List[int]] = {}
+        self.completed_tasks_timings: Dict[str, Dict[int, TaskTiming]] = {}
+        self.last_flush_time = time.monotonic()
+        self.error: Optional[BaseException] = None
+        # Connections of pool threads by thread id, closed when threads exit
+        self.threads_connections: Dict[int, List[Any]] = {}
 
     def run(self) -> None:
         logger.info("Worker started")
         setproctitle.setproctitle("partisan/worker")
         signal.signal(signal.SIGTERM, signal.SIG_DFL)
         signal.signal(signal.SIGINT, signal.SIG_DFL)
+        metrics.use_events_queue(self.metrics_queue)
 
         try:
-            while self.shoud_process_tasks():
+            self.process()
+        except Exception:
+            logger.exception('Got exception, exiting')
+        finally:
+            self.flush_completed_tasks()
+            if self.completed_tasks_ids:
+                logger.error(
+                    'Exiting with %d not completed tasks',
+                    sum(map(len, self.completed_tasks_ids.values())),
+                )
+
+    def process(self) -> None:
+        if self.settings.WORKER_THREADS_COUNT > 1:
+            self.process_tasks_in_threads()
+        else:
+            self.process_tasks()
+
+    def process_tasks(self) -> None:
+        while self.shoud_process_tasks():
+            try:
+                message: QueueItem = self.queue.get(timeout=self.get_queue_timeout())
+                if message is None:
+                    logger.info('Worker stopped')
+                    self.report_stopped()
+                    return
+            except Empty:
+                self.flush_completed_tasks()
+                if os.getppid() == 1:  # pragma: no cover
+                    exit(0)
+                continue
+
+            if isinstance(message, list):
+                self.process_batch(self.get_batch(message))
+                continue
+            task = self.get_task(message)
+            try:
+                task.run()
+                self.tasks_processed += 1
+                self.complete_task(task)
+            except Exception as err:
+                self.fail_task(task, err)
+                raise
+        else:
+            logger.info(
+                'Processed %d of %d tasks. Exiting',
+                self.tasks_processed,
+                self.tasks_before_death,
+            )
+
+    def process_tasks_in_threads(self) -> None:
+        """Runs up to WORKER_THREADS_COUNT tasks at once. Tasks are completed
+        or failed in the main thread, so completion batching stays single-threaded.
+        On first failed task worker stops taking new tasks, waits for running ones
+        and exits. Threads keep their connections open between tasks
+        """
+        threads_count = self.settings.WORKER_THREADS_COUNT
+        running_tasks: Dict['Future[Any]', Union[Task, List[Task]]] = {}
+        with ThreadPoolExecutor(max_workers=threads_count) as executor:
+            while self.error is None and self.shoud_process_tasks(len(running_tasks)):
+                if len(running_tasks) >= threads_count:
+                    self.collect_finished_tasks(running_tasks, timeout=None)
+                    continue
                 try:
-                    task: Optional['Task'] = self.queue.get(timeout=5)
-                    if task is None:
+                    message: QueueItem = self.queue.get(
+                        timeout=self.get_queue_timeout(bool(running_tasks))
+                    )
+                    if message is None:
                         logger.info('Worker stopped')
-                        return
-                except Empty:  # pragma: no cover
-                    if os.getppid() == 1:  # validate parent
-                        exit(0)
+                        self.report_stopped()
+                        break
+                except Empty:
+                    self.collect_finished_tasks(running_tasks, timeout=0)
+                    self.flush_completed_tasks()
+                    if os.getppid() == 1:  # pragma: no cover
+                        break
                     continue
+                task: Union[Task, List[Task]]
+                if isinstance(message, list):
+                    task = self.get_batch(message)
+                else:
+                    task = self.get_task(message)
+                running_tasks[executor.submit(self.run_task, task)] = task
+                self.collect_finished_tasks(running_tasks, timeout=0)
+            while running_tasks:
+                self.collect_finished_tasks(running_tasks, timeout=None)
+        self.close_threads_connections()
+        if self.error is not None:
+            raise self.error
+        if not self.shoud_process_tasks():
+            logger.info(
+                'Processed %d of %d tasks. Exiting',
+                self.tasks_processed,
+                self.tasks_before_death,
+            )
 
-                try:
-                    task.run()
-                    self.tasks_processed += 1
-                    task.complete()
-                except Exception as err:
-                    task.fail(err)
-                    raise
+    def run_task(self, task: Union[Task, List[Task]]) -> Any:
+        try:
+            if isinstance(task, list):
+                return Task.run_batch(task)
+            return task.run()
+        finally:
+            self.close_unusable_connections()
+            self.threads_connections[threading.get_ident()] = db.connections.all()
+
+    @staticmethod
+    def close_unusable_connections() -> None:
+        """Closes connections of current thread, broken by task. Unlike
+        close_old_connections, doesn't close usable ones by CONN_MAX_AGE
+        """
+        for connection in db.connections.all():
+            if connection.connection is None or not connection.errors_occurred:
+                continue
+            if connection.is_usable():
+                connection.errors_occurred = False
             else:
-                logger.info(
-                    'Processed %d of %d tasks. Exiting',
-                    self.tasks_processed,
-                    self.tasks_before_death,
+                connection.close()
+
+    def close_threads_connections(self) -> None:
+        """Closes connections of pool threads, which have already exited"""
+        for connections in self.threads_connections.values():
+            for connection in connections:
+                connection.inc_thread_sharing()
+                connection.close()
+        self.threads_connections.clear()
+
+    def collect_finished_tasks(
+        self,
+        running_tasks: Dict['Future[Any]', Union[Task, List[Task]]],
+        timeout: Optional[float],
+    ) -> None:
+        finished, _ = wait(running_tasks, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in finished:
+            task = running_tasks.pop(future)
+            err = future.exception()
+            if isinstance(task, list):
+                err = err or self.finish_batch(task, future.result())
+                if err is not None and self.error is None:
+                    self.error = err
+                continue
+            if err is None:
+                self.tasks_processed += 1
+                self.complete_task(task)
+                continue
+            self.fail_task(task, err)  # type: ignore
+            if self.error is None:
+                self.error = err
+
+    def process_batch(self, tasks: List[Task]) -> None:
+        error = self.finish_batch(tasks, Task.run_batch(tasks))
+        if error is not None:
+            raise error
+
+    def finish_batch(
+        self, tasks: List[Task], errors: List[Optional[Exception]]
+    ) -> Optional[Exception]:
+        """Completes processed tasks of batch and fails others.
+        Returns the first error of batch
+        """
+        first_error = None
+        for task, err in zip(tasks, errors):
+            if err is None:
+                self.tasks_processed += 1
+                self.complete_task(task)
+                continue
+            self.fail_task(task, err)
+            first_error = first_error or err
+        return first_error
+
+    def get_batch(self, messages: List[Union[Task, TaskMessage]]) -> List[Task]:
+        tasks = [self.build_task(message) for message in messages]
+        self.report_tasks(TASKS_TAKEN, [task.pk for task in tasks])
+        return tasks
+
+    def get_task(self, message: Union[Task, TaskMessage]) -> Task:
+        task = self.build_task(message)
+        self.report_tasks(TASKS_TAKEN, [task.pk])
+        return task
+
+    @staticmethod
+    def build_task(message: Union[Task, TaskMessage]) -> Task:
+        if isinstance(message, TaskMessage):
+            return Task.from_message(message)
+        return message
+
+    def report_tasks(self, event: str, tasks_ids: List[int]) -> None:
+        """Tells manager, that tasks are taken by this worker or done with,
+        so tasks, held by worker, are returned to queue, if it dies
+        """
+        if self.events_queue is not None and tasks_ids:
+            self.events_queue.put((event, os.getpid(), tasks_ids))
+
+    def report_stopped(self) -> None:
+        """Tells manager, that this worker took stop message from queue and exits"""
+        if self.events_queue is not None:
+            self.events_queue.put((WORKER_STOPPED, os.getpid(), []))
+
+    def fail_task(self, task: Task, err: Exception) -> None:
+        task.fail(err)
+        self.report_tasks(TASKS_DONE, [task.pk])
+
+    def get_queue_timeout(self, has_running_tasks: bool = False) -> float:
+        if has_running_tasks:
+            return RUNNING_TASKS_CHECK_TIMEOUT
+        if not self.completed_tasks_ids:
+            return 5
+        flush_timeout = self.settings.COMPLETE_BATCH_TIMEOUT_MS / 1000
+        return max(flush_timeout - (time.monotonic() - self.last_flush_time), 0)
+
+    def complete_task(self, task: Task) -> None:
+        """Completes task at once or, if COMPLETE_BATCH_SIZE of its queue
+        is set, buffers it to complete with batch. Tasks, returned to queue
+        for retry or postponed, are not completed
+        """
+        if task.status == Task.STATUS_NEW:
+            self.report_tasks(TASKS_DONE, [task.pk])
+            return
+        metrics.record(metrics.TASKS_COMPLETED, task.get_metric_labels())
+        settings = task.settings
+        if settings.COMPLETE_BATCH_SIZE is None:
+            task.complete()
+            self.report_tasks(TASKS_DONE, [task.pk])
+            return
+        completed_tasks_ids = self.completed_tasks_ids.setdefault(task.queue_name, [])
+        completed_tasks_ids.append(task.pk)
+        timing = task.get_timing() if settings.TRACK_TASK_TIMING else None
+        if timing is not None:
+            timings = self.completed_tasks_timings.setdefault(task.queue_name, {})
+            timings[task.pk] = timing
+        if (
+            len(completed_tasks_ids) >= settings.COMPLETE_BATCH_SIZE
+            or self.get_queue_timeout() == 0
+        ):
+            self.flush_completed_tasks()
+
+    def flush_completed_tasks(self) -> None:
+        """Completes buffered tasks of every queue with one query. If it fails,
+        tasks are kept buffered and completed with the next flush
+        """
+        for queue_name, tasks_ids in list(self.completed_tasks_ids.items()):
+            try:
+                Task.objects.complete_tasks(
+                    tasks_ids,
+                    delete=get_queue_settings(queue_name).DELETE_TASKS_ON_COMPLETE,
+                    timings=self.completed_tasks_timings.get(queue_name) or None,
                 )
-        except Exception:
-            logger.exception('Got exception, exiting')
+            except Exception:
+                logger.exception(
+                    'Got exception while completing %d tasks', len(tasks_ids)
+                )
+                db.close_old_connections()
+            else:
+                self.report_tasks(TASKS_DONE, tasks_ids)
+                del self.completed_tasks_ids[queue_name]
+                self.completed_tasks_timings.pop(queue_name, None)
+        self.last_flush_time = time.monotonic()
 
-    def shoud_process_tasks(self) -> bool:
+    def shoud_process_tasks(self, running_tasks_count: int = 0) -> bool:
         if self.tasks_before_death is None:
             return True
-        return self.tasks_processed < self.tasks_before_death
+        return self.tasks_processed + running_tasks_count < self.tasks_before_death
@@ -1,21 +1,36 @@
 import datetime
 import logging
+import math
 import multiprocessing as mp
+import os
 import signal
+import socket
 import sys
 import time
+import uuid
 from queue import Empty
-from typing import List, Any
+from typing import List, Any, Optional, Dict, Tuple, Set
 
 import setproctitle
 from django import db
 from django.db import Error
+from django.utils import timezone
 
+from django_partisan import metrics
+from django_partisan.async_worker import AsyncWorker
+from django_partisan.metrics import MetricsCollector
 from django_partisan.models import Task
+from django_partisan.notifications import NotificationsListener
+from django_partisan.processor import BaseTaskProcessor
 from django_partisan.registry import initialize_processors
 from django_partisan.settings import PARTISAN_CONFIG
-from django_partisan.settings.const import DEFAULT_QUEUE_NAME
-from django_partisan.worker import Worker
+from django_partisan.settings.const import (
+    DEFAULT_QUEUE_NAME,
+    FETCH_STRATEGY_WEIGHTED,
+    FETCH_STRATEGIES,
+)
+from django_partisan.settings.settings_models import QueueSettings
+from django_partisan.worker import Worker, TASKS_TAKEN, TASKS_DONE, WORKER_STOPPED
 from django_partisan.utils import Queue  # type: ignore
 
 
@@ -23,6 +38,8 @@ logger = logging.getLogger(__name__)
 
 running = False
 
+PROCESSING_RATE_SMOOTHING = 0.3
+
 
 def exit_func(sig_num: int, _: Any) -> None:  # pragma: no cover
     global running
@@ -37,21 +54,46 @@ class WorkersManager:
         self,
         *,
         queue_name: str = DEFAULT_QUEUE_NAME,
+        queue_names: Optional[List[str]] = None,
+        fetch_strategy: str = FETCH_STRATEGY_WEIGHTED,
         min_queue_size: int = None,
         max_queue_size: int = None,
         checks_before_cleanup: int = None,
         workers_count: int = None,
+        min_workers_count: int = None,
         sleep_delay_seconds: int = None,
     ) -> None:
         self.queue: mp.Queue = Queue()
         self.workers: List[mp.Process] = []
+        self.workers_events: mp.Queue = Queue()
+        # Ids of tasks, taken by workers and not done yet, by workers pids
+        self.workers_tasks: Dict[int, Set[int]] = {}
 
         self.cleanup_counter = 0
 
-        self.queue_name = queue_name
-        self.settings = PARTISAN_CONFIG.get(queue_name)
-        if not self.settings:
-            raise RuntimeError(f'No settings for queue "{queue_name}" found!')
+        self.queue_names = queue_names or [queue_name]
+        self.queues_settings: Dict[str, QueueSettings] = {}
+        for name in self.queue_names:
+            settings = PARTISAN_CONFIG.get(name)
+            if not settings:
+                raise RuntimeError(f'No settings for queue "{name}" found!')
+            self.queues_settings[name] = settings
+        if fetch_strategy not in FETCH_STRATEGIES:
+            raise ValueError(f'Unknown fetch strategy "{fetch_strategy}"')
+        self.fetch_strategy = fetch_strategy
+        # Workers pool and local queue are configured by the first queue
+        self.queue_name = self.queue_names[0]
+        self.settings = self.queues_settings[self.queue_name]
+        for name, settings in self.queues_settings.items():
+            if self.get_worker_mode(settings) != self.get_worker_mode(self.settings):
+                raise ValueError(
+                    f'Queues "{self.queue_name}" and "{name}" have different '
+                    f'ASYNC_TASKS_PER_WORKER or WORKER_THREADS_COUNT, '
+                    f'they can\'t be served by one pool of workers'
+                )
+        # Credits of smooth weighted round-robin, by which remainders
+        # of weighted shares are given to queues
+        self.fetch_credits = {name: 0 for name in self.queue_names}
 
         self.min_queue_size = min_queue_size or self.settings.MIN_QUEUE_SIZE
         self.max_queue_size = max_queue_size or self.settings.MAX_QUEUE_SIZE
@@ -59,9 +101,56 @@ class WorkersManager:
             checks_before_cleanup or self.settings.CHECKS_BEFORE_CLEANUP
         )
         self.workers_count = workers_count or self.settings.WORKERS_COUNT
+        self.min_workers_count = min_workers_count or self.settings.MIN_WORKERS_COUNT
+        if self.min_workers_count is not None:
+            self.min_workers_count = min(self.min_workers_count, self.workers_count)
+        # Stop messages, put to queue to retire workers and not taken yet
+        self.retiring_workers_count = 0
+        # Workers, which took stop message and exit
+        self.retired_workers_pids: Set[int] = set()
+        self.idle_since: Optional[float] = None
         self.sleep_delay_seconds = (
             sleep_delay_seconds or self.settings.SLEEP_DELAY_SECONDS
         )
+        notified_queue_names = [
+            name
+            for name, settings in self.queues_settings.items()
+            if settings.USE_LISTEN_NOTIFY
+        ]
+        self.listener = (
+            NotificationsListener(*notified_queue_names)
+            if notified_queue_names
+            else None
+        )
+
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.metrics = (
+            MetricsCollector(
+                self.settings.METRICS_PORT,
+                self.settings.METRICS_TEXTFILE,
+                self.settings.METRICS_HOST,
+            )
+            if self.settings.METRICS_PORT is not None
+            or self.settings.METRICS_TEXTFILE is not None
+            else None
+        )
+
+        # Tasks, put to local queue and not taken by workers yet. Batch is
+        # one item of queue, so queue size doesn't tell count of tasks
+        self.queued_tasks_count = 0
+        self.processing_rate = 0.0
+        self.last_qsize = 0
+        self.last_qsize_check_time: Optional[float] = None
+
+        lease_seconds = min(
+            settings.TASK_LEASE_SECONDS for settings in self.queues_settings.values()
+        )
+        self.leases_check_interval = lease_seconds / 3
+        self.last_leases_check_time: Optional[float] = None
+
+    @staticmethod
+    def get_worker_mode(settings: QueueSettings) -> Tuple[Optional[int], int]:
+        return settings.ASYNC_TASKS_PER_WORKER, settings.WORKER_THREADS_COUNT
 
     def run_partisan(self) -> None:
         global running
@@ -79,15 +168,22 @@ class WorkersManager:
 
         running = True
 
-        Task.objects.reset_tasks_to_initial_status()
+        if self.metrics is not None:
+            self.metrics.start()
 
         self.create_workers()
 
         while running:
             # noinspection PyBroadException
             try:
+                if self.listener is not None:
+                    self.listener.listen()
+                self.manage_leases()
                 self.manage_queue()
                 self.manage_workers()
+                self.scale_workers()
+                if self.metrics is not None:
+                    self.metrics.collect()
             except Error:
                 logger.exception("Database error")
                 db.connections.close_all()
@@ -96,51 +192,336 @@ class WorkersManager:
                 db.connections.close_all()
                 break
 
+        if self.listener is not None:
+            self.listener.close()
+
         self.flush_queue()
 
         self.stop_workers()
+        self.release_tasks()
+        if self.metrics is not None:
+            self.metrics.close()
         logger.info("Ready to exit, active_children: %r", mp.active_children())
         logger.info("Exit after %d seconds", (datetime.datetime.now() - now).seconds)
         sys.exit()
 
     def create_workers(self) -> None:
-        for _ in range(self.workers_count):
-            p = Worker(self.queue, self.queue_name)
-            p.start()
-            self.workers.append(p)
+        workers_count = (
+            self.workers_count
+            if self.min_workers_count is None
+            else self.min_workers_count
+        )
+        for _ in range(workers_count):
+            self.add_worker()
+
+    def add_worker(self) -> None:
+        p = self.create_worker()
+        p.start()
+        self.workers.append(p)
+
+    def create_worker(self) -> mp.Process:
+        metrics_queue = self.metrics.events if self.metrics is not None else None
+        worker_class = Worker
+        if self.settings.ASYNC_TASKS_PER_WORKER:
+            worker_class = AsyncWorker
+        return worker_class(
+            self.queue,
+            self.queue_name,
+            metrics_queue=metrics_queue,
+            events_queue=self.workers_events,
+        )
 
     def manage_queue(self) -> None:
         """Fill up queue if queue size is less than min_queue_size
         If queue is filled, sleep until the next check
         """
         nothing_to_do = True
-        qsize = self.queue.qsize()
+        self.collect_workers_events()
+        qsize = self.queued_tasks_count
+        if self.settings.ADAPTIVE_PREFETCH_SECONDS is not None:
+            self.update_processing_rate(qsize)
         if qsize <= self.min_queue_size:
-            task_objs = Task.objects.select_for_process(
-                self.max_queue_size - qsize, self.queue_name
-            )
+            task_objs = self.fetch_tasks(self.get_fetch_size(qsize))
             if len(task_objs) > 0:
                 nothing_to_do = False
-                for task_obj in task_objs:
-                    self.queue.put(task_obj)
+                for item in self.get_queue_items(task_objs):
+                    self.queue.put(item)
                 logger.info("Added to queue %d tasks", len(task_objs))
+            qsize += len(task_objs)
+            self.queued_tasks_count = qsize
+            self.last_qsize = qsize
+            if self.metrics is not None:
+                self.record_claimed_tasks(task_objs)
+        if self.metrics is not None:
+            metrics.record(metrics.LOCAL_QUEUE_DEPTH, value=qsize)
         if nothing_to_do:
+            self.wait_for_tasks()
+
+    def get_queue_items(self, task_objs: List[Task]) -> List[Any]:
+        """Messages of claimed tasks for local queue. Tasks of batch processors
+        are grouped by queue and processor into lists of up to BATCH_SIZE,
+        each list is taken by one worker at once
+        """
+        batch_sizes = BaseTaskProcessor.get_batch_sizes()
+        items: List[Any] = []
+        batches: Dict[Tuple[str, str], List[Any]] = {}
+        for task_obj in task_objs:
+            message = (
+                task_obj.to_message()
+                if self.settings.COMPACT_TASKS_TRANSPORT
+                else task_obj
+            )
+            batch_size = batch_sizes.get(task_obj.processor_class)
+            if batch_size is None:
+                items.append(message)
+                continue
+            batch_key = (task_obj.queue_name, task_obj.processor_class)
+            batch = batches.get(batch_key)
+            if batch is None or len(batch) >= batch_size:
+                batch = batches[batch_key] = []
+                items.append(batch)
+            batch.append(message)
+        return items
+
+    @staticmethod
+    def record_claimed_tasks(task_objs: List[Task]) -> None:
+        now = timezone.now()
+        for task_obj in task_objs:
+            metrics.record(metrics.TASKS_CLAIMED, task_obj.get_metric_labels())
+            metrics.record(
+                metrics.TASK_LAG,
+                {'queue': task_obj.queue_name},
+                (now - task_obj.execute_after).total_seconds(),
+            )
+
+    def update_processing_rate(self, qsize: int) -> None:
+        """Updates moving average of tasks per second, taken by workers from queue.
+        If queue was drained, workers could take more, so rate is doubled
+        """
+        now = time.monotonic()
+        if self.last_qsize_check_time is not None:
+            elapsed = now - self.last_qsize_check_time
+            if elapsed > 0:
+                rate = max(self.last_qsize - qsize, 0) / elapsed
+                if qsize == 0:
+                    rate *= 2
+                self.processing_rate += PROCESSING_RATE_SMOOTHING * (
+                    rate - self.processing_rate
+                )
+        self.last_qsize = qsize
+        self.last_qsize_check_time = now
+
+    def get_fetch_size(self, qsize: int) -> int:
+        """Count of tasks to fill local queue up to MAX_QUEUE_SIZE or,
+        if ADAPTIVE_PREFETCH_SECONDS is set, up to count of tasks, that workers
+        will take in this time, but not less than workers count and MIN_QUEUE_SIZE
+        """
+        prefetch_seconds = self.settings.ADAPTIVE_PREFETCH_SECONDS
+        if prefetch_seconds is None:
+            return self.max_queue_size - qsize
+        min_size = min(
+            max(self.min_queue_size + 1, self.workers_count), self.max_queue_size
+        )
+        target_size = math.ceil(self.processing_rate * prefetch_seconds)
+        target_size = max(min_size, min(target_size, self.max_queue_size))
+        return max(target_size - qsize, 0)
+
+    def fetch_tasks(self, count: int) -> List[Task]:
+        """Claims up to count tasks from served queues.
+        With weighted strategy every queue gets share of count by its QUEUE_WEIGHT
+        and shares, not used by empty queues, are given to other queues in order.
+        With priority strategy queues are drained in order
+        """
+        if len(self.queue_names) == 1:
+            return Task.objects.select_for_process(count, self.queue_name, self.owner)
+        task_objs: List[Task] = []
+        exhausted_queue_names = set()
+        if self.fetch_strategy == FETCH_STRATEGY_WEIGHTED:
+            for name, share in self.get_weighted_shares(count).items():
+                if share <= 0:
+                    continue
+                queue_task_objs = Task.objects.select_for_process(
+                    share, name, self.owner
+                )
+                if len(queue_task_objs) < share:
+                    exhausted_queue_names.add(name)
+                task_objs.extend(queue_task_objs)
+        for name in self.queue_names:
+            if len(task_objs) >= count:
+                break
+            if name in exhausted_queue_names:
+                continue
+            task_objs.extend(
+                Task.objects.select_for_process(
+                    count - len(task_objs), name, self.owner
+                )
+            )
+        return task_objs
+
+    def get_weighted_shares(self, count: int) -> Dict[str, int]:
+        """Splits count between queues by their QUEUE_WEIGHT. Remainder of
+        rounded down shares is given by smooth weighted round-robin, so queues
+        get their shares over several fetches, even if count is small
+        """
+        total_weight = sum(
+            settings.QUEUE_WEIGHT for settings in self.queues_settings.values()
+        )
+        shares = {
+            name: count * settings.QUEUE_WEIGHT // total_weight
+            for name, settings in self.queues_settings.items()
+        }
+        for _ in range(count - sum(shares.values())):
+            for name, settings in self.queues_settings.items():
+                self.fetch_credits[name] += settings.QUEUE_WEIGHT
+            name = max(self.queue_names, key=self.fetch_credits.__getitem__)
+            self.fetch_credits[name] -= total_weight
+            shares[name] += 1
+        return shares
+
+    def wait_for_tasks(self) -> None:
+        """Sleep until the next check or, if LISTEN/NOTIFY is used,
+        until new task is delayed to this queue
+        """
+        if self.listener is None:
             time.sleep(self.sleep_delay_seconds)
+            return
+        self.listener.wait(self.sleep_delay_seconds)
+
+    def collect_workers_events(self) -> None:
+        """Tracks tasks, taken by every worker and not done yet"""
+        while True:
+            try:
+                event, pid, tasks_ids = self.workers_events.get(block=False)
+            except Empty:
+                break
+            if event == TASKS_TAKEN:
+                self.workers_tasks.setdefault(pid, set()).update(tasks_ids)
+                self.queued_tasks_count = max(
+                    self.queued_tasks_count - len(tasks_ids), 0
+                )
+            elif event == TASKS_DONE:
+                self.workers_tasks.get(pid, set()).difference_update(tasks_ids)
+            elif event == WORKER_STOPPED:
+                self.retired_workers_pids.add(pid)
+                self.retiring_workers_count = max(self.retiring_workers_count - 1, 0)
+
+    def release_worker_tasks(self, worker: mp.Process) -> None:
+        """Returns to queue tasks, taken by exited worker and not done"""
+        tasks_ids = self.workers_tasks.pop(worker.pid, set())  # type: ignore
+        if not tasks_ids:
+            return
+        released_count = Task.objects.release_claimed_tasks(self.owner, list(tasks_ids))
+        if released_count:
+            logger.warning(
+                "Returned to queue %d tasks of exited worker %d",
+                released_count,
+                worker.pid,
+            )
 
     def manage_workers(self) -> None:
-        """Checks for workers processes and restarts them, if failed
+        """Checks for workers processes and restarts them, if failed.
+        Tasks, held by exited workers, are returned to queue
         Clears database connections every TASKS_BEFORE_CLEANUP times
         """
+        self.collect_workers_events()
         self.cleanup_counter += 1
         if self.cleanup_counter >= self.checks_before_cleanup:
             # db.connections.close_all()
             self.cleanup_counter = 0
-            for i in range(len(self.workers)):  # check children
-                if not self.workers[i].is_alive():
-                    self.workers[i].join()
-                    self.workers[i] = Worker(self.queue, self.queue_name)
-                    self.workers[i].start()
-                    logger.warning("watchdog: worker#%d lost in space, restarted", i)
+            retired_workers = []
+            dead_workers_indexes = [
+                i for i in range(len(self.workers)) if not self.workers[i].is_alive()
+            ]
+            for i in dead_workers_indexes:
+                self.workers[i].join()
+            if dead_workers_indexes:
+                # Events, sent by exited workers before exit
+                self.collect_workers_events()
+            for i in dead_workers_indexes:  # check children
+                self.release_worker_tasks(self.workers[i])
+                if self.workers[i].pid in self.retired_workers_pids:
+                    self.retired_workers_pids.discard(self.workers[i].pid)  # type: ignore
+                    retired_workers.append(self.workers[i])
+                    logger.info("worker#%d retired", i)
+                    continue
+                self.workers[i] = self.create_worker()
+                self.workers[i].start()
+                logger.warning("watchdog: worker#%d lost in space, restarted", i)
+                metrics.record(metrics.WORKER_RESTARTS)
+            for worker in retired_workers:
+                self.workers.remove(worker)
+
+    def scale_workers(self) -> None:
+        """If MIN_WORKERS_COUNT is set, adds worker, while there are not less tasks
+        waiting in queue, than workers, up to workers count.
+        Retires one worker every SCALE_DOWN_COOLDOWN_SECONDS, while queue is empty,
+        down to MIN_WORKERS_COUNT
+        """
+        if self.min_workers_count is None:
+            return
+        active_workers_count = (
+            len(self.workers)
+            - self.retiring_workers_count
+            - len(self.retired_workers_pids)
+        )
+        qsize = self.queued_tasks_count
+        if qsize > 0:
+            self.idle_since = None
+            if (
+                qsize >= active_workers_count
+                and active_workers_count < self.workers_count
+            ):
+                self.add_worker()
+                logger.info("Scaled up to %d workers", active_workers_count + 1)
+            return
+        now = time.monotonic()
+        if self.idle_since is None:
+            self.idle_since = now
+            return
+        if (
+            now - self.idle_since >= self.settings.SCALE_DOWN_COOLDOWN_SECONDS
+            and active_workers_count > self.min_workers_count
+        ):
+            # Worker, that takes None from queue, exits after its current task
+            self.queue.put(None)
+            self.retiring_workers_count += 1
+            self.idle_since = now
+            logger.info("Scaled down to %d workers", active_workers_count - 1)
+
+    def manage_leases(self) -> None:
+        """Renews leases of tasks, claimed by this manager, and returns to queue
+        tasks with expired leases every third of TASK_LEASE_SECONDS
+        """
+        now = time.monotonic()
+        if (
+            self.last_leases_check_time is not None
+            and now - self.last_leases_check_time < self.leases_check_interval
+        ):
+            return
+        self.last_leases_check_time = now
+        requeued_count = 0
+        for name in self.queue_names:
+            Task.objects.renew_leases(self.owner, name)
+            requeued_count += Task.objects.requeue_expired_tasks(name)
+        if requeued_count:
+            logger.warning(
+                "Returned to queue %d tasks with expired leases", requeued_count
+            )
+
+    def release_tasks(self) -> None:
+        """Returns to queue tasks, which were claimed, but not processed
+        by workers of this manager
+        """
+        try:
+            released_count = sum(
+                Task.objects.release_tasks(self.owner, name)
+                for name in self.queue_names
+            )
+        except Error:
+            logger.exception("Database error")
+            return
+        if released_count:
+            logger.info("Returned to queue %d not processed tasks", released_count)
 
     def flush_queue(self) -> None:
         if not self.queue.empty():